@@ -0,0 +1,136 @@
+"""
+Compares benchmark results against a baseline and fails if a stage regressed or a workload of
+the baseline is missing from the results.
+
+A stage regresses if it became slower than the baseline by more than the threshold (relative)
+and by more than the minimum time (absolute, to ignore noise on fast stages), or if its peak
+memory grew by more than the memory threshold and the minimum memory.
+
+    python benchmarks/compare.py baseline.json results.json --threshold 0.2
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+
+
+def compare(
+    baseline: dict,
+    results: dict,
+    threshold: float = 0.2,
+    min_time: float = 0.05,
+    memory_threshold: float = 0.2,
+    min_memory: int = 16 * 1024 * 1024,
+    components: bool = False,
+) -> tuple[list[str], list[str]]:
+    """
+    Returns the lines of the comparison report and the regressions found.
+    """
+    report = []
+    regressions = []
+    for name, result in results["results"].items():
+        base = baseline["results"].get(name)
+        if base is None:
+            report.append(f"{name}: not in baseline")
+            continue
+        entries = [
+            (stage, base["stages"].get(stage), entry, True)
+            for stage, entry in result["stages"].items()
+        ]
+        if components:
+            entries += [
+                (component, base["components"].get(component), entry, False)
+                for component, entry in result["components"].items()
+            ]
+        for stage, old, new, has_memory in entries:
+            if old is None:
+                continue
+            ratio = new["time"] / old["time"] if old["time"] else 1.0
+            line = f"{name} {stage}: {old['time']:.3f}s -> {new['time']:.3f}s ({ratio:.2f}x)"
+            problems = []
+            if (
+                new["time"] > old["time"] * (1 + threshold)
+                and new["time"] - old["time"] > min_time
+            ):
+                problems.append("time")
+            if has_memory:
+                line += (
+                    f", peak {old['peak_rss'] >> 20} MiB -> {new['peak_rss'] >> 20} MiB"
+                )
+                if (
+                    new["peak_rss"] > old["peak_rss"] * (1 + memory_threshold)
+                    and new["peak_rss"] - old["peak_rss"] > min_memory
+                ):
+                    problems.append("memory")
+            if problems:
+                line += f"  REGRESSION ({', '.join(problems)})"
+                regressions.append(line)
+            report.append(line)
+    for name in baseline["results"]:
+        if name not in results["results"]:
+            # e.g. the workload failed
+            line = f"{name}: missing from results  REGRESSION"
+            regressions.append(line)
+            report.append(line)
+    return report, regressions
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline", help="Stored baseline results")
+    parser.add_argument("results", help="New results")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Allowed relative slowdown per stage (default: 0.2)",
+    )
+    parser.add_argument(
+        "--min-time",
+        type=float,
+        default=0.05,
+        help="Slowdowns of fewer seconds are ignored (default: 0.05)",
+    )
+    parser.add_argument(
+        "--memory-threshold",
+        type=float,
+        default=0.2,
+        help="Allowed relative growth of the peak memory (default: 0.2)",
+    )
+    parser.add_argument(
+        "--min-memory",
+        type=int,
+        default=16,
+        help="Growth of fewer MiB is ignored (default: 16)",
+    )
+    parser.add_argument(
+        "--components",
+        action="store_true",
+        help="Also compare the time per component method",
+    )
+    args = parser.parse_args(argv)
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.results) as f:
+        results = json.load(f)
+    report, regressions = compare(
+        baseline,
+        results,
+        threshold=args.threshold,
+        min_time=args.min_time,
+        memory_threshold=args.memory_threshold,
+        min_memory=args.min_memory * 1024 * 1024,
+        components=args.components,
+    )
+    print("\n".join(report))
+    if regressions:
+        print(f"\n{len(regressions)} regression(s):\n" + "\n".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
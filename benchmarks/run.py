@@ -0,0 +1,187 @@
+"""
+Runs the benchmark workloads and writes the results as JSON.
+
+Every run of a workload happens in a fresh Python process with the on-disk caches disabled, and
+records the wall time and the peak resident memory (the high-water mark of the process so far)
+at the end of each stage:
+
+- load: creating the Patcherex instance, loading the binary and generating the CFG
+- apply: apply_patches()
+- save: save_binary()
+
+along with the time, calls and bytes per component method from ``p.stats`` during apply and save.
+Picking the patch sites happens between load and apply and isn't measured. The median over the
+repetitions is reported.
+
+    python benchmarks/run.py -o results.json --tier medium
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from workloads import TIERS, Workload, get_workloads, make_patches
+
+BUILD_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), ".build")
+
+
+def _peak_rss() -> int:
+    # bytes on macOS, KiB elsewhere
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_workload(workload: Workload) -> dict:
+    """
+    Runs a workload once in this process.
+    """
+    from patcherex2 import Patcherex
+
+    stages = {}
+
+    def stage(name: str, start: float) -> float:
+        end = time.perf_counter()
+        stages[name] = {"time": end - start, "peak_rss": _peak_rss()}
+        return end
+
+    t = time.perf_counter()
+    p = Patcherex(workload.binary)
+    # the components are created on first use, so load them here rather than in apply
+    assert p.binary_analyzer.cfg is not None
+    stage("load", t)
+    p.patches += make_patches(p, workload.n_patches)
+    p.stats.enable()
+    t = time.perf_counter()
+    p.apply_patches()
+    t = stage("apply", t)
+    with tempfile.TemporaryDirectory() as td:
+        p.save_binary(os.path.join(td, "patched"))
+    stage("save", t)
+    stages["total"] = {
+        "time": sum(entry["time"] for entry in stages.values()),
+        "peak_rss": _peak_rss(),
+    }
+    p.stats.disable()
+    p.shutdown()
+
+    counts = {}
+    for patch in p.patches:
+        counts[type(patch).__name__] = counts.get(type(patch).__name__, 0) + 1
+    return {"patches": counts, "stages": stages, "components": p.stats.summary()}
+
+
+def _run_in_subprocess(workload: Workload) -> dict:
+    env = dict(os.environ, PYTHONHASHSEED="0")
+    for var in ("PATCHEREX2_CFG_CACHE_DIR", "PATCHEREX2_COMPILER_CACHE_DIR"):
+        env.pop(var, None)
+    proc = subprocess.run(
+        [sys.executable, os.path.realpath(__file__), "--worker"],
+        input=json.dumps(workload.to_dict()),
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else "")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _median(runs: list[dict]) -> dict:
+    result = {"patches": runs[0]["patches"], "stages": {}, "components": {}}
+    for stage in runs[0]["stages"]:
+        result["stages"][stage] = {
+            key: statistics.median(run["stages"][stage][key] for run in runs)
+            for key in ("time", "peak_rss")
+        }
+    for name, entry in runs[0]["components"].items():
+        result["components"][name] = {
+            "calls": entry["calls"],
+            "time": statistics.median(
+                run["components"].get(name, entry)["time"] for run in runs
+            ),
+            "bytes": entry["bytes"],
+        }
+    return result
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-o", "--output", help="File to write the results to")
+    parser.add_argument(
+        "--tier",
+        choices=TIERS,
+        default="small",
+        help="Largest scaling workloads to run (default: small)",
+    )
+    parser.add_argument(
+        "-k", "--filter", help="Only run the workloads whose name contains this"
+    )
+    parser.add_argument(
+        "-r", "--repeat", type=int, default=3, help="Runs per workload (default: 3)"
+    )
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        workload = Workload.from_dict(json.load(sys.stdin))
+        print(json.dumps(run_workload(workload)))
+        return 0
+
+    from patcherex2 import __version__
+
+    workloads, skipped = get_workloads(args.tier)
+    results = {
+        "meta": {
+            "patcherex2": __version__,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "tier": args.tier,
+            "repeat": args.repeat,
+        },
+        "results": {},
+        "skipped": skipped,
+    }
+    failed = 0
+    for workload in workloads:
+        if args.filter and args.filter not in workload.name:
+            continue
+        try:
+            workload.prepare(BUILD_DIR)
+            runs = [_run_in_subprocess(workload) for _ in range(args.repeat)]
+        except Exception as e:
+            failed += 1
+            results["skipped"][workload.name] = f"{type(e).__name__}: {e}"
+            print(f"{workload.name}: failed, {e}", file=sys.stderr)
+            continue
+        result = _median(runs)
+        results["results"][workload.name] = result
+        print(
+            f"{workload.name}: "
+            + ", ".join(
+                f"{stage} {entry['time']:.3f}s"
+                for stage, entry in result["stages"].items()
+            ),
+            file=sys.stderr,
+        )
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Benchmark workloads: a binary plus a number of patches of each kind to apply to it.
+
+Every target that has a binary in tests/test_binaries gets a workload with a few patches of each
+kind. The scaling workloads run on amd64 binaries generated with the host C compiler, with a
+given number of functions (binary size) and of patches of each kind (patch count). Patch sites
+are picked deterministically, at most one InsertInstructionPatch and one ModifyInstructionPatch
+per function, so a workload gets fewer patches than asked for if the binary is too small.
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+
+from patcherex2 import (
+    InsertDataPatch,
+    InsertInstructionPatch,
+    ModifyInstructionPatch,
+    Patcherex,
+)
+from patcherex2.targets import Target
+
+ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+TEST_BINARIES = os.path.join(ROOT, "tests", "test_binaries")
+
+# (number of functions, number of patches of each kind)
+SYNTHETIC = {
+    "small": [(100, 10), (1000, 10)],
+    "medium": [(1000, 1000), (10000, 10)],
+    "large": [(10000, 10000)],
+}
+TIERS = ("small", "medium", "large")
+
+
+class Workload:
+    def __init__(
+        self, name: str, binary: str | None, n_patches: int, functions: int = 0
+    ) -> None:
+        """
+        :param name: Unique name of the workload
+        :param binary: Path of the binary, or None if it is generated on demand
+        :param n_patches: Number of patches of each kind
+        :param functions: Number of functions of the generated binary
+        """
+        self.name = name
+        self.binary = binary
+        self.n_patches = n_patches
+        self.functions = functions
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, d: dict) -> Workload:
+        return cls(**d)
+
+    def prepare(self, build_dir: str) -> str:
+        """
+        Returns the path of the binary, generating it first if needed.
+        """
+        if self.binary is None:
+            self.binary = generate_binary(build_dir, self.functions)
+        return self.binary
+
+
+def get_workloads(tier: str = "small") -> tuple[list[Workload], dict[str, str]]:
+    """
+    Returns the workloads of a tier (including those of the smaller tiers), and the targets that
+    have no workload with the reason.
+    """
+    workloads = []
+    covered = set()
+    for arch in sorted(os.listdir(TEST_BINARIES)):
+        binary = os.path.join(TEST_BINARIES, arch, "printf_nopie")
+        if not os.path.exists(binary):
+            continue
+        covered.add(Target.detect_target_class(binary))
+        workloads.append(Workload(f"{arch}/printf_nopie/n10", binary, 10))
+    for t in TIERS[: TIERS.index(tier) + 1]:
+        for functions, n_patches in SYNTHETIC[t]:
+            workloads.append(
+                Workload(
+                    f"synthetic/f{functions}/n{n_patches}", None, n_patches, functions
+                )
+            )
+    skipped = {
+        target_class.__name__: "no binary in tests/test_binaries"
+        for target_class in Target.target_classes
+        if target_class not in covered
+    }
+    return workloads, skipped
+
+
+def generate_binary(build_dir: str, functions: int) -> str:
+    """
+    Compiles an amd64 binary with the given number of functions, each with a few instructions
+    that can be moved into a trampoline.
+    """
+    path = os.path.join(build_dir, f"synthetic_f{functions}")
+    if os.path.exists(path):
+        return path
+    os.makedirs(build_dir, exist_ok=True)
+    source = [
+        f"int f{i}(int x) {{ int y = x * {i + 3}; y ^= y >> 3; return y * 7 + x + {i}; }}"
+        for i in range(functions)
+    ]
+    source.append(
+        "int (*table[])(int) = {" + ", ".join(f"f{i}" for i in range(functions)) + "};"
+    )
+    source.append(
+        "int main(int argc, char **argv) {"
+        f" int r = 0; for (int i = 0; i < {functions}; i++) r += table[i](argc + r);"
+        " return r & 0xff; }"
+    )
+    with open(f"{path}.c", "w") as f:
+        f.write("\n".join(source))
+    subprocess.run(
+        [
+            os.environ.get("CC", "cc"),
+            "-O1",
+            "-fno-inline",
+            "-fcf-protection=none",
+            "-no-pie",
+            f"{path}.c",
+            "-o",
+            path,
+        ],
+        check=True,
+    )
+    return path
+
+
+def _function_instrs(p: Patcherex, func: dict) -> list[int]:
+    instrs = []
+    addr = func["addr"]
+    while addr < func["addr"] + func["size"]:
+        block = p.binary_analyzer.get_basic_block(addr)
+        if block is None or block["end"] <= addr:
+            break
+        instrs += block["instruction_addrs"]
+        addr = block["end"]
+    return instrs
+
+
+def find_sites(p: Patcherex, n: int) -> tuple[list[int], list[int]]:
+    """
+    Returns up to n addresses to insert instructions at and up to n addresses of instructions to
+    modify, none of which overlap.
+    """
+    inserts = []
+    modifies = []
+    symbols = sorted(p.binary_analyzer.get_all_symbols().items(), key=lambda x: x[1])
+    seen = set()
+    for name, addr in symbols:
+        if len(inserts) >= n and len(modifies) >= n:
+            break
+        if addr in seen:
+            continue
+        seen.add(addr)
+        func = p.binary_analyzer.get_function(name)
+        if not func or not func["size"]:
+            continue
+        try:
+            instrs = _function_instrs(p, func)
+        except Exception:
+            continue
+        free_from = func["addr"]
+        if len(inserts) < n:
+            for instr in instrs:
+                try:
+                    point = p.utils.get_insertion_point(instr)
+                except Exception:
+                    continue
+                if point["moved_instrs"] is not None:
+                    inserts.append(instr)
+                    free_from = instr + point["moved_instrs_len"]
+                    break
+        if len(modifies) < n:
+            modifies += [instr for instr in instrs if instr >= free_from][:1]
+    return inserts[:n], modifies[:n]
+
+
+def make_patches(p: Patcherex, n: int) -> list:
+    """
+    Returns up to n InsertInstructionPatches, ModifyInstructionPatches and InsertDataPatches.
+    """
+    inserts, modifies = find_sites(p, n)
+    return (
+        [InsertInstructionPatch(addr, "nop") for addr in inserts]
+        + [ModifyInstructionPatch(addr, "nop") for addr in modifies]
+        + [
+            InsertDataPatch(f"benchmark_data_{i}", i.to_bytes(4, "little") * 4)
+            for i in range(n)
+        ]
+    )
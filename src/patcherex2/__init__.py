@@ -4,6 +4,10 @@ from importlib import metadata
 from .patcherex import Patcherex
 from .patches import *
 
-__version__ = metadata.version("patcherex2")
+try:
+    __version__ = metadata.version("patcherex2")
+except metadata.PackageNotFoundError:
+    # e.g. an uninstalled checkout or a vendored copy
+    __version__ = "unknown"
 
 __all__ = ["Patcherex"] + patches.__all__
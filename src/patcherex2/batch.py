@@ -0,0 +1,263 @@
+"""
+Applies the same patch recipe to many binaries across a pool of worker processes.
+
+Every binary is patched by a fresh :class:`~patcherex2.patcherex.Patcherex` instance, but the
+caches outlive the instances: each worker process keeps its in-memory compilation cache across
+jobs, and all workers share an on-disk compilation cache and CFG cache when a cache directory is
+given. Targets are detected up front in the parent process.
+
+A recipe is either a list of patches or a callable taking the Patcherex instance and returning
+the patches to apply. From the command line, a recipe is a Python file that defines such a
+``recipe`` function (or a ``patches`` list)::
+
+    python -m patcherex2.batch recipe.py firmware/*.elf -o patched/ -j 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import contextlib
+import copy
+import json
+import logging
+import os
+import runpy
+import sys
+import time
+from collections.abc import Callable, Iterable, Iterator
+
+from .components.compilers.cache import CompilationCache
+from .patcherex import Patcherex
+from .patches import Patch
+from .targets import Target
+
+logger = logging.getLogger(__name__)
+
+
+class RecipeFile:
+    """
+    Recipe loaded from a Python file defining either a ``recipe(p)`` function or a ``patches``
+    list. Only the path is pickled, the file is executed once per worker process.
+    """
+
+    _loaded = {}
+
+    def __init__(self, path: str) -> None:
+        self.path = os.path.abspath(path)
+
+    def __call__(self, p: Patcherex) -> list[Patch]:
+        if self.path not in self._loaded:
+            self._loaded[self.path] = runpy.run_path(self.path)
+        namespace = self._loaded[self.path]
+        if "recipe" in namespace:
+            return namespace["recipe"](p)
+        if "patches" in namespace:
+            return copy.deepcopy(namespace["patches"])
+        raise ValueError(f"{self.path} defines neither recipe nor patches")
+
+
+def _detect_target_classes(binaries: list[str]) -> dict[str, type[Target] | None]:
+    detected = {}
+    for binary in binaries:
+        try:
+            detected[binary] = Target.detect_target_class(binary)
+        except (OSError, ValueError):
+            # reported by the job itself
+            detected[binary] = None
+    return detected
+
+
+_CACHE_ENV_VARS = ("PATCHEREX2_CFG_CACHE_DIR", "PATCHEREX2_COMPILER_CACHE_DIR")
+
+
+def _init_worker(cache_dir: str | None) -> None:
+    if cache_dir is None:
+        return
+    os.environ.setdefault("PATCHEREX2_CFG_CACHE_DIR", os.path.join(cache_dir, "cfg"))
+    if "PATCHEREX2_COMPILER_CACHE_DIR" not in os.environ:
+        os.environ["PATCHEREX2_COMPILER_CACHE_DIR"] = os.path.join(
+            cache_dir, "compiler"
+        )
+        # a forked worker inherits the default cache of the parent, recreate it with the disk level
+        CompilationCache._default = None
+
+
+@contextlib.contextmanager
+def _cache_dir_env(cache_dir: str | None) -> Iterator[None]:
+    # the same as _init_worker, but undone afterwards, for patching in the calling process
+    saved_env = {var: os.environ.get(var) for var in _CACHE_ENV_VARS}
+    saved_default = CompilationCache._default
+    _init_worker(cache_dir)
+    try:
+        yield
+    finally:
+        for var, value in saved_env.items():
+            if value is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = value
+        CompilationCache._default = saved_default
+
+
+def _output_paths(binaries: list[str], output_dir: str | None) -> list[str | None]:
+    # two jobs must never write the same file
+    paths = set()
+    for binary in binaries:
+        path = os.path.realpath(binary)
+        if path in paths:
+            raise ValueError(f"{binary} is listed more than once")
+        paths.add(path)
+    if output_dir is None:
+        return [None] * len(binaries)
+    outputs = [
+        os.path.join(output_dir, os.path.basename(binary)) for binary in binaries
+    ]
+    seen = {}
+    for binary, output in zip(binaries, outputs):
+        if output in seen:
+            raise ValueError(
+                f"{seen[output]} and {binary} would both be saved as {output}"
+            )
+        seen[output] = binary
+    return outputs
+
+
+def _patch_binary(
+    binary: str,
+    output: str | None,
+    recipe: Callable[[Patcherex], Iterable[Patch]] | list[Patch],
+    target_cls: type[Target] | None,
+    patcherex_kwargs: dict,
+) -> dict:
+    result = {"binary": binary, "output": output, "success": False, "error": None}
+    timings = {}
+    start = time.perf_counter()
+    p = None
+    try:
+        p = Patcherex(binary, target_cls=target_cls, **patcherex_kwargs)
+        # the components are created on first use, so load the binary (and the angr CFG) here
+        # rather than in apply
+        getattr(p.binary_analyzer, "cfg", None)
+        timings["load"] = time.perf_counter() - start
+        if callable(recipe):
+            p.patches += list(recipe(p))
+        else:
+            p.patches += copy.deepcopy(recipe)
+        p.apply_patches()
+        timings["apply"] = time.perf_counter() - start - timings["load"]
+        p.save_binary(output)
+        timings["save"] = (
+            time.perf_counter() - start - timings["load"] - timings["apply"]
+        )
+        result["output"] = output if output is not None else f"{binary}.patched"
+        result["success"] = True
+    except Exception as e:
+        logger.debug(f"Patching {binary} failed", exc_info=True)
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        if p is not None:
+            p.shutdown()
+    timings["total"] = time.perf_counter() - start
+    result["time"] = timings
+    return result
+
+
+def patch_binaries(
+    binaries: list[str],
+    recipe: Callable[[Patcherex], Iterable[Patch]] | list[Patch],
+    output_dir: str | None = None,
+    max_workers: int | None = None,
+    cache_dir: str | None = None,
+    **patcherex_kwargs,
+) -> Iterator[dict]:
+    """
+    Patches every binary with the same recipe and yields one result per binary as soon as it is
+    done, i.e. not necessarily in the given order. A result is a dict with the keys ``binary``,
+    ``output``, ``success``, ``error`` (a string, if the job failed) and ``time`` (seconds spent
+    loading and analyzing the binary, applying, saving and in total).
+
+    :param binaries: Paths of the binaries to patch, each listed once.
+    :param recipe: List of patches, or a callable that takes a Patcherex instance and returns the patches for it. It has to be picklable when using more than one worker.
+    :param output_dir: Directory to save the patched binaries in, under their original file names, which must not collide, defaults to None (next to each binary, as '<filename>.patched')
+    :param max_workers: Number of worker processes, defaults to the number of CPUs. 1 patches the binaries one by one in this process.
+    :param cache_dir: Directory for the compilation and CFG caches shared by the workers, defaults to None (each worker only keeps its in-memory caches)
+    :param patcherex_kwargs: Extra keyword arguments for each Patcherex instance (target_opts, components_opts, target_cls)
+    """
+    binaries = list(binaries)
+    outputs = _output_paths(binaries, output_dir)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    if "target_cls" in patcherex_kwargs:
+        target_cls = patcherex_kwargs.pop("target_cls")
+        target_classes = dict.fromkeys(binaries, target_cls)
+    else:
+        target_classes = _detect_target_classes(binaries)
+    jobs = [
+        (binary, output, recipe, target_classes[binary], patcherex_kwargs)
+        for binary, output in zip(binaries, outputs)
+    ]
+
+    if max_workers == 1:
+        with _cache_dir_env(cache_dir):
+            for job in jobs:
+                yield _patch_binary(*job)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=max_workers, initializer=_init_worker, initargs=(cache_dir,)
+    ) as pool:
+        futures = {pool.submit(_patch_binary, *job): job for job in jobs}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as e:
+                # the worker died, e.g. killed by the OOM killer
+                binary, output = futures[future][:2]
+                yield {
+                    "binary": binary,
+                    "output": output,
+                    "success": False,
+                    "error": f"{type(e).__name__}: {e}",
+                    "time": {},
+                }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m patcherex2.batch",
+        description="Apply a patch recipe to many binaries. Prints one JSON line per binary.",
+    )
+    parser.add_argument(
+        "recipe",
+        help="Python file defining recipe(p), returning the patches, or a patches list",
+    )
+    parser.add_argument("binaries", nargs="+", help="Binaries to patch")
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        help="Directory for the patched binaries (default: next to each binary)",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="Number of worker processes"
+    )
+    parser.add_argument(
+        "--cache-dir", help="Directory for the caches shared by the workers"
+    )
+    args = parser.parse_args(argv)
+
+    failed = 0
+    for result in patch_binaries(
+        args.binaries,
+        RecipeFile(args.recipe),
+        output_dir=args.output_dir,
+        max_workers=args.jobs,
+        cache_dir=args.cache_dir,
+    ):
+        failed += not result["success"]
+        print(json.dumps(result), flush=True)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
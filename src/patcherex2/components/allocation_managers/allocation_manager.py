@@ -1,7 +1,9 @@
 from __future__ import annotations
 
+import bisect
 import enum
 import logging
+from collections.abc import Iterable
 from pprint import pformat
 
 logger = logging.getLogger(__name__)
@@ -100,16 +102,139 @@ class MappedBlock(Block):
         return False
 
 
+class FreeList:
+    """
+    Free mapped blocks of one memory flag, sorted by size and then by memory address.
+    """
+
+    def __init__(self) -> None:
+        self._keys = []
+        self._blocks = []
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    def add(self, block: MappedBlock) -> None:
+        i = bisect.bisect_right(self._keys, (block.size, block.mem_addr))
+        self._keys.insert(i, (block.size, block.mem_addr))
+        self._blocks.insert(i, block)
+
+    def remove(self, block: MappedBlock, size: int) -> None:
+        """
+        Removes block, which was added while it had the given size.
+        """
+        i = bisect.bisect_left(self._keys, (size, block.mem_addr))
+        while self._blocks[i] is not block:
+            i += 1
+        del self._keys[i]
+        del self._blocks[i]
+
+    def find(self, size: int, align: int) -> tuple[MappedBlock, MappedBlock]:
+        """
+        Returns the smallest block (lowest address first) that can hold size bytes at the given
+        alignment, and the lowest addressed block that fits only when its alignment padding is
+        included. Either may be None.
+        """
+        best_fit = None
+        padded_fit = None
+        # a block larger than this fits whatever its alignment, so it can't be a padded fit
+        limit = size + align - 1
+        i = bisect.bisect_left(self._keys, (size,))
+        while i < len(self._blocks):
+            block = self._blocks[i]
+            if block.size > limit:
+                if best_fit is None:
+                    best_fit = block
+                break
+            offset = (align - (block.mem_addr % align)) % align
+            if block.size == size + offset and offset > 0:
+                if padded_fit is None or block.mem_addr < padded_fit.mem_addr:
+                    padded_fit = block
+            elif block.size >= size + offset and best_fit is None:
+                best_fit = block
+            if best_fit is not None and block.size == size:
+                # the remaining blocks of this size can't be padded fits, skip them
+                i = bisect.bisect_left(self._keys, (size + 1,))
+            else:
+                i += 1
+        return best_fit, padded_fit
+
+
 class AllocationManager:
     def __init__(self, p) -> None:
         self.blocks = {cls: [] for cls in Block.subclasses}
         self.p = p
         self.new_mapped_blocks = []
+        self._free_lists = {}
+        # minimum size of the next new segment per flag, doubled with every segment created
+        self._new_block_growth = {}
+        # if set to a list, allocations and new segments are recorded in it, see Session
+        self.journal = None
+
+    def _track(self, block: Block) -> None:
+        if type(block) is MappedBlock and block.is_free:
+            self._free_lists.setdefault(block.flag, FreeList()).add(block)
+
+    def _untrack(self, block: Block, size: int = None) -> None:
+        if type(block) is MappedBlock and block.is_free:
+            self._free_lists[block.flag].remove(
+                block, block.size if size is None else size
+            )
+
+    def _index(self, blocks: list[Block], block: Block) -> int:
+        i = bisect.bisect_left(blocks, block)
+        while i < len(blocks) and not block < blocks[i]:
+            if blocks[i] is block:
+                return i
+            i += 1
+        return -1
+
+    def _blocks_in_range(
+        self, blocks: list[MappedBlock], start: int, end: int
+    ) -> list[MappedBlock]:
+        # blocks whose mem_addr lies in [start, end)
+        lo, hi = 0, len(blocks)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if blocks[mid].mem_addr < start:
+                lo = mid + 1
+            else:
+                hi = mid
+        result = []
+        while lo < len(blocks) and blocks[lo].mem_addr < end:
+            result.append(blocks[lo])
+            lo += 1
+        return result
+
+    def _merge_with_next(self, blocks: list[Block], i: int) -> bool:
+        curr, next = blocks[i], blocks[i + 1]
+        size = curr.size
+        if not curr.coalesce(next):
+            return False
+        del blocks[i + 1]
+        self._untrack(curr, size)
+        self._untrack(next)
+        self._track(curr)
+        return True
+
+    def _coalesce_at(self, blocks: list[Block], i: int) -> None:
+        # the rest of the list is already coalesced, so only the neighbors of blocks[i] can merge
+        if i > 0 and self._merge_with_next(blocks, i - 1):
+            i -= 1
+        if i + 1 < len(blocks):
+            self._merge_with_next(blocks, i)
+
+    def _remove_block(self, block: Block) -> None:
+        blocks = self.blocks[type(block)]
+        del blocks[self._index(blocks, block)]
+        self._untrack(block)
 
     def add_block(self, block: Block) -> None:
-        self.blocks[type(block)].append(block)
-        self.blocks[type(block)].sort()
-        self.coalesce(self.blocks[type(block)])
+        blocks = self.blocks[type(block)]
+        i = bisect.bisect_right(blocks, block)
+        blocks.insert(i, block)
+        self._track(block)
+        self._coalesce_at(blocks, i)
 
     def add_free_space(self, addr: int, size: int, flag: str = "RX") -> None:
         _flag = 0
@@ -119,29 +244,88 @@ class AllocationManager:
             _flag |= MemoryFlag.W
         if "x" in flag.lower():
             _flag |= MemoryFlag.X
-        block = MappedBlock(
-            self.p.binary_analyzer.mem_addr_to_file_offset(addr),
-            addr,
-            size,
-            is_free=True,
-            flag=_flag,
-        )
-        self.p.allocation_manager.add_block(block)
+        file_addr = self.p.binary_analyzer.mem_addr_to_file_offset(addr)
+        if not self.free_range(file_addr, addr, size, _flag):
+            logger.warning(
+                f"Cannot add free space at {hex(addr)} of size {hex(size)}, it overlaps several blocks"
+            )
+
+    def free_range(
+        self, file_addr: int, mem_addr: int, size: int, flag: MemoryFlag
+    ) -> bool:
+        """
+        Makes the given range free space with the given flag, e.g. the body of a function that is
+        not needed anymore. The range either lies within a single block, which is split around
+        it, or doesn't overlap any block.
+
+        :return: Whether the range is free now
+        """
+        blocks = self.blocks[MappedBlock]
+        i = bisect.bisect_right(blocks, MappedBlock(None, mem_addr, 0)) - 1
+        if i >= 0 and blocks[i].mem_addr + blocks[i].size > mem_addr:
+            block = blocks[i]
+            offset = mem_addr - block.mem_addr
+            if offset + size > block.size or block.file_addr + offset != file_addr:
+                return False
+            if not block.is_free:
+                self._carve(block, file_addr, mem_addr, size, True, flag)
+        else:
+            if i + 1 < len(blocks) and blocks[i + 1].mem_addr < mem_addr + size:
+                return False
+            self.add_block(
+                MappedBlock(file_addr, mem_addr, size, is_free=True, flag=flag)
+            )
+        if self.journal is not None:
+            self.journal.append(("free", file_addr, mem_addr, size, int(flag)))
+        return True
+
+    def reclaim_unused_funcs(self, keep: Iterable[int] = ()) -> int:
+        """
+        Adds the bodies of the functions that the binary analyzer finds unused as RX free space.
+        Functions containing an entry point known to the binary format tool (see
+        BinFmtTool.get_entry_points) or one of the addresses in keep are left alone.
+
+        :param keep: Addresses whose functions must stay, e.g. the addresses patches write to
+        :return: Number of bytes reclaimed
+        """
+        keep = sorted(set(keep) | self.p.binfmt_tool.get_entry_points())
+        reclaimed = 0
+        for func in self.p.binary_analyzer.get_unused_funcs():
+            i = bisect.bisect_left(keep, func["addr"])
+            if i < len(keep) and keep[i] < func["addr"] + func["size"]:
+                continue
+            file_addr = self.p.binary_analyzer.mem_addr_to_file_offset(func["addr"])
+            if self.free_range(file_addr, func["addr"], func["size"], MemoryFlag.RX):
+                reclaimed += func["size"]
+        logger.info(f"Reclaimed {reclaimed} bytes of unused functions")
+        return reclaimed
 
     def _find_in_mapped_blocks(
         self, size: int, flag=MemoryFlag.RWX, align=0x1
     ) -> MappedBlock:
         best_fit = None
-        for block in self.blocks[MappedBlock]:
-            if block.is_free and block.size >= size and block.flag & flag == flag:
-                # check for alignment
-                offset = (align - (block.mem_addr % align)) % align
-                if block.size >= size + offset:
-                    if block.size == size + offset and offset > 0:
-                        block.is_free = False
-                        return block
-                    elif best_fit is None or block.size < best_fit.size:
-                        best_fit = block
+        padded_fit = None
+        for block_flag, free_list in self._free_lists.items():
+            if block_flag & flag != flag:
+                continue
+            fit, padded = free_list.find(size, align)
+            if fit is not None and (
+                best_fit is None
+                or (fit.size, fit.mem_addr) < (best_fit.size, best_fit.mem_addr)
+            ):
+                best_fit = fit
+            if padded is not None and (
+                padded_fit is None or padded.mem_addr < padded_fit.mem_addr
+            ):
+                padded_fit = padded
+
+        if padded_fit:
+            # the whole block is handed out, alignment padding included
+            blocks = self.blocks[MappedBlock]
+            self._untrack(padded_fit)
+            padded_fit.is_free = False
+            self._coalesce_at(blocks, self._index(blocks, padded_fit))
+            return padded_fit
 
         if best_fit:
             # Adjust for alignment
@@ -154,98 +338,248 @@ class AllocationManager:
                 is_free=False,
                 flag=flag,
             )
-            self.add_block(allocated_block)
-            if offset > 0:
-                self.add_block(
-                    MappedBlock(
-                        best_fit.file_addr,
-                        best_fit.mem_addr,
-                        offset,
-                        is_free=True,
-                        flag=flag,
-                    )
-                )
+            padding_block = MappedBlock(
+                best_fit.file_addr,
+                best_fit.mem_addr,
+                offset,
+                is_free=True,
+                flag=flag,
+            )
+            self._remove_block(best_fit)
             best_fit.file_addr += size + offset
             best_fit.mem_addr += size + offset
             best_fit.size = remaining_size
-            if best_fit.size == 0:
-                self.blocks[MappedBlock].remove(best_fit)
+            if best_fit.size > 0:
+                self.add_block(best_fit)
+            self.add_block(allocated_block)
+            if offset > 0:
+                self.add_block(padding_block)
             return allocated_block
 
+    def _segment_align(self) -> int:
+        # NOTE: mem_addr % p_align should equal to file_addr % p_align
+        # Check `man elf` and search for `p_align` for more information
+        # FIXME: shouldn't do any assumption on component type, reimpl in a better way
+        # FIXME: even worse, importing ELF will cause circular import
+        # TODO: consider merge allocation_manager and binfmt_tool into one component
+        if self.p.binfmt_tool.__class__.__name__ == "ELF":
+            return max(
+                [segment["p_align"] for segment in self.p.binfmt_tool._segments] + [0]
+            )
+        return 0x1000
+
+    def _new_mapped_block_addrs(self) -> tuple[int | None, int | None]:
+        # file and memory address of the next segment created at the end of the file
+        file_addr = None
+        mem_addr = None
+        for block in self.blocks[FileBlock]:
+            if block.size == -1:
+                file_addr = block.addr
+        for block in self.blocks[MemoryBlock]:
+            if block.size == -1:
+                seg_align = self._segment_align()
+                mem_addr = block.addr + (file_addr - block.addr) % seg_align
+        return file_addr, mem_addr
+
+    def _new_mapped_block_size(
+        self, addr: int, size: int, flag: MemoryFlag, align: int = 0x1
+    ) -> int:
+        # size of a new segment at addr (file or memory, they are congruent) that fits an
+        # allocation of size. It ends on a multiple of the segment alignment, so the next segment
+        # doesn't share a page with it, and is at least twice as large as the last new segment
+        # with the same flag (up to 0x10000), so repeated small allocations create few segments.
+        # finalize gives back the unused tail.
+        seg_align = self._segment_align()
+        size = max(size + align - 1, self._new_block_growth.get(flag, seg_align))
+        return -(-(addr + size) // seg_align) * seg_align - addr
+
     def _create_new_mapped_block(
         self, size: int, flag=MemoryFlag.RWX, align=0x1
     ) -> bool:
         # TODO: currently we won't use available file/mem blocks, instead we create new one at the end of the file
-        file_addr = None
-        mem_addr = None
+        file_addr, mem_addr = self._new_mapped_block_addrs()
+        if not (file_addr and mem_addr):
+            return False
+        block_size = self._new_mapped_block_size(file_addr, size, flag, align)
+        self._new_block_growth[flag] = min(block_size * 2, 0x10000)
         for block in self.blocks[FileBlock]:
             if block.size == -1:
-                file_addr = block.addr
-                block.addr += 0x10000
+                block.addr += block_size
         for block in self.blocks[MemoryBlock]:
             if block.size == -1:
-                # NOTE: mem_addr % p_align should equal to file_addr % p_align
-                # Check `man elf` and search for `p_align` for more information
-                # FIXME: shouldn't do any assumption on component type, reimpl in a better way
-                # FIXME: even worse, importing ELF will cause circular import
-                # TODO: consider merge allocation_manager and binfmt_tool into one component
-                if self.p.binfmt_tool.__class__.__name__ == "ELF":
-                    max_seg_align = max(
-                        [segment["p_align"] for segment in self.p.binfmt_tool._segments]
-                        + [0]
-                    )
-                    mem_addr = block.addr + (file_addr - block.addr) % max_seg_align
-                else:
-                    mem_addr = block.addr + (file_addr - block.addr) % 0x1000
-                block.addr = mem_addr + 0x10000
-        if file_addr and mem_addr:
+                block.addr = mem_addr + block_size
+        self.add_block(
+            MappedBlock(file_addr, mem_addr, block_size, is_free=True, flag=flag)
+        )
+        self.new_mapped_blocks.append(
+            MappedBlock(file_addr, mem_addr, block_size, is_free=True, flag=flag)
+        )
+        if self.journal is not None:
+            self.journal.append(("map", file_addr, mem_addr, block_size, int(flag)))
+        return True
+
+    def map_new_block(
+        self, file_addr: int, mem_addr: int, size: int, flag: MemoryFlag
+    ) -> bool:
+        """
+        Creates the next new segment, as allocate does when it runs out of space, but only if it
+        lands at the given addresses with the given size.
+
+        :return: Whether the segment was created
+        """
+        flag = MemoryFlag(flag)
+        if self._new_mapped_block_addrs() != (file_addr, mem_addr):
+            return False
+        if self._new_mapped_block_size(file_addr, size, flag) != size:
+            return False
+        return self._create_new_mapped_block(size, flag)
+
+    def _reservable_block(
+        self, file_addr: int, mem_addr: int, size: int, flag: MemoryFlag
+    ) -> MappedBlock | None:
+        # the free block that the range lies within, if any
+        blocks = self.blocks[MappedBlock]
+        i = bisect.bisect_right(blocks, MappedBlock(None, mem_addr, 0)) - 1
+        if i < 0:
+            return None
+        block = blocks[i]
+        offset = mem_addr - block.mem_addr
+        if (
+            not block.is_free
+            or block.flag & flag != flag
+            or offset + size > block.size
+            or block.file_addr + offset != file_addr
+        ):
+            return None
+        return block
+
+    def _carve(
+        self,
+        block: MappedBlock,
+        file_addr: int,
+        mem_addr: int,
+        size: int,
+        is_free: bool,
+        flag: MemoryFlag,
+    ) -> None:
+        # replaces the range within block with a block of its own
+        offset = mem_addr - block.mem_addr
+        self._remove_block(block)
+        if offset > 0:
             self.add_block(
-                MappedBlock(file_addr, mem_addr, 0x10000, is_free=True, flag=flag)
+                MappedBlock(
+                    block.file_addr,
+                    block.mem_addr,
+                    offset,
+                    is_free=block.is_free,
+                    flag=block.flag,
+                )
+            )
+        if block.size - offset - size > 0:
+            self.add_block(
+                MappedBlock(
+                    file_addr + size,
+                    mem_addr + size,
+                    block.size - offset - size,
+                    is_free=block.is_free,
+                    flag=block.flag,
+                )
             )
-            self.new_mapped_blocks.append(
-                MappedBlock(file_addr, mem_addr, 0x10000, is_free=True, flag=flag)
+        self.add_block(
+            MappedBlock(
+                file_addr, mem_addr, size, is_free=is_free, flag=MemoryFlag(flag)
             )
-            return True
-        return False
+        )
+
+    def can_reserve(
+        self, file_addr: int, mem_addr: int, size: int, flag: MemoryFlag
+    ) -> bool:
+        """
+        Whether reserve would succeed for the given range.
+        """
+        return self._reservable_block(file_addr, mem_addr, size, flag) is not None
+
+    def reserve(
+        self, file_addr: int, mem_addr: int, size: int, flag: MemoryFlag
+    ) -> bool:
+        """
+        Allocates exactly the given range, e.g. to restore an allocation made by an earlier run.
+        The range has to lie within a single free mapped block that allows flag.
+
+        :return: Whether the range was free and is now allocated
+        """
+        block = self._reservable_block(file_addr, mem_addr, size, flag)
+        if block is None:
+            return False
+        self._carve(block, file_addr, mem_addr, size, False, flag)
+        if self.journal is not None:
+            self.journal.append(("allocate", file_addr, mem_addr, size, int(flag)))
+        return True
 
     def allocate(self, size: int, flag=MemoryFlag.RWX, align=0x1) -> MappedBlock:
         logger.debug(
             f"allocating size: {size}, flag: {flag.__repr__()}, align: {align}"
         )
-        block = self._find_in_mapped_blocks(size, flag, align)
-        if block:
-            return block
-        logger.debug(
-            f"memory_allocate: failed to allocate memory of size {size} with flag {flag.__repr__()}, creating new area and retrying"
-        )
-        if self._create_new_mapped_block(size, flag, align):
-            return self.allocate(size, flag, align)
-        else:
-            raise MemoryError("Insufficient memory")
+        while True:
+            block = self._find_in_mapped_blocks(size, flag, align)
+            if block:
+                if self.journal is not None:
+                    # the block may have grown into the used blocks after it, so journal
+                    # only what was carved: the size plus the padding of a padded fit
+                    offset = (align - (block.mem_addr % align)) % align
+                    self.journal.append(
+                        (
+                            "allocate",
+                            block.file_addr,
+                            block.mem_addr,
+                            size + offset,
+                            int(block.flag),
+                        )
+                    )
+                return block
+            logger.debug(
+                f"memory_allocate: failed to allocate memory of size {size} with flag {flag.__repr__()}, creating new area and retrying"
+            )
+            if not self._create_new_mapped_block(size, flag, align):
+                raise MemoryError("Insufficient memory")
 
     def free(self, block: Block) -> None:
+        if block.is_free:
+            return
+        blocks = self.blocks[type(block)]
+        i = self._index(blocks, block)
         block.is_free = True
-        self.coalesce(self.blocks[type(block)])
+        if i == -1:
+            # already merged into the block before it
+            return
+        self._track(block)
+        self._coalesce_at(blocks, i)
 
     def coalesce(self, blocks: list[Block]) -> None:
-        for curr, next in zip(blocks, blocks[1:]):
-            if curr.coalesce(next):
-                blocks.remove(next)
-                self.coalesce(blocks)
-                return
+        i = 0
+        while i + 1 < len(blocks):
+            if not self._merge_with_next(blocks, i):
+                i += 1
 
     def finalize(self) -> None:
+        # give back the unused tail of each new segment
+        blocks = self.blocks[MappedBlock]
         for block in self.new_mapped_blocks:
-            for mapped_block in self.blocks[MappedBlock]:
-                if mapped_block.is_free:
+            trimmed = True
+            while trimmed:
+                trimmed = False
+                for mapped_block in self._blocks_in_range(
+                    blocks, block.mem_addr, block.mem_addr + block.size
+                ):
                     if (
-                        block.mem_addr + block.size
-                        == mapped_block.mem_addr + mapped_block.size
-                        and block.mem_addr <= mapped_block.mem_addr
+                        mapped_block.is_free
+                        and mapped_block.mem_addr + mapped_block.size
+                        == block.mem_addr + block.size
                     ):
-                        self.blocks[MappedBlock].remove(mapped_block)
+                        self._remove_block(mapped_block)
                         block.size -= mapped_block.size
-                        return self.finalize()
+                        trimmed = True
+                        break
 
         for block in self.new_mapped_blocks:
             if block.file_addr + block.size > self.p.binfmt_tool.file_size:
@@ -9,6 +9,7 @@ class Aarch64Info:
     instr_size = 4
     call_asm = "bl {dst}"
     pc_reg_names = ["pc", "ip"]
+    pc_relative_pattern = r"^(b|cb|tb|adr)|^(ldr\w*|prfm)\s[^\[]*$"
     save_context_asm = """
         sub sp, sp, #0x1f0
         stp x0, x1, [sp, #0x0]
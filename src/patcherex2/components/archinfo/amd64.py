@@ -9,6 +9,7 @@ class Amd64Info:
     instr_size = -1  # variable length
     call_asm = "call {dst}"
     pc_reg_names = ["rip"]
+    pc_relative_pattern = r"(^|\s)(j\w*|loop\w*|call\w*|xbegin)\b"
     save_context_asm = """
     push rax
     push rbx
@@ -9,6 +9,7 @@ class ArmInfo:
     instr_size = 4  # TODO: thumb 2
     call_asm = "bl {dst}"
     pc_reg_names = ["pc", "r15"]
+    pc_relative_pattern = r"^(b|cb|tb|adr)"
     save_context_asm = """
         push {r0-r11}
     """
@@ -10,6 +10,7 @@ class MipsInfo:
     instr_size = 4
     call_asm = "jal {dst}"
     pc_reg_names = ["pc"]
+    pc_relative_pattern = r"^(b|j)"
     save_context_asm = """
     sub $sp, $sp, -124
     sw $ra, 120($sp)
@@ -9,6 +9,7 @@ class Ppc64Info:
     instr_size = 4
     call_asm = "bl {dst}"
     pc_reg_names = []
+    pc_relative_pattern = r"^b"
     save_context_asm = """
     stwu r1, -0x80(r1)
     stmw r3, 0x8(r1)
@@ -9,5 +9,6 @@ class PpcVleInfo:
     instr_size = -1  # variable length
     call_asm = "bl {dst}"
     pc_reg_names = []
+    pc_relative_pattern = r"^(e_|se_)?b"
     save_context_asm = ""  # TODO
     restore_context_asm = ""  # TODO
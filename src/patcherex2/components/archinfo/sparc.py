@@ -8,5 +8,6 @@ class SparcInfo:
     instr_size = 4
     call_asm = "call {dst}"
     pc_reg_names = ["pc"]
+    pc_relative_pattern = r"^(b|fb|cb|call)"
     save_context_asm = ""  # TODO
     restore_context_asm = ""  # TODO
@@ -9,6 +9,7 @@ class X86Info:
     instr_size = -1  # variable length
     call_asm = "call {dst}"
     pc_reg_names = ["eip"]
+    pc_relative_pattern = r"(^|\s)(j\w*|loop\w*|call\w*|xbegin)\b"
     save_context_asm = """
     pusha
     """
@@ -1,23 +1,53 @@
+from __future__ import annotations
+
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
 
 class Assembler:
+    _symbol_ref_re = re.compile(r"\{([^{}]+)\}")
+
     def __init__(self, p) -> None:
         self.p = p
+        self._symbols = None
+        self._symbols_version = None
+
+    def get_symbols(self) -> dict[str, int]:
+        """
+        Symbols known to the patcher, i.e. symbols added by patches on top of the binary's own.
+        The table is cached and rebuilt only when p.symbols changes.
+        """
+        version = (id(self.p.symbols), getattr(self.p.symbols, "version", None))
+        if (
+            self._symbols is None
+            or version[1] is None
+            or version != self._symbols_version
+        ):
+            _symbols = {}
+            _symbols.update(self.p.symbols)
+            _symbols.update(self.p.binary_analyzer.get_all_symbols())
+            self._symbols = _symbols
+            self._symbols_version = version
+        return self._symbols
 
     def resolve_symbols(self, code: str, symbols=None):
         if symbols is None:
             symbols = {}
-        _symbols = {}
-        _symbols.update(self.p.symbols)
-        _symbols.update(self.p.binary_analyzer.get_all_symbols())
-        _symbols.update(symbols)
+        if "{" not in code:
+            return code
+        _symbols = self.get_symbols()
 
-        for symbol, addr in _symbols.items():
-            code = code.replace(f"{{{symbol}}}", hex(addr))
-        return code
+        def replace(m: re.Match) -> str:
+            name = m.group(1)
+            if name in symbols:
+                return hex(symbols[name])
+            if name in _symbols:
+                return hex(_symbols[name])
+            return m.group(0)
+
+        return self._symbol_ref_re.sub(replace, code)
 
     def _assemble(self, code: str, base=0, **kwargs) -> None:
         raise NotImplementedError()
@@ -1,59 +1,21 @@
 import logging
 import os
-import subprocess
-import tempfile
 
 from ..assets.assets import Assets
-from .assembler import Assembler
+from .gas import Gas
 
 logger = logging.getLogger(__name__)
 
 
-class Bcc(Assembler):
+class Bcc(Gas):
     def __init__(self, p) -> None:
-        super().__init__(p)
         self.assets_path = Assets("bcc").path
+        super().__init__(
+            p,
+            os.path.join(self.assets_path, "sparc-gaisler-elf-as"),
+            os.path.join(self.assets_path, "sparc-gaisler-elf-objcopy"),
+            ["-Aleon"],
+        )
 
-    def _assemble(self, code: str, base=0, **kwargs) -> bytes:
-        with tempfile.TemporaryDirectory() as td:
-            with open(os.path.join(td, "code.s"), "w") as f:
-                f.write(f".org {hex(base)}\n")
-                f.write(code)
-            try:
-                subprocess.run(
-                    [
-                        os.path.join(self.assets_path, "sparc-gaisler-elf-as"),
-                        "-Aleon",
-                        os.path.join(td, "code.s"),
-                        "-o",
-                        os.path.join(td, "obj.o"),
-                    ],
-                    check=True,
-                    capture_output=True,
-                )
-            except subprocess.CalledProcessError as e:
-                logger.error(e.stderr.decode("utf-8"))
-                raise e
-            try:
-                subprocess.run(
-                    [
-                        os.path.join(self.assets_path, "sparc-gaisler-elf-objcopy"),
-                        "-O",
-                        "binary",
-                        "-j",
-                        ".text",
-                        os.path.join(td, "obj.o"),
-                        os.path.join(td, "obj.bin"),
-                    ],
-                    check=True,
-                    capture_output=True,
-                )
-            except subprocess.CalledProcessError as e:
-                logger.error(e.stderr.decode("utf-8"))
-                raise e
-            with open(os.path.join(td, "obj.bin"), "rb") as f:
-                if base != 0:
-                    f.seek(base)
-                binary = f.read()
-                logger.debug(f"Assembled bytes: {bytes(binary).hex()}")
-                return bytes(binary)
+    def _prepare(self, code: str, base=0) -> str:
+        return code
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import logging
+import os
+import subprocess
+
+from ..utils.work_dir import work_dir
+from .assembler import Assembler
+
+logger = logging.getLogger(__name__)
+
+
+class Gas(Assembler):
+    """
+    Base class for assemblers that run a GNU as toolchain.
+
+    A snippet is assembled with ``as`` at its base and extracted with ``objcopy``.
+    """
+
+    def __init__(self, p, assembler: str, objcopy: str, flags: list[str]) -> None:
+        super().__init__(p)
+        self._as = assembler
+        self._objcopy = objcopy
+        self._as_flags = flags
+
+    def _prepare(self, code: str, base=0) -> str:
+        """
+        Returns the assembly source for code placed at base, without the .org directive that
+        places it there.
+        """
+        raise NotImplementedError()
+
+    def _run(self, args: list[str]) -> None:
+        try:
+            subprocess.run(args, check=True, capture_output=True)
+        except subprocess.CalledProcessError as e:
+            logger.error(e.stderr.decode("utf-8"))
+            raise e
+
+    def _assemble(self, code: str, base=0, **kwargs) -> bytes:
+        source = self._prepare(code, base)
+        if base is not None:
+            source = f".org {hex(base)}\n" + source
+        with work_dir() as td:
+            with open(os.path.join(td, "code.s"), "w") as f:
+                f.write(source)
+            self._run(
+                [self._as]
+                + self._as_flags
+                + [
+                    os.path.join(td, "code.s"),
+                    "-o",
+                    os.path.join(td, "obj.o"),
+                ]
+            )
+            self._run(
+                [
+                    self._objcopy,
+                    "-O",
+                    "binary",
+                    "-j",
+                    ".text",
+                    os.path.join(td, "obj.o"),
+                    os.path.join(td, "obj.bin"),
+                ]
+            )
+            with open(os.path.join(td, "obj.bin"), "rb") as f:
+                if base:
+                    f.seek(base)
+                binary = f.read()
+                logger.debug(f"Assembled bytes: {bytes(binary).hex()}")
+                return bytes(binary)
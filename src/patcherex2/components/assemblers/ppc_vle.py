@@ -1,21 +1,24 @@
 import logging
 import os
 import re
-import subprocess
-import tempfile
 
 from ..assets.assets import Assets
-from .assembler import Assembler
+from .gas import Gas
 
 logger = logging.getLogger(__name__)
 
 
-class PpcVle(Assembler):
+class PpcVle(Gas):
     def __init__(self, p) -> None:
-        super().__init__(p)
         self.assets_path = Assets("ppc_vle").path
+        super().__init__(
+            p,
+            os.path.join(self.assets_path, "powerpc-eabivle-as"),
+            os.path.join(self.assets_path, "powerpc-eabivle-objcopy"),
+            [],
+        )
 
-    def _assemble(self, code: str, base=0, **kwargs) -> bytes:
+    def _prepare(self, code: str, base=0) -> str:
         code = re.subn(r"\br(\d+)\b", r"\1", code)[0]
 
         if base is not None:
@@ -58,48 +61,4 @@ class PpcVle(Assembler):
                     code[line_count] = branch_instrs[instr_count]
                     code = "\n".join(code)
                 instr_count += 1
-
-        # set base address
-        if base is not None:
-            code = f".org {hex(base)}\n" + code
-
-        with tempfile.TemporaryDirectory() as td:
-            with open(os.path.join(td, "code.s"), "w") as f:
-                f.write(code)
-            try:
-                subprocess.run(
-                    [
-                        os.path.join(self.assets_path, "powerpc-eabivle-as"),
-                        "-o",
-                        os.path.join(td, "obj.o"),
-                        os.path.join(td, "code.s"),
-                    ],
-                    check=True,
-                    capture_output=True,
-                )
-            except subprocess.CalledProcessError as e:
-                logger.error(e.stderr.decode("utf-8"))
-                raise e
-            try:
-                subprocess.run(
-                    [
-                        os.path.join(self.assets_path, "powerpc-eabivle-objcopy"),
-                        "-O",
-                        "binary",
-                        "-j",
-                        ".text",
-                        os.path.join(td, "obj.o"),
-                        os.path.join(td, "obj.bin"),
-                    ],
-                    check=True,
-                    capture_output=True,
-                )
-            except subprocess.CalledProcessError as e:
-                logger.error(e.stderr.decode("utf-8"))
-                raise e
-            with open(os.path.join(td, "obj.bin"), "rb") as f:
-                if base != 0:
-                    f.seek(base)
-                binary = f.read()
-                logger.debug(f"Assembled bytes: {bytes(binary).hex()}")
-                return bytes(binary)
+        return code
@@ -4,8 +4,6 @@ import tarfile
 import tempfile
 from pathlib import Path
 
-import requests
-
 logger = logging.getLogger(__name__)
 
 
@@ -35,6 +33,8 @@ class Assets:
             self.download()
 
     def download(self) -> None:
+        import requests
+
         r = requests.get(self.url)
         with tempfile.TemporaryDirectory() as td:
             with open(os.path.join(td, "asset.tgz"), "wb") as f:
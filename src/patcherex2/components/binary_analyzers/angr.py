@@ -1,12 +1,17 @@
 from __future__ import annotations
 
 import logging
+import os
 import traceback
+from collections.abc import Iterable
+from typing import TYPE_CHECKING
 
-import angr
-from archinfo import ArchARM
-
+from ..utils.stats import span
 from .binary_analyzer import BinaryAnalyzer
+from .cfg_cache import CachedCFG, CFGCache
+
+if TYPE_CHECKING:
+    import angr
 
 logger = logging.getLogger(__name__)
 
@@ -14,12 +19,35 @@ logger = logging.getLogger(__name__)
 class Angr(BinaryAnalyzer):
     def __init__(self, binary_path: str, **kwargs) -> None:
         self.binary_path = binary_path
-        # self.use_pickle = kwargs.pop("use_pickle", False) # TODO: implement this
         self.angr_kwargs = kwargs.pop("angr_kwargs", {})
         self.angr_cfg_kwargs = kwargs.pop("angr_cfg_kwargs", {})
+        cfg_cache_dir = kwargs.pop(
+            "cfg_cache_dir", os.environ.get("PATCHEREX2_CFG_CACHE_DIR")
+        )
+        self.cfg_cache = CFGCache(cfg_cache_dir) if cfg_cache_dir else None
         self._p = None
         self._cfg = None
         self._load_base = None
+        self._instr_addr_to_node = None
+        self._is_arm = None
+        self._function_blocks = {}
+        self._all_symbols = None
+        self._unused_funcs = None
+        self._unused_func_addrs = None
+
+    def reset(self) -> None:
+        """
+        Drops the loaded project, the CFG and every result derived from them.
+        """
+        self._p = None
+        self._cfg = None
+        self._load_base = None
+        self._instr_addr_to_node = None
+        self._is_arm = None
+        self._function_blocks = {}
+        self._all_symbols = None
+        self._unused_funcs = None
+        self._unused_func_addrs = None
 
     @property
     def load_base(self) -> int:
@@ -40,24 +68,52 @@ class Angr(BinaryAnalyzer):
     @property
     def p(self) -> angr.Project:
         if self._p is None:
+            import angr
+
             logger.info("Loading binary with angr")
             if "load_options" not in self.angr_kwargs:
                 self.angr_kwargs["load_options"] = {"auto_load_libs": False}
-            self._p = angr.Project(self.binary_path, **self.angr_kwargs)
+            with span(self, "binary_analyzer.load"):
+                self._p = angr.Project(self.binary_path, **self.angr_kwargs)
             logger.info("Loaded binary with angr")
         return self._p
 
     @property
-    def cfg(self) -> angr.analyses.cfg.cfg_fast.CFGFast:
+    def cfg(self) -> angr.analyses.cfg.cfg_fast.CFGFast | CachedCFG:
         if self._cfg is None:
-            logger.info("Generating CFG with angr")
             if "normalize" not in self.angr_cfg_kwargs:
                 # NOTE: This will split basic blocks if another block jumps to the middle of the block
                 self.angr_cfg_kwargs["normalize"] = True
-            self._cfg = self.p.analyses.CFGFast(**self.angr_cfg_kwargs)
-            logger.info("Generated CFG with angr")
+            cache_key = None
+            if self.cfg_cache is not None:
+                project = self.p  # make sure the default load options are in place
+                cache_key = self.cfg_cache.key(
+                    self.binary_path, self.angr_kwargs, self.angr_cfg_kwargs
+                )
+                with span(self, "binary_analyzer.cfg_cache"):
+                    self._cfg = self.cfg_cache.load(cache_key, project)
+            if self._cfg is None:
+                logger.info("Generating CFG with angr")
+                with span(self, "binary_analyzer.cfg"):
+                    self._cfg = self.p.analyses.CFGFast(**self.angr_cfg_kwargs)
+                logger.info("Generated CFG with angr")
+                if cache_key is not None:
+                    self.cfg_cache.store(cache_key, self.p, self._cfg.model)
         return self._cfg
 
+    @property
+    def instr_addr_to_node(self) -> dict[int, angr.knowledge_plugins.cfg.CFGNode]:
+        """
+        Maps every (denormalized) instruction address in the CFG to the first node containing it.
+        """
+        if self._instr_addr_to_node is None:
+            index = {}
+            for node in self.cfg.model.nodes():
+                for instr_addr in node.instruction_addrs:
+                    index.setdefault(instr_addr, node)
+            self._instr_addr_to_node = index
+        return self._instr_addr_to_node
+
     def mem_addr_to_file_offset(self, addr: int) -> int:
         addr = self.denormalize_addr(addr)
         file_addr = self.p.loader.main_object.addr_to_offset(addr)
@@ -74,11 +130,47 @@ class Angr(BinaryAnalyzer):
             addr += 1
         addr = self.denormalize_addr(addr)
 
+        node = self.cfg.model.get_any_node(addr, anyaddr=True)
+        blocks = (
+            self._get_function_blocks(node.function_address)
+            if node is not None
+            else None
+        )
+        if blocks is None:
+            bb = self.instr_addr_to_node.get(addr)
+            assert bb is not None
+            return {
+                "start": self.normalize_addr(bb.addr),
+                "end": self.normalize_addr(bb.addr + bb.size),
+                "size": bb.size,
+                "instruction_addrs": [
+                    self.normalize_addr(addr)
+                    - (1 if self.is_thumb(self.normalize_addr(addr)) else 0)
+                    for addr in bb.instruction_addrs
+                ],
+            }
+
+        if addr in blocks:
+            block = blocks[addr]
+            return {**block, "instruction_addrs": list(block["instruction_addrs"])}
+
+        raise Exception(f"Cannot find a block containing address {hex(addr)}")
+
+    def _get_function_blocks(
+        self, func_addr: int
+    ) -> dict[int, dict[str, int | list[int]]] | None:
+        """
+        Computes the supergraph blocks of a function once and maps each (denormalized) instruction
+        address to its block. Returns None if RegionIdentifier fails for the function.
+        """
+        if func_addr in self._function_blocks:
+            return self._function_blocks[func_addr]
+
+        blocks = {}
         try:
-            func = self.p.kb.functions.function(
-                self.cfg.model.get_any_node(addr, anyaddr=True).function_address
-            )
-            ri = self.p.analyses.RegionIdentifier(func)
+            func = self.p.kb.functions.function(func_addr)
+            with span(self, "binary_analyzer.region_identifier"):
+                ri = self.p.analyses.RegionIdentifier(func)
             graph = ri._graph.copy()
             ri._make_supergraph(graph)
 
@@ -94,43 +186,26 @@ class Angr(BinaryAnalyzer):
                     for instr_addr in func.get_block(node.addr).instruction_addrs
                 ]
 
-                if addr in instr_addrs:
-                    return {
-                        "start": self.normalize_addr(start),
-                        "end": self.normalize_addr(end),
-                        "size": size,
-                        "instruction_addrs": [
-                            self.normalize_addr(instr_addr)
-                            - (
-                                1
-                                if self.is_thumb(self.normalize_addr(instr_addr))
-                                else 0
-                            )
-                            for instr_addr in instr_addrs
-                        ],
-                    }
+                block = {
+                    "start": self.normalize_addr(start),
+                    "end": self.normalize_addr(end),
+                    "size": size,
+                    "instruction_addrs": [
+                        self.normalize_addr(instr_addr)
+                        - (1 if self.is_thumb(self.normalize_addr(instr_addr)) else 0)
+                        for instr_addr in instr_addrs
+                    ],
+                }
+                for instr_addr in instr_addrs:
+                    blocks.setdefault(instr_addr, block)
         except Exception:
             logger.error(
-                f"angr RegionIdentifier failed for function containing {hex(addr)}, falling back to use cfg nodes\n{traceback.format_exc()}"
+                f"angr RegionIdentifier failed for function {hex(func_addr)}, falling back to use cfg nodes\n{traceback.format_exc()}"
             )
-            bb = None
-            for node in self.cfg.model.nodes():
-                if addr in node.instruction_addrs:
-                    bb = node
-                    break
-            assert bb is not None
-            return {
-                "start": self.normalize_addr(bb.addr),
-                "end": self.normalize_addr(bb.addr + bb.size),
-                "size": bb.size,
-                "instruction_addrs": [
-                    self.normalize_addr(addr)
-                    - (1 if self.is_thumb(self.normalize_addr(addr)) else 0)
-                    for addr in bb.instruction_addrs
-                ],
-            }
+            blocks = None
 
-        raise Exception(f"Cannot find a block containing address {hex(addr)}")
+        self._function_blocks[func_addr] = blocks
+        return blocks
 
     def get_instr_bytes_at(self, addr: int, num_instr=1) -> angr.Block:
         addr += 1 if self.is_thumb(addr) else 0
@@ -139,28 +214,44 @@ class Angr(BinaryAnalyzer):
         # angr will return both instrs, even when num_instr is 1
         return self.p.factory.block(addr, num_inst=num_instr).bytes
 
+    def _referenced_addrs(self) -> set[int]:
+        # targets of cross references and of calls from other functions
+        referenced = set(self.p.kb.xrefs.xrefs_by_dst)
+        referenced.update(dst for src, dst in self.p.kb.callgraph.edges() if src != dst)
+        return referenced
+
     def get_unused_funcs(self) -> list[dict[str, int]]:
-        logger.info("Getting unused functions with angr")
-        unused_funcs = []
         assert self.cfg is not None
-        for func in self.p.kb.functions.values():
-            if func.size == 0:
-                continue
-            for dst, _ in self.p.kb.xrefs.xrefs_by_dst.items():
-                if dst == func.addr:
-                    break
-            else:
+        if self._unused_funcs is None:
+            logger.info("Getting unused functions with angr")
+            referenced = self._referenced_addrs()
+            unused_funcs = []
+            for func in self.p.kb.functions.values():
+                if func.size == 0 or func.addr in referenced:
+                    continue
+                addr = self.normalize_addr(func.addr)
                 unused_funcs.append(
                     {
-                        "addr": self.normalize_addr(func.addr)
-                        - (1 if self.is_thumb(self.normalize_addr(func.addr)) else 0),
+                        "addr": addr - (1 if self.is_thumb(addr) else 0),
                         "size": func.size,
                     }
                 )
-        return unused_funcs
+            self._unused_funcs = unused_funcs
+        return [dict(func) for func in self._unused_funcs]
+
+    def filter_unused_funcs(self, addrs: Iterable[int]) -> list[int]:
+        """
+        Returns the addresses among addrs that are the start of an unused function, see
+        get_unused_funcs, keeping their order.
+        """
+        if self._unused_func_addrs is None:
+            self._unused_func_addrs = {func["addr"] for func in self.get_unused_funcs()}
+        return [addr for addr in addrs if addr in self._unused_func_addrs]
 
     def get_all_symbols(self) -> dict[str, int]:
         assert self.cfg is not None
+        if self._all_symbols is not None:
+            return dict(self._all_symbols)
         logger.info("Getting all symbols with angr")
         symbols = {}
         for symbol in self.p.loader.main_object.symbols:
@@ -169,10 +260,15 @@ class Angr(BinaryAnalyzer):
             symbols[symbol.name] = self.normalize_addr(symbol.rebased_addr)
         for func in self.p.kb.functions.values():
             # make it compatible with old angr versions
-            if func.is_simprocedure or (getattr(func, "is_alignment", func.alignment)):
+            if (
+                func.is_simprocedure
+                or getattr(func, "is_alignment", None)
+                or getattr(func, "alignment", False)
+            ):
                 continue
             symbols[func.name] = self.normalize_addr(func.addr)
-        return symbols
+        self._all_symbols = symbols
+        return dict(symbols)
 
     def get_function(self, name_or_addr: int | str) -> dict[str, int] | None:
         assert self.cfg is not None
@@ -192,16 +288,18 @@ class Angr(BinaryAnalyzer):
             raise Exception(f"Invalid type for name_or_addr: {type(name_or_addr)}")
 
     def is_thumb(self, addr: int) -> bool:
-        if not isinstance(self.p.arch, ArchARM):
+        if self._is_arm is None:
+            from archinfo import ArchARM
+
+            self._is_arm = isinstance(self.p.arch, ArchARM)
+        if not self._is_arm:
             return False
         addr = self.denormalize_addr(addr)
 
-        for node in self.cfg.model.nodes():
-            if addr in node.instruction_addrs:
-                return node.thumb
-        else:
-            if addr % 2 == 0:
-                return self.is_thumb(self.normalize_addr(addr + 1))
-            else:
-                logger.error(f"Cannot find a block containing address {hex(addr)}")
-                return False
+        node = self.instr_addr_to_node.get(addr)
+        if node is not None:
+            return node.thumb
+        if addr % 2 == 0:
+            return self.is_thumb(self.normalize_addr(addr + 1))
+        logger.error(f"Cannot find a block containing address {hex(addr)}")
+        return False
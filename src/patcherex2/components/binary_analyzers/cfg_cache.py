@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+import traceback
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import angr
+
+logger = logging.getLogger(__name__)
+
+
+class CachedCFG:
+    """
+    Stand-in for a CFGFast analysis restored from the cache. It exposes the attributes that the
+    binary analyzer relies on.
+    """
+
+    def __init__(self, model, kb) -> None:
+        self.model = model
+        self.kb = kb
+        self.functions = kb.functions
+
+
+class CFGCache:
+    """
+    On-disk cache for angr CFGs, keyed by the SHA-256 of the binary, the angr version and the
+    options used to load the binary and to generate the CFG. Each entry holds the CFG model
+    together with the knowledge base (functions, xrefs, ...). Entries written by another angr
+    version or that fail to load are considered stale and removed. The total size of the cache
+    directory is bounded, least recently used entries are evicted first.
+
+    Entries are pickles, so loading one can run arbitrary code. The cache directory is created
+    private to the current user, and entries owned by another user are ignored, but a directory
+    shared with untrusted users should not be used.
+    """
+
+    # plugins that only hold runtime state and are recreated on demand
+    _SKIPPED_PLUGINS = ("rtdb",)
+
+    def __init__(self, cache_dir: str, max_size: int = 2 * 1024 * 1024 * 1024) -> None:
+        """
+        :param cache_dir: Directory to store the cached CFGs in
+        :param max_size: Maximum total size in bytes of the cache directory, defaults to 2 GiB
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+
+    @staticmethod
+    def hash_file(path: str) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def key(self, binary_path: str, angr_kwargs: dict, cfg_kwargs: dict) -> str:
+        import angr
+
+        payload = json.dumps(
+            {
+                "binary": self.hash_file(binary_path),
+                "angr": angr.__version__,
+                "angr_kwargs": angr_kwargs,
+                "cfg_kwargs": cfg_kwargs,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def load(self, key: str, project: angr.Project) -> CachedCFG | None:
+        import angr
+
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                if not self._owned(os.fstat(f.fileno())):
+                    logger.warning(
+                        f"Ignoring CFG cache entry {path} owned by another user"
+                    )
+                    return None
+                entry = pickle.load(f)
+            if entry["key"] != key or entry["angr"] != angr.__version__:
+                raise ValueError("stale entry")
+        except Exception:
+            logger.warning(f"Removing stale CFG cache entry {path}")
+            self._remove(path)
+            return None
+        os.utime(path)
+
+        kb = entry["kb"]
+        object.__setattr__(kb, "_project", project)
+        project.kb = kb
+        logger.info(f"Loaded CFG from cache {path}")
+        return CachedCFG(entry["model"], kb)
+
+    def store(self, key: str, project: angr.Project, model) -> None:
+        import angr
+
+        kb = project.kb
+        plugins = kb._plugins
+        skipped = {k: v for k, v in plugins.items() if k in self._SKIPPED_PLUGINS}
+        # the project is reloaded from the binary, don't pickle it along with the kb
+        object.__setattr__(kb, "_project", None)
+        for name in skipped:
+            del plugins[name]
+        try:
+            data = pickle.dumps(
+                {"key": key, "angr": angr.__version__, "kb": kb, "model": model},
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        except Exception:
+            logger.warning(f"Failed to serialize CFG:\n{traceback.format_exc()}")
+            return
+        finally:
+            object.__setattr__(kb, "_project", project)
+            plugins.update(skipped)
+
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir)
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        logger.info(f"Stored CFG in cache {path}")
+        self._evict()
+
+    @staticmethod
+    def _owned(st: os.stat_result) -> bool:
+        # there are no file owners to check on Windows
+        return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.cfg")
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".cfg"):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            logger.debug(f"Evicting CFG cache entry {path}")
+            self._remove(path)
+            total -= size
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 import logging
 import tempfile
+from collections.abc import Iterable
 
 from .binary_analyzer import BinaryAnalyzer
 
@@ -24,6 +25,9 @@ class Ghidra(BinaryAnalyzer):
         self.ghidra = ghidra
 
         self.bbm = self.ghidra.program.model.block.BasicBlockModel(self.currentProgram)
+        self._all_symbols = None
+        self._unused_funcs = None
+        self._unused_func_addrs = None
 
     def shutdown(self):
         self.pyhidra_ctx.__exit__(None, None, None)
@@ -86,21 +90,34 @@ class Ghidra(BinaryAnalyzer):
         return b
 
     def get_unused_funcs(self) -> list[dict[str, int]]:
-        logger.info("getting unused funcs with ghidra")
-        fi = self.currentProgram.getListing().getFunctions(True)
-        unused_funcs = []
-        for f in fi:
-            if not f.getSymbol().hasReferences():
-                b = f.getBody()
-                unused_funcs.append(
-                    {
-                        "addr": self.normalize_addr(b.getMinAddress()),
-                        "size": b.getNumAddresses(),
-                    }
-                )
-        return unused_funcs
+        if self._unused_funcs is None:
+            logger.info("getting unused funcs with ghidra")
+            fi = self.currentProgram.getListing().getFunctions(True)
+            unused_funcs = []
+            for f in fi:
+                if not f.getSymbol().hasReferences():
+                    b = f.getBody()
+                    unused_funcs.append(
+                        {
+                            "addr": self.normalize_addr(b.getMinAddress()),
+                            "size": b.getNumAddresses(),
+                        }
+                    )
+            self._unused_funcs = unused_funcs
+        return [dict(func) for func in self._unused_funcs]
+
+    def filter_unused_funcs(self, addrs: Iterable[int]) -> list[int]:
+        """
+        Returns the addresses among addrs that are the start of an unused function, see
+        get_unused_funcs, keeping their order.
+        """
+        if self._unused_func_addrs is None:
+            self._unused_func_addrs = {func["addr"] for func in self.get_unused_funcs()}
+        return [addr for addr in addrs if addr in self._unused_func_addrs]
 
     def get_all_symbols(self) -> dict[str, int]:
+        if self._all_symbols is not None:
+            return dict(self._all_symbols)
         logger.info("getting all symbols with ghidra")
         symbols = {}
         # si = self.currentProgram.getSymbolTable().getAllSymbols(True)
@@ -116,7 +133,8 @@ class Ghidra(BinaryAnalyzer):
             symbols[f.getName()] = self.normalize_addr(f.getEntryPoint())
             if self.is_thumb(symbols[f.getName()]):
                 symbols[f.getName()] += 1
-        return symbols
+        self._all_symbols = symbols
+        return dict(symbols)
 
     def get_function(self, name_or_addr: int | str) -> dict[str, int] | None:
         if isinstance(name_or_addr, int):
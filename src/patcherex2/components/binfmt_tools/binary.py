@@ -14,7 +14,6 @@ class Binary(BinFmtTool):
         self._file = open(binary_path, "rb")
         self.file_size = self._file.seek(0, io.SEEK_END)
         self._file.seek(0)
-        self.file_updates = []
 
     def __del__(self) -> None:
         self._file.close()
@@ -32,39 +31,10 @@ class Binary(BinFmtTool):
             self._file.seek(0)
             f.write(self._file.read())
             # apply the updates
-            for update in self.file_updates:
-                f.seek(update["offset"])
-                f.write(update["content"])
+            for offset, content in self.file_updates:
+                f.seek(offset)
+                f.write(content)
 
-    def update_binary_content(self, offset: int, new_content: bytes) -> None:
-        logger.debug(
-            f"Updating offset {hex(offset)} with content ({len(new_content)} bytes) {new_content.hex()}"
-        )
-        for update in self.file_updates:
-            if offset >= update["offset"] and offset < update["offset"] + len(
-                update["content"]
-            ):
-                raise ValueError(
-                    f"Cannot update offset {hex(offset)} with content {new_content}, it overlaps with a previous update"
-                )
-        self.file_updates.append({"offset": offset, "content": new_content})
-        if offset + len(new_content) > self.file_size:
-            self.file_size = offset + len(new_content)
-
-    def get_binary_content(self, offset: int, size: int) -> bytes:
-        # FIXME: content partially in the file and partially in the updates (check other binfmt tools as well)
-        # check if it's in the file updates
-        for update in self.file_updates:
-            if offset >= update["offset"] and offset + size <= update["offset"] + len(
-                update["content"]
-            ):
-                return update["content"][
-                    offset - update["offset"] : offset - update["offset"] + size
-                ]
-        # otherwise read from the file
+    def _get_original_content(self, offset: int, size: int) -> bytes:
         self._file.seek(offset)
         return self._file.read(size)
-
-    def append_to_binary_content(self, new_content: bytes) -> None:
-        self.file_updates.append({"offset": self.file_size, "content": new_content})
-        self.file_size += len(new_content)
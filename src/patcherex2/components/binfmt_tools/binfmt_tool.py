@@ -1,21 +1,145 @@
+from __future__ import annotations
+
+import bisect
 import logging
+from collections.abc import Callable, Iterator
 
 logger = logging.getLogger(__name__)
 
 
+class UpdateStore:
+    """
+    Pending updates to the binary content, kept as disjoint segments sorted by offset.
+
+    A new update overwrites whatever older updates it overlaps, so iterating the store yields the
+    effective content in offset order. Overlap checks and range reads are O(log n) in the number of
+    segments (plus the number of segments touched by a read).
+    """
+
+    def __init__(self) -> None:
+        self._offsets = []
+        self._contents = []
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    def __iter__(self) -> Iterator[tuple[int, bytes]]:
+        return zip(self._offsets, self._contents)
+
+    @property
+    def end(self) -> int:
+        """
+        Offset right after the last updated byte, 0 if there are no updates.
+        """
+        if not self._offsets:
+            return 0
+        return self._offsets[-1] + len(self._contents[-1])
+
+    def _first_overlapping(self, offset: int) -> int:
+        # index of the first segment that ends after offset
+        i = bisect.bisect_right(self._offsets, offset) - 1
+        if i < 0 or self._offsets[i] + len(self._contents[i]) <= offset:
+            i += 1
+        return i
+
+    def contains(self, offset: int) -> bool:
+        """
+        Whether offset lies within a previous update.
+        """
+        i = self._first_overlapping(offset)
+        return i < len(self._offsets) and self._offsets[i] <= offset
+
+    def add(self, offset: int, content: bytes) -> None:
+        if not content:
+            return
+        content = bytes(content)
+        end = offset + len(content)
+        lo = self._first_overlapping(offset)
+        hi = bisect.bisect_left(self._offsets, end)
+        offsets = [offset]
+        contents = [content]
+        if lo < hi:
+            # keep the parts of the overlapped segments that stick out on either side
+            first_offset, first_content = self._offsets[lo], self._contents[lo]
+            if first_offset < offset:
+                offsets.insert(0, first_offset)
+                contents.insert(0, first_content[: offset - first_offset])
+            last_offset, last_content = self._offsets[hi - 1], self._contents[hi - 1]
+            if last_offset + len(last_content) > end:
+                offsets.append(end)
+                contents.append(last_content[end - last_offset :])
+        self._offsets[lo:hi] = offsets
+        self._contents[lo:hi] = contents
+
+    def read(
+        self, offset: int, size: int, read_original: Callable[[int, int], bytes]
+    ) -> bytes:
+        """
+        Reads size bytes at offset, taking updated bytes from the store and everything else
+        from read_original(offset, size).
+        """
+        end = offset + size
+        result = bytearray()
+        pos = offset
+        i = self._first_overlapping(offset)
+        while i < len(self._offsets) and self._offsets[i] < end:
+            seg_offset, seg_content = self._offsets[i], self._contents[i]
+            if seg_offset > pos:
+                result += read_original(pos, seg_offset - pos)
+                pos = seg_offset
+            chunk = seg_content[pos - seg_offset : end - seg_offset]
+            result += chunk
+            pos += len(chunk)
+            i += 1
+        if pos < end:
+            result += read_original(pos, end - pos)
+        return bytes(result)
+
+
 class BinFmtTool:
     def __init__(self, p, binary_path: str) -> None:
         self.p = p
         self.binary_path = binary_path
+        self.file_updates = UpdateStore()
+        # if set to a list, updates are recorded in it as (offset, content), see Session
+        self.journal = None
 
     def _init_memory_analysis(self) -> None:
         raise NotImplementedError()
 
-    def save_binary(self, filename=None) -> None:
+    def _get_original_content(self, offset: int, size: int) -> bytes:
         raise NotImplementedError()
 
-    def update_binary_content(self, offset: str, new_content: bytes) -> None:
+    def save_binary(self, filename=None) -> None:
         raise NotImplementedError()
 
+    def get_entry_points(self) -> set[int]:
+        """
+        Returns the memory addresses that the loader or the runtime may run without any reference
+        to them in the code, e.g. the entry point and the constructors. Empty if the format doesn't
+        tell.
+        """
+        return set()
+
+    def update_binary_content(self, offset: int, new_content: bytes) -> None:
+        logger.debug(
+            f"Updating offset {hex(offset)} with content ({len(new_content)} bytes) {new_content.hex()}"
+        )
+        if self.file_updates.contains(offset):
+            raise ValueError(
+                f"Cannot update offset {hex(offset)} with content {new_content}, it overlaps with a previous update"
+            )
+        self.file_updates.add(offset, new_content)
+        if self.journal is not None:
+            self.journal.append((offset, bytes(new_content)))
+        if offset + len(new_content) > self.file_size:
+            self.file_size = offset + len(new_content)
+
+    def get_binary_content(self, offset: int, size: int) -> bytes:
+        return self.file_updates.read(offset, size, self._get_original_content)
+
     def append_to_binary_content(self, new_content: bytes) -> None:
-        raise NotImplementedError()
+        self.file_updates.add(self.file_size, new_content)
+        if self.journal is not None and new_content:
+            self.journal.append((self.file_size, bytes(new_content)))
+        self.file_size += len(new_content)
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import logging
+import mmap
 import os
+import shutil
+import struct
 
 from elftools.construct.lib import Container
 from elftools.elf.constants import P_FLAGS, SH_FLAGS
@@ -22,18 +25,20 @@ class ELF(BinFmtTool):
     def __init__(self, p, binary_path: str) -> None:
         super().__init__(p, binary_path)
         self._file = open(binary_path, "rb")
-        self._elf = ELFFile(self._file)
+        # pyelftools and get_binary_content share one read-only mapping of the file,
+        # so only the pages that are actually touched become resident
+        self.original_binary_content = mmap.mmap(
+            self._file.fileno(), 0, access=mmap.ACCESS_READ
+        )
+        self._elf = ELFFile(self.original_binary_content)
         self._segments = [segment.header for segment in self._elf.iter_segments()]
         self._sections = [section.header for section in self._elf.iter_sections()]
-        self.file_updates = []
 
-        self.file_size = os.stat(self.binary_path).st_size
-        with open(self.binary_path, "rb") as f:
-            self.original_binary_content = f.read()
-        self.updated_binary_content = self.original_binary_content
+        self.file_size = len(self.original_binary_content)
         self._init_memory_analysis()
 
     def __del__(self) -> None:
+        self.original_binary_content.close()
         self._file.close()
 
     def _find_space_between_sections(self) -> None:
@@ -248,6 +253,48 @@ class ELF(BinFmtTool):
         #             "callback": self._extend_segment
         #         })
 
+    def get_entry_points(self) -> set[int]:
+        entry_points = {self._elf.header["e_entry"]}
+        ptr_format = ("<" if self._elf.little_endian else ">") + (
+            "Q" if self._elf.elfclass == 64 else "I"
+        )
+        ptr_size = struct.calcsize(ptr_format)
+        code_ranges = [
+            (segment["p_vaddr"], segment["p_vaddr"] + segment["p_memsz"])
+            for segment in self._segments
+            if segment["p_type"] == "PT_LOAD" and segment["p_flags"] & P_FLAGS.PF_X
+        ]
+        for section in self._elf.iter_sections():
+            if (
+                section["sh_flags"] & SH_FLAGS.SHF_ALLOC
+                and not section["sh_flags"] & SH_FLAGS.SHF_EXECINSTR
+                and section["sh_type"] != "SHT_NOBITS"
+            ):
+                # function pointers in data, e.g. init/fini arrays, dispatch tables, vtables
+                data = section.data()
+                start = -section["sh_addr"] % ptr_size
+                end = start + (len(data) - start) // ptr_size * ptr_size
+                for (value,) in struct.iter_unpack(ptr_format, data[start:end]):
+                    if any(lo <= value < hi for lo, hi in code_ranges):
+                        entry_points.add(value)
+            if section["sh_type"] == "SHT_DYNAMIC":
+                for tag in section.iter_tags():
+                    if tag.entry.d_tag in ("DT_INIT", "DT_FINI"):
+                        entry_points.add(tag.entry.d_val)
+            elif section["sh_type"] == "SHT_DYNSYM":
+                # exported functions can be called by other objects
+                for symbol in section.iter_symbols():
+                    if (
+                        symbol["st_info"]["type"] == "STT_FUNC"
+                        and symbol["st_shndx"] != "SHN_UNDEF"
+                    ):
+                        entry_points.add(symbol["st_value"])
+            elif section["sh_type"] == "SHT_RELA":
+                # e.g. function pointers of position independent code
+                for reloc in section.iter_relocations():
+                    entry_points.add(reloc["r_addend"])
+        return entry_points
+
     def finalize(self) -> None:
         self.p.allocation_manager.finalize()
 
@@ -279,55 +326,34 @@ class ELF(BinFmtTool):
         # sort segments by p_offset
         self._segments = sorted(self._segments, key=lambda x: x["p_offset"])
 
-        # try to merge load segments if they are adjacent and have the same flags and same alignment
-        # new size = sum of sizes of the two segments + gap between them
-        while True:
-            new_segments = []
-            i = 0
-            while i < len(self._segments) - 1:
-                prev_seg = self._segments[i]
-                next_seg = self._segments[i + 1]
-                if (
-                    prev_seg["p_type"] == next_seg["p_type"] == "PT_LOAD"
-                    and prev_seg["p_offset"] + prev_seg["p_filesz"]
-                    == next_seg["p_offset"]
-                    and prev_seg["p_vaddr"] + prev_seg["p_memsz"] == next_seg["p_vaddr"]
-                    and prev_seg["p_flags"] == next_seg["p_flags"]
-                    and prev_seg["p_align"] == next_seg["p_align"]
-                ):
-                    new_segments.append(
-                        Container(
-                            **{
-                                "p_type": "PT_LOAD",
-                                "p_offset": prev_seg["p_offset"],
-                                "p_filesz": prev_seg["p_filesz"]
-                                + next_seg["p_filesz"]
-                                + (
-                                    next_seg["p_offset"]
-                                    - (prev_seg["p_offset"] + prev_seg["p_filesz"])
-                                ),
-                                "p_vaddr": prev_seg["p_vaddr"],
-                                "p_paddr": prev_seg["p_paddr"],
-                                "p_memsz": prev_seg["p_memsz"]
-                                + next_seg["p_memsz"]
-                                + (
-                                    next_seg["p_vaddr"]
-                                    - (prev_seg["p_vaddr"] + prev_seg["p_memsz"])
-                                ),
-                                "p_flags": prev_seg["p_flags"],
-                                "p_align": prev_seg["p_align"],
-                            }
-                        )
-                    )
-                    i += 2
-                else:
-                    new_segments.append(prev_seg)
-                    i += 1
-            if i == len(self._segments) - 1:
-                new_segments.append(self._segments[i])
-            if new_segments == self._segments:
-                break
-            self._segments = new_segments
+        # merge load segments if they are adjacent and have the same flags and same alignment,
+        # in one sweep as a merged segment can be merged with the next one again
+        merged_segments = []
+        for segment in self._segments:
+            prev_seg = merged_segments[-1] if merged_segments else None
+            if (
+                prev_seg is not None
+                and prev_seg["p_type"] == segment["p_type"] == "PT_LOAD"
+                and prev_seg["p_offset"] + prev_seg["p_filesz"] == segment["p_offset"]
+                and prev_seg["p_vaddr"] + prev_seg["p_memsz"] == segment["p_vaddr"]
+                and prev_seg["p_flags"] == segment["p_flags"]
+                and prev_seg["p_align"] == segment["p_align"]
+            ):
+                merged_segments[-1] = Container(
+                    **{
+                        "p_type": "PT_LOAD",
+                        "p_offset": prev_seg["p_offset"],
+                        "p_filesz": prev_seg["p_filesz"] + segment["p_filesz"],
+                        "p_vaddr": prev_seg["p_vaddr"],
+                        "p_paddr": prev_seg["p_paddr"],
+                        "p_memsz": prev_seg["p_memsz"] + segment["p_memsz"],
+                        "p_flags": prev_seg["p_flags"],
+                        "p_align": prev_seg["p_align"],
+                    }
+                )
+            else:
+                merged_segments.append(segment)
+        self._segments = merged_segments
 
         if (
             len(
@@ -340,11 +366,8 @@ class ELF(BinFmtTool):
             <= load_segment_count
         ):
             # just rebuild segment headers, it will be in place so we don't care if there is PHDR or not
-            new_phdr = b""
-            for segment in self._segments:
-                new_phdr += self._elf.structs.Elf_Phdr.build(segment)
             self.p.binfmt_tool.update_binary_content(
-                self._elf.header["e_phoff"], new_phdr
+                self._elf.header["e_phoff"], self._build_phdrs()
             )
             ehdr = self._elf.header
             ehdr["e_phnum"] = len(self._segments)
@@ -368,62 +391,28 @@ class ELF(BinFmtTool):
 
             # magic
             # TODO: should we use the max_align of the segments?
+            # the load segments relative to the first one, rounded out to multiples of max_align
             load_segments_rounded = []
             first_load_segment = None
             for segment in self._segments:
                 if segment["p_type"] == "PT_LOAD":
                     if first_load_segment is None:
                         first_load_segment = segment
+                    start = segment["p_vaddr"] - first_load_segment["p_vaddr"]
+                    end = start + segment["p_memsz"]
                     load_segments_rounded.append(
-                        (
-                            # start of the segment, round down to multiple of max_align
-                            (segment["p_vaddr"] - first_load_segment["p_vaddr"])
-                            - (
-                                (segment["p_vaddr"] - first_load_segment["p_vaddr"])
-                                % max_align
-                            ),
-                            # end of the segment, round up to multiple of max_align
-                            int(
-                                (
-                                    segment["p_vaddr"]
-                                    + segment["p_memsz"]
-                                    - first_load_segment["p_vaddr"]
-                                    + max_align
-                                    - 1
-                                )
-                                / max_align
-                            )
-                            * max_align,
-                        )
+                        (start - start % max_align, -(-end // max_align) * max_align)
                     )
-            load_segments_rounded = sorted(load_segments_rounded, key=lambda x: x[0])
-
-            # combine overlapping load segments
-            while True:
-                new_load_segments_rounded = []
-                i = 0
-                while i < len(load_segments_rounded) - 1:
-                    prev_seg = load_segments_rounded[i]
-                    next_seg = load_segments_rounded[i + 1]
-                    if prev_seg[1] > next_seg[0]:  # two segments overlap
-                        new_load_segments_rounded.append(
-                            (prev_seg[0], next_seg[1])
-                        )  # append combine of two segments
-                        i += 2
-                    else:
-                        new_load_segments_rounded.append(
-                            prev_seg
-                        )  # append segment without overlap
-                        i += 1
-                if i == len(load_segments_rounded) - 1:
-                    new_load_segments_rounded.append(
-                        load_segments_rounded[i]
-                    )  # append last segment if without overlapping
-                if new_load_segments_rounded == load_segments_rounded:  # if no overlap
-                    break
-                load_segments_rounded = (
-                    new_load_segments_rounded  # combined segments, run again
-                )
+            load_segments_rounded.sort(key=lambda x: x[0])
+
+            # combine overlapping load segments, in one sweep over the sorted ranges
+            combined = []
+            for start, end in load_segments_rounded:
+                if combined and combined[-1][1] > start:
+                    combined[-1] = (combined[-1][0], max(combined[-1][1], end))
+                else:
+                    combined.append((start, end))
+            load_segments_rounded = combined
 
             for prev_seg, next_seg in zip(
                 load_segments_rounded[:-1], load_segments_rounded[1:]
@@ -469,10 +458,7 @@ class ELF(BinFmtTool):
             self._segments = sorted(
                 self._segments, key=lambda x: (x["p_type"] != "PT_PHDR", x["p_offset"])
             )
-            new_phdr = b""
-            for segment in self._segments:
-                new_phdr += self._elf.structs.Elf_Phdr.build(segment)
-            self.p.binfmt_tool.update_binary_content(phdr_start, new_phdr)
+            self.p.binfmt_tool.update_binary_content(phdr_start, self._build_phdrs())
 
             ehdr = self._elf.header
             ehdr["e_phnum"] = len(self._segments)
@@ -480,49 +466,30 @@ class ELF(BinFmtTool):
             new_ehdr = self._elf.structs.Elf_Ehdr.build(ehdr)
             self.p.binfmt_tool.update_binary_content(0, new_ehdr)
 
-    def save_binary(self, filename: str | None = None) -> None:
-        self.updated_binary_content = self.updated_binary_content.ljust(
-            self.file_size, b"\x00"
-        )
-        for update in self.file_updates:
-            self.updated_binary_content = (
-                self.updated_binary_content[: update["offset"]]
-                + update["content"]
-                + self.updated_binary_content[
-                    update["offset"] + len(update["content"]) :
-                ]
+    def _build_phdrs(self) -> bytes:
+        # serialize all program headers into one buffer
+        phentsize = self._elf.structs.Elf_Phdr.sizeof()
+        phdrs = bytearray(phentsize * len(self._segments))
+        for i, segment in enumerate(self._segments):
+            phdrs[i * phentsize : (i + 1) * phentsize] = (
+                self._elf.structs.Elf_Phdr.build(segment)
             )
+        return bytes(phdrs)
+
+    def save_binary(self, filename: str | None = None) -> None:
         if filename is None:
             filename = f"{self.binary_path}.patched"
-        with open(filename, "wb") as f:
-            f.write(self.updated_binary_content)
+        if not (
+            os.path.exists(filename) and os.path.samefile(filename, self.binary_path)
+        ):
+            shutil.copyfile(self.binary_path, filename)
+        # apply the updates in place, the output is never materialized in memory
+        with open(filename, "r+b") as f:
+            f.truncate(self.file_size)
+            with mmap.mmap(f.fileno(), self.file_size) as mm:
+                for offset, content in self.file_updates:
+                    mm[offset : offset + len(content)] = content
         os.chmod(filename, 0o755)
 
-    def update_binary_content(self, offset: int, new_content: bytes) -> None:
-        logger.debug(
-            f"Updating offset {hex(offset)} with content ({len(new_content)} bytes) {new_content.hex()}"
-        )
-        for update in self.file_updates:
-            if offset >= update["offset"] and offset < update["offset"] + len(
-                update["content"]
-            ):
-                raise ValueError(
-                    f"Cannot update offset {hex(offset)} with content {new_content}, it overlaps with a previous update"
-                )
-        self.file_updates.append({"offset": offset, "content": new_content})
-        if offset + len(new_content) > self.file_size:
-            self.file_size = offset + len(new_content)
-
-    def get_binary_content(self, offset: int, size: int) -> bytes:
-        # check if it's in file_updates
-        for update in self.file_updates:
-            if offset >= update["offset"] and offset + size <= update["offset"] + len(
-                update["content"]
-            ):
-                return update["content"][offset - update["offset"] :]
-        # otherwise return from original binary
+    def _get_original_content(self, offset: int, size: int) -> bytes:
         return self.original_binary_content[offset : offset + size]
-
-    def append_to_binary_content(self, new_content: bytes) -> None:
-        self.file_updates.append({"offset": self.file_size, "content": new_content})
-        self.file_size += len(new_content)
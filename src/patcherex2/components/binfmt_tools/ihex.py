@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-import io
+import itertools
 import logging
 
 import intelhex
@@ -10,13 +10,17 @@ from .binfmt_tool import BinFmtTool
 logger = logging.getLogger(__name__)
 
 
+def _record(rectype: int, addr: int, data: bytes) -> str:
+    record = bytes([len(data), addr >> 8, addr & 0xFF, rectype]) + data
+    return ":" + (record + bytes([-sum(record) & 0xFF])).hex().upper()
+
+
 class IHex(BinFmtTool):
     def __init__(self, p, binary_path: str) -> None:
         super().__init__(p, binary_path)
         self._file = open(binary_path, "rb")
         self._ihex = intelhex.IntelHex(binary_path)
         self.file_size = self._ihex.maxaddr() + 1
-        self.file_updates = []
 
     def __del__(self) -> None:
         self._file.close()
@@ -28,55 +32,92 @@ class IHex(BinFmtTool):
         pass
 
     def save_binary(self, filename: str | None = None) -> None:
-        for update in self.file_updates:
-            self._ihex.puts(update["offset"], update["content"])
         if filename is None:
             filename = f"{self.binary_path}.patched"
-        sio = io.StringIO()
-        self._ihex.write_hex_file(sio, byte_count=0x20)
-        final_content = sio.getvalue()
-        sio.close()
-        entry_point = ""
-        final = ""
-        for line in final_content.splitlines():
-            if line.startswith(":04000005"):
-                entry_point = line
-            elif line == ":00000001FF":
-                final += entry_point + "\n"
-                final += line + "\n"
+        # the records are written as they are produced, in address order, the same as
+        # IntelHex.write_hex_file with a byte count of 0x20 except that the start linear address
+        # record goes right before the end of file record
+        start_record = self._start_addr_record()
+        ranges = self._data_ranges()
+        need_offset_record = bool(ranges) and ranges[-1][1] > 0x10000
+        with open(filename, "w") as f:
+            if start_record is not None and start_record[7:9] == "03":
+                f.write(start_record + "\n")
+            high = None
+            for start, end in ranges:
+                # one window per 64 KiB, records don't cross these boundaries
+                for window in range(start & ~0xFFFF, end, 0x10000):
+                    window_start = max(start, window)
+                    window_end = min(end, window + 0x10000)
+                    if need_offset_record and window >> 16 != high:
+                        high = window >> 16
+                        f.write(_record(4, 0, high.to_bytes(2, "big")) + "\n")
+                    content = self.get_binary_content(
+                        window_start, window_end - window_start
+                    )
+                    f.writelines(
+                        _record(0, (window_start + i) & 0xFFFF, content[i : i + 0x20])
+                        + "\n"
+                        for i in range(0, len(content), 0x20)
+                    )
+            if start_record is not None and start_record[7:9] == "05":
+                f.write(start_record + "\n")
+            f.write(_record(1, 0, b"") + "\n")
+
+    def _data_ranges(self) -> list[tuple[int, int]]:
+        # the (start, end) ranges that the original content and the updates cover, adjacent ones
+        # merged, in address order
+        segments = sorted(
+            self._original_ranges()
+            + [(offset, offset + len(content)) for offset, content in self.file_updates]
+        )
+        ranges = []
+        for start, end in segments:
+            if ranges and start <= ranges[-1][1]:
+                ranges[-1] = (ranges[-1][0], max(ranges[-1][1], end))
             else:
-                final += line + "\n"
+                ranges.append((start, end))
+        return ranges
 
-        with open(filename, "w") as f:
-            f.write(final)
+    def _original_ranges(self) -> list[tuple[int, int]]:
+        # like IntelHex.segments, but finds the end of each range with a binary search, as the
+        # addresses of a range are consecutive
+        addrs = sorted(self._ihex._buf)
+        ranges = []
+        i = 0
+        while i < len(addrs):
+            lo, hi = i, len(addrs) - 1
+            while lo < hi:
+                mid = (lo + hi + 1) // 2
+                if addrs[mid] - addrs[i] == mid - i:
+                    lo = mid
+                else:
+                    hi = mid - 1
+            ranges.append((addrs[i], addrs[lo] + 1))
+            i = lo + 1
+        return ranges
+
+    def _start_addr_record(self) -> str | None:
+        start_addr = self._ihex.start_addr
+        if not start_addr:
+            return None
+        if sorted(start_addr) == ["CS", "IP"]:
+            return _record(
+                3,
+                0,
+                start_addr["CS"].to_bytes(2, "big")
+                + start_addr["IP"].to_bytes(2, "big"),
+            )
+        if sorted(start_addr) == ["EIP"]:
+            return _record(5, 0, start_addr["EIP"].to_bytes(4, "big"))
+        raise intelhex.InvalidStartAddressValueError(start_addr=start_addr)
 
-    def update_binary_content(self, offset: int, new_content: bytes) -> None:
-        logger.debug(
-            f"Updating offset {hex(offset)} with content ({len(new_content)} bytes) {new_content.hex()}"
+    def _get_original_content(self, offset: int, size: int) -> bytes:
+        # looked up in the underlying dict, IntelHex.tobinarray does the same byte by byte in Python
+        return bytes(
+            map(
+                self._ihex._buf.get,
+                range(offset, offset + size),
+                itertools.repeat(self._ihex.padding),
+            )
         )
-        for update in self.file_updates:
-            if offset >= update["offset"] and offset < update["offset"] + len(
-                update["content"]
-            ):
-                raise ValueError(
-                    f"Cannot update offset {hex(offset)} with content {new_content}, it overlaps with a previous update"
-                )
-        self.file_updates.append({"offset": offset, "content": new_content})
-        if offset + len(new_content) > self.file_size:
-            self.file_size = offset + len(new_content)
-
-    def get_binary_content(self, offset: int, size: int) -> bytes:
-        # check if it's in the file updates
-        for update in self.file_updates:
-            if offset >= update["offset"] and offset + size <= update["offset"] + len(
-                update["content"]
-            ):
-                return update["content"][
-                    offset - update["offset"] : offset - update["offset"] + size
-                ]
-        # otherwise read from the file
-        return self._ihex.tobinarray(start=offset, size=size)
-
-    def append_to_binary_content(self, new_content: bytes) -> None:
-        self.file_updates.append({"offset": self.file_size, "content": new_content})
-        self.file_size += len(new_content)
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import tempfile
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class CompilationCache:
+    """
+    Content-addressed cache for compiled patch code.
+
+    Entries are keyed by the compiler binary and its version, the compiler flags, the source,
+    the base address and the resolved symbol map. Lookups go to memory first and then to
+    ``cache_dir`` (if set). Both levels are evicted in least-recently-used order.
+    """
+
+    _default = None
+    _compiler_versions = {}
+
+    def __init__(
+        self,
+        cache_dir: str | None = None,
+        max_entries: int = 1024,
+        max_disk_size: int = 256 * 1024 * 1024,
+    ) -> None:
+        """
+        :param cache_dir: Directory for the on-disk cache, defaults to None (memory only)
+        :param max_entries: Maximum number of entries kept in memory, defaults to 1024
+        :param max_disk_size: Maximum total size in bytes of the on-disk cache, defaults to 256 MiB
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_disk_size = max_disk_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._disk_size = None
+        if self.cache_dir is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @classmethod
+    def default(cls) -> CompilationCache:
+        """
+        Process-wide cache shared by all compilers. The on-disk level is enabled by setting
+        the ``PATCHEREX2_COMPILER_CACHE_DIR`` environment variable.
+        """
+        if cls._default is None:
+            cls._default = cls(
+                cache_dir=os.environ.get("PATCHEREX2_COMPILER_CACHE_DIR")
+            )
+        return cls._default
+
+    @classmethod
+    def compiler_version(cls, compiler: str) -> str:
+        if compiler not in cls._compiler_versions:
+            try:
+                proc = subprocess.run(
+                    [compiler, "--version"], check=True, capture_output=True
+                )
+                version = proc.stdout.decode("utf-8", errors="replace")
+            except (OSError, subprocess.CalledProcessError):
+                version = ""
+            cls._compiler_versions[compiler] = version
+        return cls._compiler_versions[compiler]
+
+    @classmethod
+    def key(
+        cls,
+        compiler: str,
+        flags: list[str],
+        code: str,
+        base: int,
+        symbols: dict[str, int],
+        **kwargs,
+    ) -> str:
+        payload = json.dumps(
+            {
+                "compiler": compiler,
+                "version": cls.compiler_version(compiler),
+                "flags": list(flags),
+                "code": code,
+                "base": base,
+                "symbols": symbols,
+                "kwargs": kwargs,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> bytes | None:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        if self.cache_dir is not None:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    compiled = f.read()
+                os.utime(path)
+            except OSError:
+                pass
+            else:
+                self._remember(key, compiled)
+                self.hits += 1
+                return compiled
+        self.misses += 1
+        return None
+
+    def put(self, key: str, compiled: bytes) -> None:
+        self._remember(key, compiled)
+        if self.cache_dir is None:
+            return
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write to a temporary file first so concurrent readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(compiled)
+        os.replace(tmp_path, path)
+        if self._disk_size is not None:
+            self._disk_size += len(compiled)
+        self._evict_disk()
+
+    def clear(self) -> None:
+        self._entries.clear()
+        if self.cache_dir is not None:
+            for path, _, _ in self._disk_entries():
+                os.remove(path)
+            self._disk_size = 0
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries)}
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _remember(self, key: str, compiled: bytes) -> None:
+        self._entries[key] = compiled
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _disk_entries(self) -> list[tuple[str, float, int]]:
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, st.st_mtime, st.st_size))
+        return entries
+
+    def _evict_disk(self) -> None:
+        if self._disk_size is not None and self._disk_size <= self.max_disk_size:
+            return
+        # other processes may share the directory, so recount before evicting
+        entries = sorted(self._disk_entries(), key=lambda x: x[1])
+        self._disk_size = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if self._disk_size <= self.max_disk_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._disk_size -= size
+            logger.debug(f"Evicted compilation cache entry {path}")
@@ -7,6 +7,15 @@ from .compiler import Compiler
 logger = logging.getLogger(__name__)
 
 
+def thumb_flags(extra_compiler_flags: list[str] | None, is_thumb: bool) -> list[str]:
+    """
+    Returns a copy of extra_compiler_flags with the flag that selects the Thumb or ARM mode.
+    """
+    if extra_compiler_flags is None:
+        extra_compiler_flags = []
+    return [*extra_compiler_flags, "-mthumb" if is_thumb else "-mno-thumb"]
+
+
 class ClangArm(Compiler):
     def __init__(
         self, p, clang_version=15, compiler_flags: list[str] | None = None
@@ -18,6 +27,11 @@ class ClangArm(Compiler):
         self._linker = f"ld.lld-{clang_version}"
         self._compiler_flags = compiler_flags
 
+    def _object_args(
+        self, extra_compiler_flags: list[str] | None = None, is_thumb=False, **kwargs
+    ) -> tuple[list[str], dict]:
+        return thumb_flags(extra_compiler_flags, is_thumb), kwargs
+
     def compile(
         self,
         code: str,
@@ -29,12 +43,7 @@ class ClangArm(Compiler):
     ) -> bytes:
         if symbols is None:
             symbols = {}
-        if extra_compiler_flags is None:
-            extra_compiler_flags = []
-        if is_thumb:
-            extra_compiler_flags += ["-mthumb"]
-        else:
-            extra_compiler_flags += ["-mno-thumb"]
+        extra_compiler_flags = thumb_flags(extra_compiler_flags, is_thumb)
         compiled = super().compile(
             code,
             base=base,
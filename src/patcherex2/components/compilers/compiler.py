@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import concurrent.futures
 import logging
 import os
 import subprocess
-import tempfile
 
-import cle
 from elftools.elf.elffile import ELFFile
 
+from ..utils.stats import span
+from ..utils.work_dir import work_dir
+from .cache import CompilationCache
+
 logger = logging.getLogger(__name__)
 
 
@@ -17,6 +20,10 @@ class Compiler:
         # preserve_none is a special attribute flag to allow us to control more registers as input to a C function
         # This feature is used for a C instruction patch
         self.preserve_none = False
+        # set to None to disable caching, or replace with a dedicated CompilationCache
+        self.cache = CompilationCache.default()
+        # objects compiled by this instance, kept whether or not the cache is enabled
+        self._objects = {}
 
     def compile(
         self,
@@ -30,7 +37,127 @@ class Compiler:
             symbols = {}
         if extra_compiler_flags is None:
             extra_compiler_flags = []
-        with tempfile.TemporaryDirectory() as td:
+        _symbols = {}
+        _symbols.update(self.p.symbols)
+        _symbols.update(self.p.binary_analyzer.get_all_symbols())
+        _symbols.update(symbols)
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(
+                self._compiler,
+                self._compiler_flags + extra_compiler_flags,
+                code,
+                base,
+                _symbols,
+                linker=self._linker,
+                **kwargs,
+            )
+            compiled = self.cache.get(key)
+            if compiled is not None:
+                logger.debug(f"Compilation cache hit at {hex(base)}")
+                return compiled
+
+        obj = self.compile_object(code, extra_compiler_flags, **kwargs)
+        compiled = self._link(obj, base=base, symbols=_symbols, **kwargs)
+        if key is not None:
+            self.cache.put(key, compiled)
+        return compiled
+
+    def compile_object(
+        self,
+        code: str,
+        extra_compiler_flags: list[str] | None = None,
+        **kwargs,
+    ) -> bytes:
+        """
+        Compiles code into a relocatable object. The object does not depend on the base address or
+        on the symbol map, so it is compiled once per instance and shared by every placement of the
+        same code (e.g. the size probe at base 0 and the final compile at the allocated address),
+        and also kept in the cache if it is enabled.
+        """
+        if extra_compiler_flags is None:
+            extra_compiler_flags = []
+        key = self._object_key(code, extra_compiler_flags, **kwargs)
+        obj = self._cached_object(key)
+        if obj is None:
+            obj = self._compile_object(code, extra_compiler_flags, **kwargs)
+            self._store_object(key, obj)
+        return obj
+
+    def _cached_object(self, key: str) -> bytes | None:
+        obj = self._objects.get(key)
+        if obj is None and self.cache is not None:
+            obj = self.cache.get(key)
+            if obj is not None:
+                self._objects[key] = obj
+        return obj
+
+    def _store_object(self, key: str, obj: bytes) -> None:
+        self._objects[key] = obj
+        if self.cache is not None:
+            self.cache.put(key, obj)
+
+    def _object_key(self, code: str, extra_compiler_flags: list[str], **kwargs) -> str:
+        return CompilationCache.key(
+            self._compiler,
+            self._compiler_flags + extra_compiler_flags,
+            code,
+            None,
+            {},
+            stage="object",
+            **kwargs,
+        )
+
+    def _object_args(
+        self, extra_compiler_flags: list[str] | None = None, **kwargs
+    ) -> tuple[list[str], dict]:
+        """
+        Maps the keyword arguments of a compile() call to the flags and keyword arguments it
+        passes on to compile_object().
+        """
+        if extra_compiler_flags is None:
+            extra_compiler_flags = []
+        return extra_compiler_flags, kwargs
+
+    def precompile(self, requests: list[tuple[str, dict]], max_workers=None) -> None:
+        """
+        Compiles the objects of several upcoming compile() calls concurrently, so that the calls
+        themselves only link. Each request is the code and the keyword arguments (other than base
+        and symbols) of one call. Objects do not depend on symbols or placement, so this never
+        changes what compile() returns; failures are left for the actual call to report.
+
+        :param requests: List of (code, kwargs) tuples
+        :param max_workers: Number of compiler processes to run at once, defaults to the number of CPUs
+        """
+        pending = {}
+        for code, kwargs in requests:
+            extra_compiler_flags, kwargs = self._object_args(**kwargs)
+            key = self._object_key(code, extra_compiler_flags, **kwargs)
+            if key not in pending and self._cached_object(key) is None:
+                pending[key] = (code, extra_compiler_flags, kwargs)
+        if not pending:
+            return
+        logger.debug(f"Precompiling {len(pending)} objects")
+        # the compilers are subprocesses, so threads are enough to run them in parallel
+        # ThreadPoolExecutor would default to min(32, CPUs + 4) threads, more processes than CPUs
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers or os.cpu_count()
+        ) as pool:
+            futures = {
+                key: pool.submit(self._compile_object, code, flags, **kwargs)
+                for key, (code, flags, kwargs) in pending.items()
+            }
+            for key, future in futures.items():
+                try:
+                    self._store_object(key, future.result())
+                except Exception as e:
+                    logger.debug(f"Precompilation failed: {e}")
+
+    def _compile_object(
+        self, code: str, extra_compiler_flags: list[str], **kwargs
+    ) -> bytes:
+        with work_dir() as td:
             # source file
             with open(os.path.join(td, "code.c"), "w") as f:
                 f.write(code)
@@ -53,12 +180,15 @@ class Compiler:
                 logger.error(e.stderr.decode("utf-8"))
                 raise e
 
-            # linker script
-            _symbols = {}
-            _symbols.update(self.p.symbols)
-            _symbols.update(self.p.binary_analyzer.get_all_symbols())
-            _symbols.update(symbols)
+            with open(os.path.join(td, "obj.o"), "rb") as f:
+                return f.read()
 
+    def _link(self, obj: bytes, base: int, symbols: dict[str, int], **kwargs) -> bytes:
+        with work_dir() as td:
+            with open(os.path.join(td, "obj.o"), "wb") as f:
+                f.write(obj)
+
+            # linker script
             # TODO: shouldn't put .rodata in .text, but otherwise switch case jump table won't work
             # Note that even we don't include .rodata here, cle might still include it if there is
             # no gap between .text and .rodata
@@ -71,7 +201,7 @@ class Compiler:
                     ]
                 )
             linker_script_symbols = "".join(
-                f"{name} = {hex(addr)};" for name, addr in _symbols.items()
+                f"{name} = {hex(addr)};" for name, addr in symbols.items()
             )
 
             linker_script = f"SECTIONS {{ .patcherex2 : SUBALIGN(0) {{ . = {hex(base)}; *(.text) {linker_script_rodata_sections} {linker_script_symbols} }} }}"
@@ -94,9 +224,12 @@ class Compiler:
                 raise e
 
             # extract compiled code
-            ld = cle.Loader(
-                os.path.join(td, "obj_linked.o"), main_opts={"base_addr": 0x0}
-            )
+            import cle
+
+            with span(self, "compiler.cle"):
+                ld = cle.Loader(
+                    os.path.join(td, "obj_linked.o"), main_opts={"base_addr": 0x0}
+                )
 
             patcherex2_section = next(
                 (s for s in ld.main_object.sections if s.name == ".patcherex2"), None
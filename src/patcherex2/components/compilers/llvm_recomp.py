@@ -1,15 +1,15 @@
 from __future__ import annotations
 
+import io
 import json
 import logging
 import os
 import subprocess
-import tempfile
 
-import cle
 from elftools.elf.elffile import ELFFile
 
 from ..assets.assets import Assets
+from ..utils.work_dir import work_dir
 from .clang import Clang
 
 logger = logging.getLogger(__name__)
@@ -23,20 +23,10 @@ class LLVMRecomp(Clang):
         self._clang_version = clang_version
         self._assets_path = Assets("llvm_recomp").path
 
-    def compile(
-        self,
-        code: str,
-        base=0,
-        symbols: dict[str, int] | None = None,
-        extra_compiler_flags: list[str] | None = None,
-        is_thumb=False,
-        **kwargs,
+    def _compile_object(
+        self, code: str, extra_compiler_flags: list[str], **kwargs
     ) -> bytes:
-        if symbols is None:
-            symbols = {}
-        if extra_compiler_flags is None:
-            extra_compiler_flags = []
-        with tempfile.TemporaryDirectory() as td:
+        with work_dir() as td:
             # source file
             with open(os.path.join(td, "code.c"), "w") as f:
                 f.write(code)
@@ -145,71 +135,21 @@ class LLVMRecomp(Clang):
                     logger.error(e.stderr.decode("utf-8"))
                     raise e
 
-            # linker script
-            _symbols = {}
-            _symbols.update(self.p.symbols)
-            _symbols.update(self.p.binary_analyzer.get_all_symbols())
-            _symbols.update(symbols)
-
             with open(os.path.join(td, "obj.o"), "rb") as f:
-                elf = ELFFile(f)
-                linker_script_rodata_sections = " ".join(
-                    [
-                        f". = ALIGN({section['sh_addralign']}); *({section.name})"
-                        for section in elf.iter_sections()
-                        if section.name.startswith(".rodata")
-                    ]
-                )
-
-                # automatically add symbols like off_deadbeef, dword_deadbeef, etc.
-                for sym in elf.get_section_by_name(".symtab").iter_symbols():
-                    if (
-                        sym.entry.st_shndx == "SHN_UNDEF"
-                        and sym.name
-                        and "_" in sym.name
-                    ):
-                        try:
-                            _, addr = sym.name.split("_", 1)
-                            addr = int(addr, 16)
-                            if sym.name not in _symbols:
-                                _symbols[sym.name] = addr
-                        except ValueError:
-                            pass
-            linker_script_symbols = "".join(
-                f"{name} = {hex(addr)};" for name, addr in _symbols.items()
-            )
-
-            linker_script = f"SECTIONS {{ .patcherex2 : SUBALIGN(0) {{ . = {hex(base)}; *(.text) {linker_script_rodata_sections} {linker_script_symbols} }} }}"
-            with open(os.path.join(td, "linker.ld"), "w") as f:
-                f.write(linker_script)
-
-            # link object file
-            try:
-                args = [self._linker] + [
-                    "-relocatable",
-                    os.path.join(td, "obj.o"),
-                    "-T",
-                    os.path.join(td, "linker.ld"),
-                    "-o",
-                    os.path.join(td, "obj_linked.o"),
-                ]
-                subprocess.run(args, check=True, capture_output=True)
-            except subprocess.CalledProcessError as e:
-                logger.error(e.stderr.decode("utf-8"))
-                raise e
-
-            # extract compiled code
-            ld = cle.Loader(
-                os.path.join(td, "obj_linked.o"), main_opts={"base_addr": 0x0}
-            )
-
-            patcherex2_section = next(
-                (s for s in ld.main_object.sections if s.name == ".patcherex2"), None
-            )
-            compiled_start = ld.all_objects[0].entry + base
-
-            compiled = ld.memory.load(
-                compiled_start,
-                patcherex2_section.memsize - compiled_start,
-            )
-        return compiled
+                return f.read()
+
+    def _link(self, obj: bytes, base: int, symbols: dict[str, int], **kwargs) -> bytes:
+        _symbols = dict(symbols)
+        with io.BytesIO(obj) as f:
+            elf = ELFFile(f)
+            # automatically add symbols like off_deadbeef, dword_deadbeef, etc.
+            for sym in elf.get_section_by_name(".symtab").iter_symbols():
+                if sym.entry.st_shndx == "SHN_UNDEF" and sym.name and "_" in sym.name:
+                    try:
+                        _, addr = sym.name.split("_", 1)
+                        addr = int(addr, 16)
+                        if sym.name not in _symbols:
+                            _symbols[sym.name] = addr
+                    except ValueError:
+                        pass
+        return super()._link(obj, base=base, symbols=_symbols, **kwargs)
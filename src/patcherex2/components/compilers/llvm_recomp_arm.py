@@ -2,12 +2,18 @@ from __future__ import annotations
 
 import logging
 
+from .clang_arm import thumb_flags
 from .llvm_recomp import LLVMRecomp
 
 logger = logging.getLogger(__name__)
 
 
 class LLVMRecompArm(LLVMRecomp):
+    def _object_args(
+        self, extra_compiler_flags: list[str] | None = None, is_thumb=False, **kwargs
+    ) -> tuple[list[str], dict]:
+        return thumb_flags(extra_compiler_flags, is_thumb), kwargs
+
     def compile(
         self,
         code: str,
@@ -19,12 +25,7 @@ class LLVMRecompArm(LLVMRecomp):
     ) -> bytes:
         if symbols is None:
             symbols = {}
-        if extra_compiler_flags is None:
-            extra_compiler_flags = []
-        if is_thumb:
-            extra_compiler_flags += ["-mthumb"]
-        else:
-            extra_compiler_flags += ["-mno-thumb"]
+        extra_compiler_flags = thumb_flags(extra_compiler_flags, is_thumb)
         compiled = super().compile(
             code,
             base=base,
@@ -8,5 +8,14 @@ class Disassembler:
     def disassemble(self, input: bytes, base=0, **kwargs) -> None:
         raise NotImplementedError()
 
+    def disassemble_many(
+        self, inputs: list[tuple[bytes, int]], **kwargs
+    ) -> list[list[dict[str, int | str]]]:
+        """
+        Disassembles several (bytes, base) inputs, in a single toolchain invocation where the
+        disassembler supports it. Returns the instructions of each input, in order.
+        """
+        return [self.disassemble(input, base, **kwargs) for input, base in inputs]
+
     def to_asm_string(self, insn: dict[str, int | str]) -> str:
         return "{} {}".format(insn["mnemonic"], insn["op_str"])
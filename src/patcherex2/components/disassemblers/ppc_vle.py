@@ -4,38 +4,45 @@ import logging
 import os
 import re
 import subprocess
-import tempfile
 
 from ..assets.assets import Assets
+from ..utils.work_dir import work_dir
 from .disassembler import Disassembler
 
 logger = logging.getLogger(__name__)
 
 
 class PpcVle(Disassembler):
+    # branches that objdump prints with the address they jump to, i.e. all but the absolute ones
+    _relative_branch_re = re.compile(r"(e_|se_)?b(?!.*a[+-]?$)")
+
     def __init__(self, p) -> None:
         self.p = p
         self.assets_path = Assets("ppc_vle").path
 
-    def disassemble(self, input: bytes, base=0, **kwargs) -> list[dict[str, str | int]]:
-        if isinstance(input, str):
-            input = bytes(map(ord, input))
-        with tempfile.TemporaryDirectory() as td:
-            with open(os.path.join(td, "code.bin"), "wb") as f:
-                f.write(input)
-
-            try:
-                proc = subprocess.run(
-                    f"{os.path.join(self.assets_path, 'powerpc-eabivle-objdump')} -D -b binary --adjust-vma={hex(base)} -m powerpc:common -EB {os.path.join(td, 'code')}.bin | tail +8",
-                    shell=True,
-                    check=True,
-                    capture_output=True,
-                )
-                str_result = proc.stdout.decode("utf-8")
-            except subprocess.CalledProcessError as e:
-                logger.error(e.stderr.decode("utf-8"))
-                raise e
+    def _objdump(self, td: str, names: list[str], base: int) -> str:
+        try:
+            proc = subprocess.run(
+                [
+                    os.path.join(self.assets_path, "powerpc-eabivle-objdump"),
+                    "-D",
+                    "-b",
+                    "binary",
+                    f"--adjust-vma={hex(base)}",
+                    "-m",
+                    "powerpc:common",
+                    "-EB",
+                ]
+                + [os.path.join(td, name) for name in names],
+                check=True,
+                capture_output=True,
+            )
+        except subprocess.CalledProcessError as e:
+            logger.error(e.stderr.decode("utf-8"))
+            raise e
+        return proc.stdout.decode("utf-8")
 
+    def _parse(self, str_result: str) -> list[dict[str, str | int]]:
         result = []
         for line in str_result.splitlines():
             m = re.match(
@@ -55,3 +62,51 @@ class PpcVle(Disassembler):
                     }
                 )
         return result
+
+    def disassemble(self, input: bytes, base=0, **kwargs) -> list[dict[str, str | int]]:
+        if isinstance(input, str):
+            input = bytes(map(ord, input))
+        with work_dir() as td:
+            with open(os.path.join(td, "code.bin"), "wb") as f:
+                f.write(input)
+            return self._parse(self._objdump(td, ["code.bin"], base))
+
+    def _rebase(
+        self, instrs: list[dict[str, str | int]], base: int
+    ) -> list[dict[str, str | int]]:
+        # moves instructions disassembled at 0 to base, along with the targets of relative branches
+        for instr in instrs:
+            instr["address"] += base
+            if self._relative_branch_re.match(instr["mnemonic"]):
+                instr["op_str"] = re.sub(
+                    r"0x[0-9a-f]+",
+                    lambda m: hex((int(m.group(0), 16) + base) & 0xFFFFFFFF),
+                    instr["op_str"],
+                )
+        return instrs
+
+    def disassemble_many(
+        self, inputs: list[tuple[bytes, int]], **kwargs
+    ) -> list[list[dict[str, str | int]]]:
+        # objdump takes any number of files but only one base, so all of them are disassembled at 0
+        # and then moved to their own base
+        if not inputs:
+            return []
+        names = []
+        with work_dir() as td:
+            for i, (input, _) in enumerate(inputs):
+                if isinstance(input, str):
+                    input = bytes(map(ord, input))
+                names.append(f"code{i}.bin")
+                with open(os.path.join(td, names[-1]), "wb") as f:
+                    f.write(input)
+            # the disassembly of each file starts with a "<path>:     file format binary" line
+            outputs = re.split(
+                r"^\S+:\s+file format .*$",
+                self._objdump(td, names, 0),
+                flags=re.MULTILINE,
+            )[1:]
+        return [
+            self._rebase(self._parse(output), base)
+            for output, (_, base) in zip(outputs, inputs)
+        ]
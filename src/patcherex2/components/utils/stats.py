@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import functools
+import json
+import threading
+import time
+
+# methods recorded per component, None records every public method
+INSTRUMENTED_METHODS = {
+    "assembler": ("assemble", "_assemble"),
+    "disassembler": ("disassemble", "disassemble_many"),
+    "compiler": ("compile", "precompile", "_compile_object", "_link"),
+    "binary_analyzer": None,
+    "allocation_manager": ("allocate", "free", "reserve", "free_range"),
+    "binfmt_tool": ("update_binary_content", "finalize", "save_binary"),
+    "utils": ("insert_trampoline_code", "plan_trampolines"),
+}
+
+
+class _NullSpan:
+    def __enter__(self) -> None:
+        return None
+
+    def __exit__(self, *exc) -> None:
+        return None
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    def __init__(self, stats: Stats, name: str, args: dict) -> None:
+        self.stats = stats
+        self.name = name
+        self.args = args
+
+    def __enter__(self) -> _Span:
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stats.add(
+            self.name, self.start, time.perf_counter() - self.start, args=self.args
+        )
+
+
+def span(component, name: str, **args):
+    """
+    Context manager that records the time spent in it as an event named name, if component is
+    instrumented by an enabled Stats instance. Meant for the stages within components that aren't
+    methods of their own, e.g. CFG generation.
+    """
+    stats = vars(component).get("_stats")
+    if stats is None:
+        return _NULL_SPAN
+    return stats.span(name, **args)
+
+
+def _nbytes(result, args: tuple) -> int:
+    if isinstance(result, (bytes, bytearray)):
+        return len(result)
+    if isinstance(result, list) and result and isinstance(result[0], bytes):
+        return sum(len(r) for r in result)
+    size = getattr(result, "size", None)
+    if isinstance(size, int):
+        return size
+    for arg in args:
+        if isinstance(arg, (bytes, bytearray)):
+            return len(arg)
+    return 0
+
+
+class Stats:
+    """
+    Wall time, call counts and bytes processed by the components of a Patcherex instance.
+
+    Disabled by default, in which case nothing is recorded and the components are left untouched.
+    Once enabled, the methods listed in INSTRUMENTED_METHODS are wrapped on the component
+    instances, and every call is recorded as an event, along with the spans of the stages inside
+    the components and of each applied patch. Events can be summarized per name or exported as
+    JSON or as a Chrome trace (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self, p) -> None:
+        self.p = p
+        self.enabled = False
+        self.events = []
+        self._origin = time.perf_counter()
+        self._wrapped = []
+
+    def enable(self) -> None:
+        """
+        Starts recording, including in the components that already exist.
+        """
+        self.enabled = True
+        for name in INSTRUMENTED_METHODS:
+            component = self.p.__dict__.get(name)
+            if component is not None:
+                self.instrument(name, component)
+
+    def disable(self) -> None:
+        """
+        Stops recording and restores the original component methods. Recorded events are kept.
+        """
+        self.enabled = False
+        for component, method_name in self._wrapped:
+            vars(component).pop(method_name, None)
+        self._wrapped = []
+
+    def reset(self) -> None:
+        """
+        Discards the recorded events.
+        """
+        self.events = []
+        self._origin = time.perf_counter()
+
+    def instrument(self, name: str, component) -> None:
+        """
+        Wraps the methods of a component to record their calls, as name.method, and makes the
+        component's spans record here.
+        """
+        if name not in INSTRUMENTED_METHODS:
+            return
+        if "_stats" not in vars(component):
+            vars(component)["_stats"] = self
+            self._wrapped.append((component, "_stats"))
+        methods = INSTRUMENTED_METHODS[name]
+        if methods is None:
+            methods = [
+                method_name
+                for method_name in dir(type(component))
+                if not method_name.startswith("_")
+                and callable(getattr(type(component), method_name))
+            ]
+        for method_name in methods:
+            method = getattr(component, method_name, None)
+            if method is None or method_name in vars(component):
+                continue
+            setattr(component, method_name, self._wrap(f"{name}.{method_name}", method))
+            self._wrapped.append((component, method_name))
+
+    def _wrap(self, name: str, method):
+        @functools.wraps(method)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = None
+            try:
+                result = method(*args, **kwargs)
+                return result
+            finally:
+                self.add(
+                    name, start, time.perf_counter() - start, _nbytes(result, args)
+                )
+
+        return wrapper
+
+    def span(self, name: str, **args):
+        """
+        Context manager that records the time spent in it as an event named name.
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, args)
+
+    def add(
+        self,
+        name: str,
+        start: float,
+        duration: float,
+        nbytes: int = 0,
+        args: dict | None = None,
+    ) -> None:
+        """
+        Records an event, start is a time.perf_counter() value.
+        """
+        if self.enabled:
+            self.events.append(
+                (name, start, duration, nbytes, threading.get_ident(), args)
+            )
+
+    def summary(self) -> dict[str, dict[str, int | float]]:
+        """
+        Returns the number of calls, the total time in seconds and the total bytes per event name.
+        """
+        summary = {}
+        for name, _, duration, nbytes, _, _ in self.events:
+            entry = summary.setdefault(name, {"calls": 0, "time": 0.0, "bytes": 0})
+            entry["calls"] += 1
+            entry["time"] += duration
+            entry["bytes"] += nbytes
+        return summary
+
+    def to_json(self) -> str:
+        """
+        Returns the summary and the events, with times in seconds since the stats were created
+        or reset.
+        """
+        return json.dumps(
+            {
+                "summary": self.summary(),
+                "events": [
+                    {
+                        "name": name,
+                        "start": start - self._origin,
+                        "duration": duration,
+                        "bytes": nbytes,
+                        "thread": tid,
+                        **({"args": args} if args else {}),
+                    }
+                    for name, start, duration, nbytes, tid, args in self.events
+                ],
+            },
+            indent=2,
+            default=repr,
+        )
+
+    def to_chrome_trace(self) -> str:
+        """
+        Returns the events in the Chrome trace event format.
+        """
+        return json.dumps(
+            {
+                "traceEvents": [
+                    {
+                        "name": name,
+                        "cat": name.split(".")[0],
+                        "ph": "X",
+                        "ts": (start - self._origin) * 1e6,
+                        "dur": duration * 1e6,
+                        "pid": 0,
+                        "tid": tid,
+                        "args": {"bytes": nbytes, **(args or {})},
+                    }
+                    for name, start, duration, nbytes, tid, args in self.events
+                ],
+                "displayTimeUnit": "ms",
+            },
+            default=repr,
+        )
+
+    def save_json(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.to_json())
+
+    def save_chrome_trace(self, path: str) -> None:
+        with open(path, "w") as f:
+            f.write(self.to_chrome_trace())
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+
+class SymbolTable(dict):
+    """
+    Dictionary of symbol names to addresses that counts its modifications, so that tables
+    derived from it can be cached and rebuilt only when it changes.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.version = 0
+
+    def __setitem__(self, key: str, value: int) -> None:
+        super().__setitem__(key, value)
+        self.version += 1
+
+    def __delitem__(self, key: str) -> None:
+        super().__delitem__(key)
+        self.version += 1
+
+    def __ior__(self, other) -> SymbolTable:
+        self.update(other)
+        return self
+
+    def update(self, *args, **kwargs) -> None:
+        super().update(*args, **kwargs)
+        self.version += 1
+
+    def setdefault(self, key: str, default: int | None = None) -> int | None:
+        self.version += 1
+        return super().setdefault(key, default)
+
+    def pop(self, *args) -> int:
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self) -> tuple[str, int]:
+        self.version += 1
+        return super().popitem()
+
+    def clear(self) -> None:
+        super().clear()
+        self.version += 1
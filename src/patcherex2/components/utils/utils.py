@@ -9,9 +9,79 @@ logger = logging.getLogger(__name__)
 
 
 class Utils:
+    # Extra bytes reserved for every trampoline. Its size is measured by assembling it at the
+    # insertion point, but at its final address some instructions (e.g. the jump back) may need
+    # a longer encoding.
+    TRAMPOLINE_SLACK = 4
+
     def __init__(self, p, binary_path: str) -> None:
         self.p = p
         self.binary_path = binary_path
+        self._insertion_points = {}
+        self._snippet_sizes = {}
+        self._movable_instrs = {}
+        self._movable_encodings = {}
+
+    def plan_trampolines(self, patches: list) -> None:
+        """
+        Analyzes the insertion points of all patches that insert a trampoline in one pass, so
+        that the instructions to be moved are found and measured once per insertion point.
+
+        :param patches: Patches about to be applied
+        """
+        for patch in patches:
+            addr = getattr(patch, "addr", None)
+            if not addr or not hasattr(patch, "force_insert"):
+                continue
+            try:
+                self.get_insertion_point(addr, force_insert=patch.force_insert)
+            except Exception:
+                # the error is reported when the patch itself is applied
+                logger.debug(f"Failed to plan trampoline at {hex(addr)}")
+
+    def get_insertion_point(self, addr: int, force_insert=False) -> dict:
+        """
+        Returns what inserting a trampoline at addr involves: whether addr is thumb code, the
+        instructions to be moved into the trampoline (None if addr is not a valid insertion
+        point) and the size of the instructions that the jump to the trampoline overwrites.
+        """
+        key = (addr, force_insert)
+        if key not in self._insertion_points:
+            is_thumb = self.p.binary_analyzer.is_thumb(addr)
+            if force_insert:
+                moved_instrs = ""
+                overwritten_instrs = self.get_instrs_to_be_moved(
+                    addr, ignore_unmovable=True
+                )
+            else:
+                moved_instrs = self.get_instrs_to_be_moved(addr)
+                overwritten_instrs = moved_instrs
+            self._insertion_points[key] = {
+                "is_thumb": is_thumb,
+                "moved_instrs": moved_instrs,
+                "moved_instrs_len": (
+                    None
+                    if overwritten_instrs is None
+                    # TODO: we don't really need this addr, but better than 0x0 because 0x0 is too far away from the code
+                    else self._snippet_size(overwritten_instrs, addr, {}, is_thumb)
+                ),
+            }
+        return self._insertion_points[key]
+
+    def _snippet_size(
+        self, code: str, addr: int, symbols: dict[str, int], is_thumb: bool
+    ) -> int:
+        key = (code, addr, is_thumb, tuple(sorted(symbols.items())))
+        if "{" in code:
+            # the code may also refer to symbols added by other patches
+            key += (id(self.p.symbols), getattr(self.p.symbols, "version", None))
+        if key not in self._snippet_sizes:
+            self._snippet_sizes[key] = len(
+                self.p.assembler.assemble(
+                    code, addr, symbols=symbols, is_thumb=is_thumb
+                )
+            )
+        return self._snippet_sizes[key]
 
     def insert_trampoline_code(
         self,
@@ -26,27 +96,13 @@ class Utils:
     ) -> None:
         logger.debug(f"Inserting trampoline code at {hex(addr)}: {instrs}")
         symbols = symbols if symbols else {}
-        assert force_insert or self.is_valid_insert_point(addr), (
+        insertion_point = self.get_insertion_point(addr, force_insert=force_insert)
+        assert force_insert or insertion_point["moved_instrs"] is not None, (
             f"Cannot insert instruction at {hex(addr)}"
         )
-        if not force_insert:
-            moved_instrs = self.get_instrs_to_be_moved(addr)
-            moved_instrs_len = len(
-                self.p.assembler.assemble(
-                    moved_instrs,
-                    addr,  # TODO: we don't really need this addr, but better than 0x0 because 0x0 is too far away from the code
-                    is_thumb=self.p.binary_analyzer.is_thumb(addr),
-                )
-            )
-        else:
-            moved_instrs = ""
-            moved_instrs_len = len(
-                self.p.assembler.assemble(
-                    self.get_instrs_to_be_moved(addr, ignore_unmovable=True),
-                    addr,  # TODO: we don't really need this addr, but better than 0x0 because 0x0 is too far away from the code
-                    is_thumb=self.p.binary_analyzer.is_thumb(addr),
-                )
-            )
+        is_thumb = insertion_point["is_thumb"]
+        moved_instrs = insertion_point["moved_instrs"]
+        moved_instrs_len = insertion_point["moved_instrs_len"]
         trampoline_instrs_with_jump_back = (
             # Insert the asm footer here
             (asm_footer if language == "C" else instrs)
@@ -59,19 +115,13 @@ class Utils:
         if language == "C":
             symbols_copy = dict(symbols)
             symbols_copy["_CALLBACK"] = 0
-            asm_header_length = len(
-                self.p.assembler.assemble(
-                    asm_header,
-                    addr,
-                    # TODO: we don't really need this addr, but better than 0x0 because 0x0 is too far away from the code
-                    is_thumb=self.p.binary_analyzer.is_thumb(addr),
-                )
-            )
+            # TODO: we don't really need this addr, but better than 0x0 because 0x0 is too far away from the code
+            asm_header_length = self._snippet_size(asm_header, addr, {}, is_thumb)
             compiled_length = len(
                 self.p.compiler.compile(
                     instrs,
                     symbols=symbols_copy,
-                    is_thumb=self.p.binary_analyzer.is_thumb(addr),
+                    is_thumb=is_thumb,
                     # Some optimization needs to be used to squash down all this parameter trickery
                     # we are doing. -Os optimizes for space
                     extra_compiler_flags=["-Os"],
@@ -84,15 +134,10 @@ class Utils:
         trampoline_size = (
             asm_header_length
             + compiled_length
-            + len(
-                self.p.assembler.assemble(
-                    trampoline_instrs_with_jump_back,
-                    addr,  # TODO: we don't really need this addr, but better than 0x0 because 0x0 is too far away from the code
-                    symbols=symbols,
-                    is_thumb=self.p.binary_analyzer.is_thumb(addr),
-                )
+            + self._snippet_size(
+                trampoline_instrs_with_jump_back, addr, symbols, is_thumb
             )
-            + 4  # TODO: some time actual size is larger, but we need a better way to calculate it
+            + self.TRAMPOLINE_SLACK
         )
 
         if detour_pos == -1:
@@ -117,7 +162,7 @@ class Utils:
                 asm_header,
                 mem_addr,
                 symbols=symbols,
-                is_thumb=self.p.binary_analyzer.is_thumb(addr),
+                is_thumb=is_thumb,
             )
 
             # Compile C code
@@ -127,7 +172,7 @@ class Utils:
                 instrs,
                 base=mem_addr + asm_header_length,
                 symbols=symbols_copy,
-                is_thumb=self.p.binary_analyzer.is_thumb(addr),
+                is_thumb=is_thumb,
                 # Some optimization needs to be used to squash down all this parameter trickery
                 # we are doing. -Os optimizes for space
                 extra_compiler_flags=["-Os"],
@@ -148,14 +193,14 @@ class Utils:
                 trampoline_instrs_with_jump_back,
                 mem_addr + asm_header_length + compiled_length,
                 symbols=symbols,
-                is_thumb=self.p.binary_analyzer.is_thumb(addr),
+                is_thumb=is_thumb,
             )
         )
         self.p.binfmt_tool.update_binary_content(file_addr, trampoline_bytes)
         jmp_to_trampoline = self.p.assembler.assemble(
             self.p.archinfo.jmp_asm.format(dst=hex(mem_addr)),
             addr,
-            is_thumb=self.p.binary_analyzer.is_thumb(addr),
+            is_thumb=is_thumb,
         )
         self.p.binfmt_tool.update_binary_content(
             self.p.binary_analyzer.mem_addr_to_file_offset(addr), jmp_to_trampoline
@@ -189,11 +234,21 @@ class Utils:
         return None
 
     def is_valid_insert_point(self, addr: int) -> bool:
-        return self.get_instrs_to_be_moved(addr) is not None
+        return self.get_insertion_point(addr)["moved_instrs"] is not None
 
     def is_movable_instruction(self, addr: int) -> bool:
         is_thumb = self.p.binary_analyzer.is_thumb(addr)
         insn_bytes = self.p.binary_analyzer.get_instr_bytes_at(addr)
+        key = (addr, bytes(insn_bytes), is_thumb)
+        if key not in self._movable_instrs:
+            self._movable_instrs[key] = self._is_movable_instruction(
+                addr, insn_bytes, is_thumb
+            )
+        return self._movable_instrs[key]
+
+    def _is_movable_instruction(
+        self, addr: int, insn_bytes: bytes, is_thumb: bool
+    ) -> bool:
         disassembled = self.p.disassembler.disassemble(
             insn_bytes, addr, is_thumb=is_thumb
         )[0]
@@ -202,16 +257,34 @@ class Utils:
         tokens = list(filter(None, tokens))
         if list(set(self.p.archinfo.pc_reg_names) & set(tokens)):
             return False
-        # TODO: this assumes that keystone always gives abs addr when disassembling, but it might not be true
         disassembled = self.p.disassembler.to_asm_string(disassembled)
-        for test_addr in [addr - 0x10000, addr + 0x10000]:
-            re_assembled = self.p.assembler.assemble(
-                disassembled, test_addr, is_thumb=is_thumb
-            )
-            re_disassembled = self.p.disassembler.disassemble(
-                re_assembled, test_addr, is_thumb=is_thumb
-            )[0]
-            re_disassembled = self.p.disassembler.to_asm_string(re_disassembled)
-            if re_disassembled != disassembled:
+        pc_relative_pattern = getattr(self.p.archinfo, "pc_relative_pattern", None)
+        if pc_relative_pattern is not None and not re.search(
+            pc_relative_pattern, disassembled
+        ):
+            # neither a branch nor otherwise PC-relative, so where it is placed doesn't matter and
+            # the verdict holds for every instruction with the same encoding
+            key = (bytes(insn_bytes), is_thumb)
+            if key not in self._movable_encodings:
+                self._movable_encodings[key] = self.p.assembler.assemble(
+                    disassembled, addr, is_thumb=is_thumb
+                ) == bytes(insn_bytes) or self._round_trips(
+                    disassembled, addr, is_thumb
+                )
+            return self._movable_encodings[key]
+        return self._round_trips(disassembled, addr, is_thumb)
+
+    def _round_trips(self, disassembled: str, addr: int, is_thumb: bool) -> bool:
+        # TODO: this assumes that keystone always gives abs addr when disassembling, but it might not be true
+        test_addrs = [addr - 0x10000, addr + 0x10000]
+        re_assembled = [
+            self.p.assembler.assemble(disassembled, test_addr, is_thumb=is_thumb)
+            for test_addr in test_addrs
+        ]
+        re_disassembled = self.p.disassembler.disassemble_many(
+            list(zip(re_assembled, test_addrs)), is_thumb=is_thumb
+        )
+        for instrs in re_disassembled:
+            if self.p.disassembler.to_asm_string(instrs[0]) != disassembled:
                 return False
         return True
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+import atexit
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+from collections.abc import Iterator
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def work_dir() -> Iterator[str]:
+    """
+    Scratch directory for running external toolchains.
+
+    By default every call gets a fresh temporary directory. If the ``PATCHEREX2_WORK_DIR``
+    environment variable is set (e.g. to a tmpfs mount such as /dev/shm), each thread instead
+    reuses one private directory below it across calls, and the files of the previous call are
+    simply overwritten.
+    """
+    root = os.environ.get("PATCHEREX2_WORK_DIR")
+    if not root or getattr(_local, "busy", False):
+        with tempfile.TemporaryDirectory(dir=root or None) as td:
+            yield td
+        return
+    path = getattr(_local, "path", None)
+    if path is None or _local.pid != os.getpid() or not os.path.isdir(path):
+        os.makedirs(root, exist_ok=True)
+        path = tempfile.mkdtemp(prefix="patcherex2-", dir=root)
+        atexit.register(shutil.rmtree, path, True)
+        _local.path = path
+        _local.pid = os.getpid()
+    _local.busy = True
+    try:
+        yield path
+    finally:
+        _local.busy = False
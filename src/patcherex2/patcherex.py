@@ -1,11 +1,15 @@
 # ruff: noqa: F403, F405
 from __future__ import annotations
 
+import contextlib
 import logging
 
 from .components.binary_analyzers.ghidra import Ghidra
+from .components.utils.stats import Stats
+from .components.utils.symbol_table import SymbolTable
 from .patches import *
 from .patches import __all__ as all_patches
+from .session import Session, referenced_names
 from .targets import Target
 
 logging.Logger.manager.loggerDict["patcherex"] = logging.Logger.manager.loggerDict[
@@ -19,6 +23,19 @@ class Patcherex:
     The main class of the library. This is how you are intended to interact with patches.
     """
 
+    components = (
+        "assembler",
+        "disassembler",
+        "compiler",
+        "binary_analyzer",
+        "allocation_manager",
+        "binfmt_tool",
+        "utils",
+        "archinfo",
+    )
+    # the binary format tool adds the free blocks of the binary to the allocation manager
+    _populated_by = {"allocation_manager": "binfmt_tool"}
+
     def __init__(
         self,
         binary_path: str,
@@ -44,31 +61,16 @@ class Patcherex:
         else:
             self.target = target_cls(self, binary_path)
 
-        self.symbols = {}
+        self.symbols = SymbolTable()
+        # timings and counters of the components, disabled by default
+        self.stats = Stats(self)
         self.sypy_info = {"patcherex_added_functions": []}
         self.patches = []
 
-        # Initialize components
-        components = [
-            "assembler",
-            "disassembler",
-            "compiler",
-            "binary_analyzer",
-            "allocation_manager",
-            "binfmt_tool",
-            "utils",
-            "archinfo",
-        ]
-        for component in components:
-            setattr(
-                self,
-                component,
-                self.target.get_component(
-                    component,
-                    target_opts.get(component),
-                    components_opts.get(component),
-                ),
-            )
+        # Components are created on first access, see __getattr__
+        self._target_opts = target_opts
+        self._components_opts = components_opts
+        self._initializing = set()
 
         # Chosen patch order, making sure all are accounted for
         self.patch_order = (
@@ -88,29 +90,155 @@ class Patcherex:
         )
         assert len(self.patch_order) == len(all_patches)
 
+    def __getattr__(self, name: str):
+        # only called if the attribute is not set yet
+        if name not in self.components or "_components_opts" not in self.__dict__:
+            raise AttributeError(
+                f"'{type(self).__name__}' object has no attribute '{name}'"
+            )
+        logger.debug(f"Initializing {name}")
+        self._initializing.add(name)
+        try:
+            with self.stats.span(f"{name}.__init__"):
+                component = self.target.get_component(
+                    name,
+                    self._target_opts.get(name),
+                    self._components_opts.get(name),
+                )
+            if self.stats.enabled:
+                self.stats.instrument(name, component)
+            setattr(self, name, component)
+        finally:
+            self._initializing.discard(name)
+        populator = self._populated_by.get(name)
+        if populator is not None and populator not in self._initializing:
+            getattr(self, populator)
+        return component
+
     def shutdown(self):
         """
         Shuts down any resources used by Patcherex2.
         This needs to be called when using Ghidra as the binary analyzer when done patching.
         """
-        if isinstance(self.binary_analyzer, Ghidra):
+        # don't create the binary analyzer just to shut it down
+        if isinstance(self.__dict__.get("binary_analyzer"), Ghidra):
             self.binary_analyzer.shutdown()
 
-    def apply_patches(self) -> None:
+    def apply_patches(
+        self,
+        max_workers: int | None = None,
+        session: str | None = None,
+        reclaim_unused_funcs: bool = False,
+    ) -> None:
         """
         Applies all added patches to the binary. Call this when you have added all the patches you want.
+
+        The C code of all patches is compiled concurrently up front. Linking, allocation and writing
+        the binary stay serial, so the result is the same as applying the patches one by one.
+
+        With a session, what each patch does is recorded in a snapshot file. When the same patches
+        are applied to the same binary again, every patch that hasn't changed (and whose symbols
+        haven't changed) is replayed from the snapshot instead, and only the other patches are
+        applied, after the replayed ones. See :mod:`patcherex2.session`.
+
+        Patches are applied in the order they were added, except that RemoveFunctionPatches come
+        first and then the data patches. A RemoveFunctionPatch always hands the body of its function
+        to the allocator, whether or not reclaim_unused_funcs is set, so that every other patch can
+        use it. Without RemoveFunctionPatches, the order is the same as in earlier versions.
+
+        :param max_workers: Number of compiler processes to run at once, defaults to the number of CPUs. 1 disables the concurrent compilation.
+        :param session: Path of the session snapshot to replay unchanged patches from and to store the new snapshot in, defaults to None
+        :param reclaim_unused_funcs: Whether to place the added code in the bodies of the functions that are never referenced (see AllocationManager.reclaim_unused_funcs) before resorting to new segments, defaults to False
         """
         # TODO: sort patches properly
         # self.patches.sort(key=lambda x: self.patch_order.index(type(x)))
+        # removed functions are free space for the patches after them
         self.patches.sort(
-            key=lambda x: not isinstance(
-                x, (ModifyDataPatch, InsertDataPatch, RemoveDataPatch)
+            key=lambda x: (
+                not isinstance(x, RemoveFunctionPatch),
+                not isinstance(x, (ModifyDataPatch, InsertDataPatch, RemoveDataPatch)),
             )
         )
         logger.debug(f"Applying patches: {self.patches}")
-        for patch in self.patches:
-            patch.apply(self)
+        if reclaim_unused_funcs:
+            self.allocation_manager.reclaim_unused_funcs(self._patched_addrs())
+        if session is None:
+            self._apply(self.patches, max_workers)
+            self.binfmt_tool.finalize()
+            return
+
+        symbols = dict(self.symbols)
+        added_functions = list(self.sypy_info["patcherex_added_functions"])
+        snapshot = Session(self, session)
+        with self.stats.span("session.replay"):
+            patches = snapshot.replay(self.patches)
+        self._apply(patches, max_workers, snapshot)
+        if not snapshot.consistent():
+            logger.warning(
+                f"Patches replayed from {session} refer to symbols defined by other patches, applying all patches again"
+            )
+            # start over from the unpatched binary, the allocation manager is populated anew
+            self.__dict__.pop("allocation_manager", None)
+            self.__dict__.pop("binfmt_tool", None)
+            self.symbols.clear()
+            self.symbols.update(symbols)
+            self.sypy_info["patcherex_added_functions"] = added_functions
+            if reclaim_unused_funcs:
+                self.allocation_manager.reclaim_unused_funcs(self._patched_addrs())
+            snapshot = Session(self, session)
+            snapshot.previous = []
+            self._apply(self.patches, max_workers, snapshot)
         self.binfmt_tool.finalize()
+        snapshot.save()
+
+    def _patched_addrs(self) -> set[int]:
+        # addresses the patches write to, hook or refer to, functions containing them must stay
+        addrs = set()
+        all_symbols = self.binary_analyzer.get_all_symbols()
+        for patch in self.patches:
+            for attr in ("addr", "addr_or_name"):
+                value = getattr(patch, attr, None)
+                if isinstance(value, str):
+                    func = self.binary_analyzer.get_function(value)
+                    value = func["addr"] if func else None
+                if isinstance(value, int):
+                    addrs.add(value)
+            symbols = getattr(patch, "symbols", None)
+            if isinstance(symbols, dict):
+                addrs.update(v for v in symbols.values() if isinstance(v, int))
+            # {name} references in the code of the patch
+            addrs.update(
+                all_symbols[name]
+                for name in referenced_names(patch)
+                if name in all_symbols
+            )
+        return addrs
+
+    def _apply(
+        self,
+        patches: list[Patch],
+        max_workers: int | None,
+        session: Session | None = None,
+    ) -> None:
+        if patches:
+            self.utils.plan_trampolines(patches)
+            if max_workers != 1:
+                self._precompile(patches, max_workers)
+        for patch in patches:
+            with self.stats.span(f"patch.{type(patch).__name__}", patch=patch):
+                with session.record(patch) if session else contextlib.nullcontext():
+                    patch.apply(self)
+
+    def _precompile(self, patches: list[Patch], max_workers: int | None) -> None:
+        requests = []
+        for patch in patches:
+            try:
+                requests += patch.compile_requests(self)
+            except Exception as e:
+                # the patch reports the problem when it is applied
+                logger.debug(f"Cannot precompile {patch}: {e}")
+        if requests:
+            self.compiler.precompile(requests, max_workers=max_workers)
 
     def save_binary(self, filename: str = None) -> None:
         """
@@ -45,6 +45,18 @@ class ModifyFunctionPatch(Patch):
         self.symbols = symbols if symbols else {}
         self.compile_opts = kwargs["compile_opts"] if "compile_opts" in kwargs else {}
 
+    def compile_requests(self, p: Patcherex) -> list[tuple[str, dict]]:
+        func = p.binary_analyzer.get_function(self.addr_or_name)
+        return [
+            (
+                self.code,
+                {
+                    "is_thumb": p.binary_analyzer.is_thumb(func["addr"]),
+                    **self.compile_opts,
+                },
+            )
+        ]
+
     def apply(self, p: Patcherex) -> None:
         """
         Applies the patch to the binary, intended to be called by a Patcherex instance.
@@ -144,6 +156,12 @@ class InsertFunctionPatch(Patch):
             kwargs["save_context"] if "save_context" in kwargs else False
         )
 
+    def compile_requests(self, p: Patcherex) -> list[tuple[str, dict]]:
+        if self.addr:
+            # the intermediate function is compiled without compile_opts
+            return [(self.code, {"is_thumb": p.binary_analyzer.is_thumb(self.addr)})]
+        return [(self.code, {"is_thumb": self.is_thumb, **self.compile_opts})]
+
     def apply(self, p: Patcherex) -> None:
         """
         Applies the patch to the binary, intended to be called by a Patcherex instance.
@@ -228,11 +246,30 @@ class InsertFunctionPatch(Patch):
 
 class RemoveFunctionPatch(Patch):
     """
-    Patch that removes a function from the binary. Not implemented.
+    Patch that removes a function from the binary. The body of the function becomes free space that
+    other patches can place their code in, so the function must not be called anymore. It is
+    applied before all other patches and frees the body even if apply_patches() is not asked to
+    reclaim unused functions.
     """
 
-    def __init__(self, parent=None) -> None:
+    def __init__(self, addr_or_name: int | str, num_bytes: int | None = None) -> None:
         """
         Constructor.
+
+        :param addr_or_name: The name or memory address of the function.
+        :param num_bytes: Number of bytes to remove from the start of the function, defaults to the whole function
         """
-        raise NotImplementedError()
+        self.addr_or_name = addr_or_name
+        self.num_bytes = num_bytes
+
+    def apply(self, p: Patcherex) -> None:
+        """
+        Applies the patch to the binary, intended to be called by a Patcherex instance.
+
+        :param p: Patcherex instance.
+        """
+        func = p.binary_analyzer.get_function(self.addr_or_name)
+        if func is None:
+            raise Exception(f"Cannot find function {self.addr_or_name}")
+        size = func["size"] if self.num_bytes is None else self.num_bytes
+        p.allocation_manager.add_free_space(func["addr"], size, "RX")
@@ -239,10 +239,35 @@ class InsertInstructionPatch(Patch):
         elif self.language == "C":
             self._apply_c(p)
 
+    def compile_requests(self, p) -> list[tuple[str, dict]]:
+        if self.language != "C" or self.addr is None:
+            return []
+        is_thumb = p.utils.get_insertion_point(self.addr, self.force_insert)["is_thumb"]
+        return [
+            (
+                self._c_code(p),
+                {"is_thumb": is_thumb, "extra_compiler_flags": ["-Os"]},
+            )
+        ]
+
     def _apply_c(self, p) -> None:
         if self.addr is None:
             raise ValueError("An address must be provided for a C instruction patch")
 
+        code = self._c_code(p)
+        logger.info("InsertInstructionPatch generated C code:\n" + code)
+        p.utils.insert_trampoline_code(
+            self.addr,
+            code,
+            force_insert=self.force_insert,
+            detour_pos=self.detour_pos,
+            symbols=self.symbols,
+            language="C",
+            asm_header=self.c_config.asm_header,
+            asm_footer=self.c_config.asm_footer,
+        )
+
+    def _c_code(self, p) -> str:
         c_forward_header = self.c_config.c_forward_header
         c_scratch_regs = (
             frozenset()
@@ -392,18 +417,7 @@ class InsertInstructionPatch(Patch):
             "}",
             "#undef return",
         ]
-        code = "\n".join(lines)
-        logger.info("InsertInstructionPatch generated C code:\n" + code)
-        p.utils.insert_trampoline_code(
-            self.addr,
-            code,
-            force_insert=self.force_insert,
-            detour_pos=self.detour_pos,
-            symbols=self.symbols,
-            language="C",
-            asm_header=self.c_config.asm_header,
-            asm_footer=self.c_config.asm_footer,
-        )
+        return "\n".join(lines)
 
     def _apply_asm(self, p) -> None:
         if self.addr:
@@ -8,3 +8,10 @@ class Patch:
 
     def apply(self, p):
         raise NotImplementedError()
+
+    def compile_requests(self, p) -> list[tuple[str, dict]]:
+        """
+        Returns the C code this patch will compile when applied, with the keyword arguments of
+        each compile call, so that it can be compiled ahead of time.
+        """
+        return []
@@ -0,0 +1,280 @@
+"""
+Snapshots of a patching session, so that rerunning a patch script only applies the patches that
+changed since the last run.
+
+While the patches are applied, the session records for every patch what it did: the blocks it
+allocated (and new segments it created), the bytes it wrote, the symbols it defined, the functions
+it added and the values of the symbols it referred to. Records are keyed by a fingerprint of the
+patch, i.e. a hash of its type and attributes.
+
+On the next run, a patch whose fingerprint has a record is replayed from it, in the order of the
+previous run: its blocks are reserved at the recorded addresses and its bytes and symbols are
+restored, without analyzing the binary or compiling anything. A record is not replayed if a symbol
+it referred to has a different value by now (e.g. it was defined by a patch that changed), or if
+its blocks are no longer available. The remaining patches are then applied as usual, after all
+replayed ones.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import pickle
+import re
+import tempfile
+from collections.abc import Iterator
+from typing import TYPE_CHECKING
+
+from .components.binary_analyzers.cfg_cache import CFGCache
+
+if TYPE_CHECKING:
+    from .patcherex import Patcherex
+    from .patches import Patch
+
+logger = logging.getLogger(__name__)
+
+_identifier_re = re.compile(r"[A-Za-z_.$][\w.$]*")
+
+
+def _default(obj):
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.hex()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    if hasattr(obj, "__dict__") and not callable(obj):
+        return {"__class__": type(obj).__qualname__, **vars(obj)}
+    # e.g. functions, whose behavior can't be fingerprinted by their name
+    raise TypeError(f"Cannot fingerprint {obj!r}")
+
+
+def fingerprint(patch: Patch) -> str | None:
+    """
+    Returns a hash of the type and attributes of a patch, or None if the attributes hold
+    something that can't be hashed reliably, in which case the patch is never replayed.
+    """
+    try:
+        payload = json.dumps(patch, default=_default, sort_keys=True)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def referenced_names(patch: Patch) -> set[str]:
+    """
+    Returns every identifier that appears in the strings of a patch (its code, instructions,
+    names, ...), a superset of the symbols it refers to.
+    """
+    names = set()
+    stack = [patch]
+    seen = set()
+    while stack:
+        obj = stack.pop()
+        if isinstance(obj, str):
+            names.update(_identifier_re.findall(obj))
+        elif id(obj) in seen:
+            continue
+        elif isinstance(obj, dict):
+            seen.add(id(obj))
+            stack += obj.keys()
+            stack += obj.values()
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            seen.add(id(obj))
+            stack += obj
+        elif hasattr(obj, "__dict__") and not callable(obj):
+            seen.add(id(obj))
+            stack += vars(obj).values()
+    return names
+
+
+class Session:
+    """
+    Session snapshot stored at a path, see the module documentation. The snapshot is only reused
+    for the same binary, target, target options, component options and Patcherex2 version.
+
+    Snapshots are pickles, and loading one can run arbitrary code, so only use a snapshot path
+    that nobody else can write to.
+    """
+
+    VERSION = 2
+
+    def __init__(self, p: Patcherex, path: str) -> None:
+        """
+        :param p: Patcherex instance
+        :param path: Path of the snapshot file, which doesn't need to exist yet
+        """
+        self.p = p
+        self.path = path
+        self.key = self._key()
+        self.previous = self._load()
+        self.records = []
+        # patches replayed from the snapshot and patches that were applied
+        self.replayed = []
+        self.applied = []
+        self._replayed_records = []
+        # symbols defined by the applied patches
+        self._applied_symbols = set()
+
+    def _key(self) -> str:
+        from . import __version__
+
+        payload = json.dumps(
+            {
+                "version": self.VERSION,
+                "patcherex2": __version__,
+                "binary": CFGCache.hash_file(self.p.binary_path),
+                "target": type(self.p.target).__qualname__,
+                "target_opts": self.p._target_opts,
+                "components_opts": self.p._components_opts,
+            },
+            sort_keys=True,
+            default=repr,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _load(self) -> list[dict]:
+        if not os.path.exists(self.path):
+            return []
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+            if snapshot["key"] != self.key:
+                logger.info(f"Session {self.path} is for another binary or setup")
+                return []
+            return snapshot["records"]
+        except Exception:
+            logger.warning(f"Ignoring unreadable session {self.path}")
+            return []
+
+    def save(self) -> None:
+        """
+        Writes the records of this run to the snapshot file.
+        """
+        data = pickle.dumps(
+            {"key": self.key, "records": self.records},
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.path)))
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        logger.info(
+            f"Stored session {self.path}: {len(self.replayed)} patches replayed, {len(self.applied)} applied"
+        )
+
+    def replay(self, patches: list[Patch]) -> list[Patch]:
+        """
+        Replays the patches that have a usable record and returns the ones left to apply, in
+        their given order.
+        """
+        unreplayed = {}
+        for patch in patches:
+            fp = fingerprint(patch)
+            if fp is not None:
+                unreplayed.setdefault(fp, []).append(patch)
+        replayed = set()
+        for record in self.previous:
+            candidates = unreplayed.get(record["fingerprint"])
+            if candidates and self._replay(record):
+                patch = candidates.pop(0)
+                replayed.add(id(patch))
+                self.replayed.append(patch)
+                self._replayed_records.append((patch, record))
+                self.records.append(record)
+        if self.previous:
+            logger.info(
+                f"Replayed {len(replayed)} of {len(patches)} patches from {self.path}"
+            )
+        return [patch for patch in patches if id(patch) not in replayed]
+
+    def _can_replay(self, record: dict) -> bool:
+        if any(
+            self.p.symbols.get(name) != value for name, value in record["deps"].items()
+        ):
+            return False
+        am = self.p.allocation_manager
+        # memory ranges made available by this record itself
+        own = []
+        for event in record["allocations"]:
+            if event[0] == "map":
+                if not own and am._new_mapped_block_addrs() != event[1:3]:
+                    return False
+                own.append((event[2], event[3]))
+                continue
+            if event[0] == "free":
+                own.append((event[2], event[3]))
+                continue
+            _, file_addr, mem_addr, size, flag = event
+            if any(start <= mem_addr < start + length for start, length in own):
+                continue
+            if not am.can_reserve(file_addr, mem_addr, size, flag):
+                return False
+        return True
+
+    def _replay(self, record: dict) -> bool:
+        if not self._can_replay(record):
+            return False
+        am = self.p.allocation_manager
+        for event in record["allocations"]:
+            if event[0] == "map":
+                done = am.map_new_block(*event[1:])
+            elif event[0] == "free":
+                done = am.free_range(*event[1:])
+            else:
+                done = am.reserve(*event[1:])
+            if not done:
+                raise RuntimeError(f"Failed to replay {event} of the session")
+        for offset, content in record["writes"]:
+            self.p.binfmt_tool.update_binary_content(offset, content)
+        self.p.symbols.update(record["symbols"])
+        self.p.sypy_info["patcherex_added_functions"] += record["added_functions"]
+        return True
+
+    @contextlib.contextmanager
+    def record(self, patch: Patch) -> Iterator[None]:
+        """
+        Records what the patch applied within the context does.
+        """
+        fp = fingerprint(patch)
+        names = referenced_names(patch)
+        symbols = dict(self.p.symbols)
+        added_functions = len(self.p.sypy_info["patcherex_added_functions"])
+        am, binfmt_tool = self.p.allocation_manager, self.p.binfmt_tool
+        am.journal, binfmt_tool.journal = [], []
+        try:
+            yield
+            record = {
+                "fingerprint": fp,
+                "allocations": am.journal,
+                "writes": binfmt_tool.journal,
+                "symbols": {
+                    name: value
+                    for name, value in self.p.symbols.items()
+                    if name not in symbols or symbols[name] != value
+                },
+                "deps": {name: symbols[name] for name in names if name in symbols},
+                "added_functions": self.p.sypy_info["patcherex_added_functions"][
+                    added_functions:
+                ],
+            }
+        finally:
+            am.journal, binfmt_tool.journal = None, None
+        self.applied.append(patch)
+        self._applied_symbols.update(record["symbols"])
+        if fp is not None:
+            self.records.append(record)
+
+    def consistent(self) -> bool:
+        """
+        Whether the replayed patches still see the symbol values they were recorded with, now
+        that the other patches are applied. This only fails if an applied patch defines a symbol
+        that a replayed patch referred to, but that wasn't defined when it was recorded.
+        """
+        for patch, record in self._replayed_records:
+            for name in referenced_names(patch) & self._applied_symbols:
+                if record["deps"].get(name) != self.p.symbols[name]:
+                    logger.info(f"{patch} refers to {name}, which has changed")
+                    return False
+        return True
@@ -14,10 +14,6 @@ logger = logging.getLogger(__name__)
 
 
 class BinArmBare(Target):
-    @staticmethod
-    def detect_target(binary_path):
-        return False
-
     def get_assembler(self, assembler):
         assembler = assembler or "keystone"
         if assembler == "keystone":
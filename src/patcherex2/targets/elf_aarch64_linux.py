@@ -15,15 +15,7 @@ logger = logging.getLogger(__name__)
 
 
 class ElfAArch64Linux(Target):
-    @staticmethod
-    def detect_target(binary_path):
-        with open(binary_path, "rb") as f:
-            magic = f.read(0x14)
-            if magic.startswith(b"\x7fELF") and magic.startswith(
-                b"\xb7\x00", 0x12
-            ):  # EM_AARCH64
-                return True
-        return False
+    match_keys = [("elf", 0xB7, "little", None)]  # EM_AARCH64
 
     def get_assembler(self, assembler):
         assembler = assembler or "keystone"
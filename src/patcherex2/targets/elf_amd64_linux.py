@@ -11,15 +11,7 @@ from .target import Target
 
 
 class ElfAmd64Linux(Target):
-    @staticmethod
-    def detect_target(binary_path):
-        with open(binary_path, "rb") as f:
-            magic = f.read(0x14)
-            if magic.startswith(b"\x7fELF") and magic.startswith(
-                b"\x3e\x00", 0x12
-            ):  # EM_X86_64
-                return True
-        return False
+    match_keys = [("elf", 0x3E, "little", None)]  # EM_X86_64
 
     def get_assembler(self, assembler):
         assembler = assembler or "keystone"
@@ -5,10 +5,6 @@ from .elf_amd64_linux import ElfAmd64Linux
 
 
 class ElfAmd64LinuxRecomp(ElfAmd64Linux):
-    @staticmethod
-    def detect_target(binary_path):
-        return False
-
     def get_compiler(self, compiler):
         compiler = compiler or "llvm_recomp"
         if compiler == "llvm_recomp":
@@ -32,7 +32,13 @@ class CustomAllocationManager(AllocationManager):
         for block in self.blocks[FileBlock]:
             if block.size == -1:
                 file_addr = block.addr
-                block.addr += 0x10000
+        if file_addr is None:
+            return False
+        block_size = self._new_mapped_block_size(file_addr, size, flag, align)
+        self._new_block_growth[flag] = min(block_size * 2, 0x10000)
+        for block in self.blocks[FileBlock]:
+            if block.size == -1:
+                block.addr += block_size
         if flag == MemoryFlag.RW:
             for block in self.blocks[RamBlock]:
                 if block.size == -1:
@@ -51,7 +57,7 @@ class CustomAllocationManager(AllocationManager):
                         virtual_mem_addr = (
                             block.addr + (file_addr - block.addr) % 0x1000
                         )
-                    block.addr = virtual_mem_addr + 0x10000
+                    block.addr = virtual_mem_addr + block_size
             for block in self.blocks[FlashBlock]:
                 if block.size == -1:
                     if self.p.binfmt_tool.__class__.__name__ == "ELF":
@@ -67,12 +73,12 @@ class CustomAllocationManager(AllocationManager):
                         )
                     else:
                         load_mem_addr = block.addr + (file_addr - block.addr) % 0x1000
-                    block.addr = load_mem_addr + 0x10000
+                    block.addr = load_mem_addr + block_size
             if file_addr and load_mem_addr and virtual_mem_addr:
                 block = MappedBlock(
                     file_addr,
                     virtual_mem_addr,
-                    0x10000,
+                    block_size,
                     is_free=True,
                     flag=flag,
                     load_mem_addr=load_mem_addr,
@@ -101,12 +107,12 @@ class CustomAllocationManager(AllocationManager):
                         )
                     else:
                         load_mem_addr = block.addr + (file_addr - block.addr) % 0x1000
-                    block.addr = load_mem_addr + 0x10000
+                    block.addr = load_mem_addr + block_size
             if file_addr and load_mem_addr:
                 block = MappedBlock(
                     file_addr,
                     load_mem_addr,
-                    0x10000,
+                    block_size,
                     is_free=True,
                     flag=flag,
                 )
@@ -306,10 +312,6 @@ bne copy
 
 
 class ElfArmBare(ElfArmLinux):
-    @staticmethod
-    def detect_target(binary_path):
-        return False
-
     def get_binfmt_tool(self, binfmt_tool, **kwargs):
         binfmt_tool = binfmt_tool or "default"
         if binfmt_tool == "default":
@@ -5,10 +5,6 @@ from .elf_arm_linux import ElfArmLinux
 
 
 class ElfArmLinuxRecomp(ElfArmLinux):
-    @staticmethod
-    def detect_target(binary_path):
-        return False
-
     def get_compiler(self, compiler):
         compiler = compiler or "llvm_recomp"
         if compiler == "llvm_recomp":
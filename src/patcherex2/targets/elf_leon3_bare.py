@@ -34,10 +34,6 @@ class CustomElf(ELF):
 
 
 class ElfLeon3Bare(Target):
-    @staticmethod
-    def detect_target(binary_path):
-        return False
-
     def get_assembler(self, assembler):
         assembler = assembler or "keystone"
         if assembler == "keystone":
@@ -11,15 +11,7 @@ from .target import Target
 
 
 class ElfMips64Linux(Target):
-    @staticmethod
-    def detect_target(binary_path):
-        with open(binary_path, "rb") as f:
-            magic = f.read(0x14)
-            if magic.startswith(b"\x7fELF\x02") and magic.startswith(
-                b"\x00\x08", 0x12
-            ):  # EM_MIPS
-                return True
-        return False
+    match_keys = [("elf", 0x08, "big", 64)]  # EM_MIPS
 
     def get_assembler(self, assembler):
         assembler = assembler or "keystone"
@@ -11,15 +11,7 @@ from .target import Target
 
 
 class ElfPpc64Linux(Target):
-    @staticmethod
-    def detect_target(binary_path):
-        with open(binary_path, "rb") as f:
-            magic = f.read(0x14)
-            if magic.startswith(b"\x7fELF") and magic.startswith(
-                b"\x00\x15", 0x12
-            ):  # EM_PPC64
-                return True
-        return False
+    match_keys = [("elf", 0x15, "big", None)]  # EM_PPC64
 
     def get_assembler(self, assembler):
         assembler = assembler or "keystone"
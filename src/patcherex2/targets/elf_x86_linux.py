@@ -11,15 +11,7 @@ from .target import Target
 
 
 class ElfX86Linux(Target):
-    @staticmethod
-    def detect_target(binary_path):
-        with open(binary_path, "rb") as f:
-            magic = f.read(0x14)
-            if magic.startswith(b"\x7fELF") and magic.startswith(
-                b"\x03\x00", 0x12
-            ):  # EM_386
-                return True
-        return False
+    match_keys = [("elf", 0x03, "little", None)]  # EM_386
 
     def get_assembler(self, assembler):
         assembler = assembler or "keystone"
@@ -1,7 +1,5 @@
 import logging
 
-import archinfo
-
 from ..components.allocation_managers.allocation_manager import AllocationManager
 from ..components.archinfo.ppc_vle import PpcVleInfo
 from ..components.assemblers.ppc_vle import PpcVle as PpcVleAssembler
@@ -16,10 +14,6 @@ logger = logging.getLogger(__name__)
 
 
 class IHexPPCBare(Target):
-    @staticmethod
-    def detect_target(binary_path):
-        return False
-
     def get_assembler(self, assembler):
         assembler = assembler or "default"
         if assembler == "default":
@@ -53,6 +47,8 @@ class IHexPPCBare(Target):
     def get_binary_analyzer(self, binary_analyzer):
         binary_analyzer = binary_analyzer or "angr"
         if binary_analyzer == "angr":
+            import archinfo
+
             return Angr(
                 self.binary_path,
                 angr_kwargs={
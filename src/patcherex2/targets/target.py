@@ -1,5 +1,18 @@
+from __future__ import annotations
+
+import itertools
+
+
 class Target:
     target_classes = []
+    # (format, machine, endianness, bits) of the binaries this target handles, e.g.
+    # ("elf", 0x3E, "little", 64). None matches any value. Keys are not inherited by subclasses.
+    match_keys = ()
+    # the matching target with the highest priority is chosen, ties go to the one defined first
+    priority = 0
+    # number of bytes of the binary read for detection
+    header_size = 0x40
+    _dispatch_table = None
 
     def __init__(self, p, binary_path):
         self.binary_path = binary_path
@@ -8,13 +21,58 @@ class Target:
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         cls.target_classes.append(cls)
+        Target._dispatch_table = None
+
+    @staticmethod
+    def match_key(
+        header: bytes,
+    ) -> tuple[str | None, int | None, str | None, int | None]:
+        """
+        Returns the (format, machine, endianness, bits) key of a binary given its header.
+        """
+        if header.startswith(b"\x7fELF") and len(header) >= 0x14:
+            endianness = {1: "little", 2: "big"}.get(header[5])
+            bits = {1: 32, 2: 64}.get(header[4])
+            machine = int.from_bytes(header[0x12:0x14], endianness or "little")
+            return ("elf", machine, endianness, bits)
+        if header.startswith(b":"):
+            return ("ihex", None, None, None)
+        return (None, None, None, None)
+
+    @classmethod
+    def get_dispatch_table(cls) -> dict[tuple, list[type[Target]]]:
+        if Target._dispatch_table is None:
+            table = {}
+            for target_class in Target.target_classes:
+                for key in vars(target_class).get("match_keys", ()):
+                    table.setdefault(tuple(key), []).append(target_class)
+            Target._dispatch_table = table
+        return Target._dispatch_table
+
+    @classmethod
+    def detect_target_class(cls, binary_path) -> type[Target]:
+        with open(binary_path, "rb") as f:
+            header = f.read(cls.header_size)
+        key = cls.match_key(header)
+        table = cls.get_dispatch_table()
+        candidates = []
+        # look up the key with every combination of fields replaced by wildcards
+        for fields in itertools.product(*((value, None) for value in key[1:])):
+            candidates += table.get((key[0], *fields), [])
+        # targets that implement their own detect_target(binary_path) check
+        for target_class in Target.target_classes:
+            if "detect_target" in vars(target_class) and target_class.detect_target(
+                binary_path
+            ):
+                candidates.append(target_class)
+        if not candidates:
+            raise ValueError("Unknown target")
+        order = {c: i for i, c in enumerate(Target.target_classes)}
+        return max(candidates, key=lambda c: (c.priority, -order[c]))
 
     @classmethod
     def detect_target(cls, p, binary_path):
-        for target_class in cls.target_classes:
-            if target_class.detect_target(binary_path):
-                return target_class(p, binary_path)
-        raise ValueError("Unknown target")
+        return cls.detect_target_class(binary_path)(p, binary_path)
 
     def get_component(self, component_type, component_name, component_opts=None):
         if component_opts is None:
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+from patcherex2.components.allocation_managers.allocation_manager import (
+    AllocationManager,
+    FileBlock,
+    MappedBlock,
+    MemoryBlock,
+    MemoryFlag,
+)
+
+
+class DummyBinFmtTool:
+    def __init__(self):
+        self.file_size = 0x1000
+
+
+class DummyPatcherex:
+    def __init__(self):
+        self.binfmt_tool = DummyBinFmtTool()
+
+
+def make_manager(*blocks):
+    manager = AllocationManager(DummyPatcherex())
+    for addr, size, flag in blocks:
+        manager.add_block(MappedBlock(addr, addr, size, is_free=True, flag=flag))
+    return manager
+
+
+def mapped(manager):
+    return [
+        (block.mem_addr, block.size, block.is_free)
+        for block in manager.blocks[MappedBlock]
+    ]
+
+
+def test_add_block_keeps_order_and_coalesces():
+    manager = make_manager(
+        (0x300, 0x10, MemoryFlag.RX),
+        (0x100, 0x10, MemoryFlag.RX),
+        (0x110, 0x10, MemoryFlag.RW),
+        (0x310, 0x10, MemoryFlag.RX),
+        (0x2F0, 0x10, MemoryFlag.RX),
+    )
+    assert mapped(manager) == [
+        (0x100, 0x10, True),
+        (0x110, 0x10, True),
+        (0x2F0, 0x30, True),
+    ]
+
+
+def test_best_fit():
+    manager = make_manager(
+        (0x100, 0x40, MemoryFlag.RX),
+        (0x200, 0x10, MemoryFlag.RX),
+        (0x300, 0x10, MemoryFlag.RW),
+        (0x400, 0x20, MemoryFlag.RWX),
+    )
+    block = manager.allocate(0x10, flag=MemoryFlag.RX)
+    assert (block.mem_addr, block.size, block.is_free) == (0x200, 0x10, False)
+    block = manager.allocate(0x10, flag=MemoryFlag.RX)
+    assert block.mem_addr == 0x400
+    block = manager.allocate(0x10, flag=MemoryFlag.RW)
+    assert block.mem_addr == 0x300
+    block = manager.allocate(0x10, flag=MemoryFlag.RW)
+    assert block.mem_addr == 0x410
+
+
+def test_alignment_padding():
+    manager = make_manager((0x102, 0x20, MemoryFlag.RX))
+    block = manager.allocate(0x8, flag=MemoryFlag.RX, align=0x8)
+    assert block.mem_addr == 0x108
+    assert mapped(manager) == [
+        (0x102, 0x6, True),
+        (0x108, 0x8, False),
+        (0x110, 0x12, True),
+    ]
+
+
+def test_padded_fit_takes_whole_block():
+    manager = make_manager(
+        (0x100, 0x8, MemoryFlag.RX),
+        (0x204, 0xC, MemoryFlag.RX),
+    )
+    block = manager.allocate(0x8, flag=MemoryFlag.RX, align=0x8)
+    assert (block.mem_addr, block.size) == (0x204, 0xC)
+    assert mapped(manager) == [(0x100, 0x8, True), (0x204, 0xC, False)]
+
+
+def test_journal_records_carved_range():
+    manager = make_manager(
+        (0x100, 0x10, MemoryFlag.RX),
+        (0x204, 0xC, MemoryFlag.RX),
+    )
+    manager.add_block(
+        MappedBlock(0x110, 0x110, 0x10, is_free=False, flag=MemoryFlag.RX)
+    )
+    manager.add_block(
+        MappedBlock(0x210, 0x210, 0x10, is_free=False, flag=MemoryFlag.RX)
+    )
+    manager.journal = []
+    # both blocks merge with the used blocks after them
+    manager.allocate(0x10, flag=MemoryFlag.RX)
+    manager.allocate(0x8, flag=MemoryFlag.RX, align=0x8)
+    assert manager.journal == [
+        ("allocate", 0x100, 0x100, 0x10, int(MemoryFlag.RX)),
+        ("allocate", 0x204, 0x204, 0xC, int(MemoryFlag.RX)),
+    ]
+
+
+def test_free_coalesces_with_neighbors():
+    manager = make_manager((0x100, 0x30, MemoryFlag.RX))
+    block = manager.allocate(0x10, flag=MemoryFlag.RX, align=0x10)
+    assert block.mem_addr == 0x100
+    manager.free(block)
+    assert mapped(manager) == [(0x100, 0x30, True)]
+    block = manager.allocate(0x30, flag=MemoryFlag.RX)
+    assert block.mem_addr == 0x100
+
+
+def test_many_blocks():
+    manager = make_manager(
+        *((i * 0x20, 0x10, MemoryFlag.RX) for i in range(20000)),
+        *((i * 0x20 + 0x10, 0x10, MemoryFlag.RW) for i in range(20000)),
+    )
+    assert len(manager.blocks[MappedBlock]) == 40000
+    manager.free(manager.allocate(0x10, flag=MemoryFlag.RX))
+    for i in range(20000):
+        manager.allocate(0x10, flag=MemoryFlag.RW)
+    assert len(manager.blocks[MappedBlock]) == 40000
+    assert all(
+        not block.is_free
+        for block in manager.blocks[MappedBlock]
+        if block.flag == MemoryFlag.RW
+    )
+
+
+def test_finalize_trims_new_blocks():
+    manager = make_manager()
+    new_block = MappedBlock(0x1000, 0x10000, 0x100, is_free=True, flag=MemoryFlag.RX)
+    manager.add_block(
+        MappedBlock(0x1000, 0x10000, 0x100, is_free=True, flag=MemoryFlag.RX)
+    )
+    manager.new_mapped_blocks.append(new_block)
+    manager.allocate(0x20, flag=MemoryFlag.RX)
+    manager.finalize()
+    assert new_block.size == 0x20
+    assert mapped(manager) == [(0x10000, 0x20, False)]
+    assert manager.p.binfmt_tool.file_size == 0x1020
+
+
+def test_new_blocks_are_sized_to_the_request():
+    manager = make_manager()
+    manager.add_block(FileBlock(0x1000, -1))
+    manager.add_block(MemoryBlock(0x10000, -1))
+    manager.allocate(0x100000, flag=MemoryFlag.RX, align=0x10)
+    assert [block.size for block in manager.new_mapped_blocks] == [0x101000]
+
+    # small allocations grow the new blocks geometrically
+    for _ in range(64):
+        manager.allocate(0x100, flag=MemoryFlag.RW)
+    blocks = manager.new_mapped_blocks[1:]
+    assert [block.size for block in blocks] == [0x1000, 0x2000, 0x4000]
+    assert all(block.mem_addr % 0x1000 == 0 for block in blocks)
+    manager.finalize()
+    assert sum(block.size for block in blocks) == 64 * 0x100
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import json
+import logging
+import os
+import shutil
+
+import pytest
+
+from patcherex2 import *
+from patcherex2.batch import main, patch_binaries
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def test_patch_binaries(tmp_path):
+    binaries = []
+    for name in ["a", "b"]:
+        binaries.append(str(tmp_path / name))
+        shutil.copy(BINARY, binaries[-1])
+    binaries.append(str(tmp_path / "missing"))
+    recipe = [ModifyInstructionPatch(0x40113E, "lea rax, [0x402008]")]
+    results = {
+        os.path.basename(result["binary"]): result
+        for result in patch_binaries(
+            binaries,
+            recipe,
+            output_dir=str(tmp_path / "out"),
+            max_workers=2,
+            cache_dir=str(tmp_path / "cache"),
+        )
+    }
+    assert not results["missing"]["success"]
+    assert results["missing"]["error"].startswith("FileNotFoundError")
+    for name in ["a", "b"]:
+        assert results[name]["success"], results[name]["error"]
+        assert results[name]["output"] == str(tmp_path / "out" / name)
+        assert set(results[name]["time"]) == {"load", "apply", "save", "total"}
+    with open(tmp_path / "out" / "a", "rb") as f, open(
+        tmp_path / "out" / "b", "rb"
+    ) as g:
+        patched = f.read()
+        assert patched == g.read()
+    with open(BINARY, "rb") as f:
+        assert patched != f.read()
+
+
+def test_cli(tmp_path, capsys):
+    binary = str(tmp_path / "printf_nopie")
+    shutil.copy(BINARY, binary)
+    recipe = tmp_path / "recipe.py"
+    recipe.write_text(
+        "from patcherex2 import *\n"
+        "def recipe(p):\n"
+        "    return [ModifyInstructionPatch(0x40113E, 'lea rax, [0x402008]')]\n"
+    )
+    assert main([str(recipe), binary, "-j", "1"]) == 0
+    (line,) = capsys.readouterr().out.splitlines()
+    result = json.loads(line)
+    assert result["success"]
+    assert result["output"] == binary + ".patched"
+    assert os.path.exists(binary + ".patched")
+
+
+def test_colliding_outputs_are_rejected(tmp_path):
+    binaries = []
+    for name in ["x", "y"]:
+        os.makedirs(tmp_path / name)
+        binaries.append(str(tmp_path / name / "printf_nopie"))
+        shutil.copy(BINARY, binaries[-1])
+    with pytest.raises(ValueError):
+        list(patch_binaries(binaries, [], output_dir=str(tmp_path / "out")))
+    assert not os.path.exists(tmp_path / "out")
+    with pytest.raises(ValueError):
+        list(patch_binaries([binaries[0], binaries[0]], []))
+
+
+def test_in_process_cache_dir_is_restored(tmp_path, monkeypatch):
+    for var in ("PATCHEREX2_CFG_CACHE_DIR", "PATCHEREX2_COMPILER_CACHE_DIR"):
+        monkeypatch.delenv(var, raising=False)
+    binary = str(tmp_path / "printf_nopie")
+    shutil.copy(BINARY, binary)
+    recipe = [ModifyInstructionPatch(0x40113E, "lea rax, [0x402008]")]
+    (result,) = patch_binaries(
+        [binary], recipe, max_workers=1, cache_dir=str(tmp_path / "cache")
+    )
+    assert result["success"], result["error"]
+    assert os.path.isdir(tmp_path / "cache")
+    assert "PATCHEREX2_CFG_CACHE_DIR" not in os.environ
+    assert "PATCHEREX2_COMPILER_CACHE_DIR" not in os.environ
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import importlib.util
+import os
+
+spec = importlib.util.spec_from_file_location(
+    "compare",
+    os.path.join(
+        os.path.dirname(os.path.dirname(os.path.realpath(__file__))),
+        "benchmarks",
+        "compare.py",
+    ),
+)
+compare = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(compare)
+
+
+def results(apply_time, peak_rss=100 << 20):
+    return {
+        "results": {
+            "amd64/printf_nopie/n10": {
+                "stages": {
+                    "load": {"time": 0.01, "peak_rss": 100 << 20},
+                    "apply": {"time": apply_time, "peak_rss": peak_rss},
+                },
+                "components": {},
+            }
+        }
+    }
+
+
+def test_compare_flags_regressions_past_threshold():
+    _, regressions = compare.compare(results(1.0), results(1.1))
+    assert regressions == []
+    _, regressions = compare.compare(results(1.0), results(1.5))
+    assert len(regressions) == 1 and "apply" in regressions[0]
+    _, regressions = compare.compare(results(1.0), results(1.0, 200 << 20))
+    assert len(regressions) == 1 and "memory" in regressions[0]
+
+
+def test_compare_ignores_noise_on_fast_stages():
+    _, regressions = compare.compare(results(0.01), results(0.03))
+    assert regressions == []
+
+
+def test_compare_flags_missing_workloads():
+    _, regressions = compare.compare(results(1.0), {"results": {}})
+    assert len(regressions) == 1 and "missing" in regressions[0]
+
+
+def test_compare_main_exit_code(tmp_path):
+    import json
+
+    (tmp_path / "base.json").write_text(json.dumps(results(1.0)))
+    (tmp_path / "new.json").write_text(json.dumps(results(2.0)))
+    base, new = str(tmp_path / "base.json"), str(tmp_path / "new.json")
+    assert compare.main([base, base]) == 0
+    assert compare.main([base, new]) == 1
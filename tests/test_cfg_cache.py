@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import os
+import tempfile
+
+from patcherex2.components.binary_analyzers.angr import Angr
+from patcherex2.components.binary_analyzers.cfg_cache import CachedCFG, CFGCache
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "./test_binaries/amd64/printf_nopie",
+)
+
+
+def test_cfg_cache_roundtrip():
+    with tempfile.TemporaryDirectory() as td:
+        first = Angr(BINARY, cfg_cache_dir=td)
+        expected_funcs = first.get_all_symbols()
+        expected_block = first.get_basic_block(0x401136)
+        expected_xrefs = set(first.p.kb.xrefs.xrefs_by_dst)
+        assert len(os.listdir(td)) == 1
+
+        second = Angr(BINARY, cfg_cache_dir=td)
+        assert isinstance(second.cfg, CachedCFG)
+        assert second.get_all_symbols() == expected_funcs
+        assert second.get_basic_block(0x401136) == expected_block
+        assert set(second.p.kb.xrefs.xrefs_by_dst) == expected_xrefs
+
+
+def test_cfg_cache_stale_entry_is_removed():
+    with tempfile.TemporaryDirectory() as td:
+        cache = CFGCache(td)
+        key = cache.key(BINARY, {}, {"normalize": True})
+        with open(os.path.join(td, f"{key}.cfg"), "wb") as f:
+            f.write(b"garbage")
+        analyzer = Angr(BINARY, cfg_cache_dir=td)
+        assert cache.load(key, analyzer.p) is None
+        assert not os.path.exists(os.path.join(td, f"{key}.cfg"))
+
+
+def test_cfg_cache_eviction():
+    with tempfile.TemporaryDirectory() as td:
+        analyzer = Angr(BINARY, cfg_cache_dir=td)
+        analyzer.cfg
+        size = os.path.getsize(os.path.join(td, os.listdir(td)[0]))
+        cache = CFGCache(td, max_size=size)
+        cache.store("other", analyzer.p, analyzer.cfg.model)
+        assert os.listdir(td) == ["other.cfg"]
+
+
+def test_cfg_cache_ignores_entries_of_other_users(monkeypatch):
+    with tempfile.TemporaryDirectory() as td:
+        cache = CFGCache(os.path.join(td, "cfg"))
+        assert os.stat(cache.cache_dir).st_mode & 0o777 == 0o700
+        key = cache.key(BINARY, {}, {"normalize": True})
+        with open(os.path.join(cache.cache_dir, f"{key}.cfg"), "wb") as f:
+            f.write(b"garbage")
+        monkeypatch.setattr(os, "getuid", lambda: os.stat(cache.cache_dir).st_uid + 1)
+        assert cache.load(key, None) is None
+        # left for its owner
+        assert os.path.exists(os.path.join(cache.cache_dir, f"{key}.cfg"))
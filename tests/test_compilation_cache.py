@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import os
+import tempfile
+
+from patcherex2.components.compilers.cache import CompilationCache
+
+
+def test_memory_hit_and_miss():
+    cache = CompilationCache(max_entries=2)
+    key = cache.key("cc", ["-Os"], "int a;", 0x1000, {"foo": 0x10})
+    assert cache.get(key) is None
+    cache.put(key, b"\x90\x90")
+    assert cache.get(key) == b"\x90\x90"
+    assert cache.stats == {"hits": 1, "misses": 1, "entries": 1}
+
+
+def test_key_depends_on_inputs():
+    cache = CompilationCache()
+    key = cache.key("cc", ["-Os"], "int a;", 0x1000, {"foo": 0x10})
+    assert key == cache.key("cc", ["-Os"], "int a;", 0x1000, {"foo": 0x10})
+    assert key != cache.key("cc", ["-O2"], "int a;", 0x1000, {"foo": 0x10})
+    assert key != cache.key("cc", ["-Os"], "int b;", 0x1000, {"foo": 0x10})
+    assert key != cache.key("cc", ["-Os"], "int a;", 0x2000, {"foo": 0x10})
+    assert key != cache.key("cc", ["-Os"], "int a;", 0x1000, {"foo": 0x20})
+
+
+def test_memory_lru_eviction():
+    cache = CompilationCache(max_entries=2)
+    cache.put("a", b"a")
+    cache.put("b", b"b")
+    cache.get("a")
+    cache.put("c", b"c")
+    assert cache.get("b") is None
+    assert cache.get("a") == b"a"
+    assert cache.get("c") == b"c"
+
+
+def test_disk_persistence_and_eviction():
+    with tempfile.TemporaryDirectory() as td:
+        cache = CompilationCache(cache_dir=td, max_disk_size=8)
+        cache.put("aa00", b"1234")
+        os.utime(os.path.join(td, "aa", "aa00"), (0, 0))
+        cache.put("bb00", b"5678")
+
+        other = CompilationCache(cache_dir=td, max_disk_size=8)
+        assert other.get("aa00") == b"1234"
+
+        other.put("cc00", b"9abc")
+        assert not os.path.exists(os.path.join(td, "bb", "bb00"))
+        assert os.path.exists(os.path.join(td, "aa", "aa00"))
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import logging
+import os
+import subprocess
+
+from patcherex2 import *
+from patcherex2.components.allocation_managers.allocation_manager import MemoryFlag
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def test_many_new_segments_are_merged(tmp_path):
+    p = Patcherex(BINARY)
+    am = p.allocation_manager
+    for i in range(100):
+        am.allocate(0x10000, flag=MemoryFlag.RX if i % 2 else MemoryFlag.RW)
+    for _ in range(100):
+        am.allocate(0x10000, flag=MemoryFlag.RX)
+    p.binfmt_tool.finalize()
+
+    loads = [s for s in p.binfmt_tool._segments if s["p_type"] == "PT_LOAD"]
+    assert [s["p_offset"] for s in loads] == sorted(s["p_offset"] for s in loads)
+    for prev, next in zip(loads, loads[1:]):
+        assert not (
+            prev["p_offset"] + prev["p_filesz"] == next["p_offset"]
+            and prev["p_vaddr"] + prev["p_memsz"] == next["p_vaddr"]
+            and prev["p_flags"] == next["p_flags"]
+        )
+    # the last 100 allocations end up in a single segment
+    assert loads[-2]["p_filesz"] >= 100 * 0x10000
+
+    p.save_binary(str(tmp_path / "patched"))
+    output = subprocess.run([str(tmp_path / "patched")], capture_output=True).stdout
+    assert output == b"Hi"
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import shutil
+
+import pytest
+
+from patcherex2.components.assemblers.gas import Gas
+from patcherex2.components.disassemblers.ppc_vle import PpcVle
+
+
+class HostGas(Gas):
+    def __init__(self):
+        super().__init__(None, "as", "objcopy", [])
+
+    def _prepare(self, code, base=0):
+        return code
+
+
+@pytest.mark.skipif(
+    shutil.which("as") is None or shutil.which("objcopy") is None,
+    reason="no host as/objcopy",
+)
+def test_assemble_places_code_at_base():
+    assembler = HostGas()
+    assert assembler.assemble("1: nop\njmp 1b", 0x1000) == b"\x90\xeb\xfd"
+    assert assembler.assemble("nop\n.p2align 4, 0xcc\nret", 0x1004) == (
+        b"\x90" + b"\xcc" * 11 + b"\xc3"
+    )
+
+
+def test_ppc_vle_disassemble_many_runs_objdump_once(monkeypatch):
+    disassembler = PpcVle.__new__(PpcVle)
+    calls = []
+
+    def objdump(td, names, base):
+        calls.append((names, base))
+        return "".join(
+            f"\n{td}/{name}:     file format binary\n\n\n"
+            "Disassembly of section .data:\n\n"
+            "00000000 <.data>:\n"
+            "   0:\t18 21 06 f0 \te_stwu   r1,-16(r1)\n"
+            "   4:\t79 ff ff fc \te_b      0xfffffffc\n"
+            "   8:\t01 43       \tse_mr    r3,r4\n"
+            for name in names
+        )
+
+    monkeypatch.setattr(disassembler, "_objdump", objdump)
+    results = disassembler.disassemble_many(
+        [(b"\x00" * 10, 0x40000000), (b"\x00" * 10, 0x1000)]
+    )
+    assert calls == [(["code0.bin", "code1.bin"], 0)]
+    assert [
+        (instr["address"], instr["mnemonic"], instr["op_str"]) for instr in results[1]
+    ] == [
+        (0x1000, "e_stwu", "r1, -16(r1)"),
+        (0x1004, "e_b", "0xffc"),
+        (0x1008, "se_mr", "r3, r4"),
+    ]
+    assert results[0][1]["op_str"] == "0x3ffffffc"
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import io
+import logging
+
+import intelhex
+
+from patcherex2.components.binfmt_tools.ihex import IHex
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+
+def reference(ih, updates):
+    # what IHex.save_binary used to write
+    for offset, content in updates:
+        ih.puts(offset, content)
+    sio = io.StringIO()
+    ih.write_hex_file(sio, byte_count=0x20)
+    entry_point = ""
+    final = ""
+    for line in sio.getvalue().splitlines():
+        if line.startswith(":04000005"):
+            entry_point = line
+        elif line == ":00000001FF":
+            final += entry_point + "\n" + line + "\n"
+        else:
+            final += line + "\n"
+    return final
+
+
+def test_save_binary_streams_records(tmp_path):
+    ih = intelhex.IntelHex()
+    ih.puts(0x100, bytes(range(256)) * 4)
+    ih.puts(0xFFF0, b"\x11" * 0x30)
+    ih.puts(0x30000, b"\x22" * 0x45)
+    ih.start_addr = {"EIP": 0x100}
+    ih.write_hex_file(str(tmp_path / "fw.hex"))
+    updates = [
+        (0x110, b"\xaa" * 0x10),
+        # adjacent to the original content and to each other
+        (0x500, b"\xbb" * 0x7),
+        (0x507, b"\xcc" * 0x19),
+        # in a gap, past the end
+        (0x20000, b"\xdd" * 0x3),
+        (0x40000, b"\xee" * 0x40),
+    ]
+
+    binfmt_tool = IHex(None, str(tmp_path / "fw.hex"))
+    for offset, content in updates:
+        binfmt_tool.update_binary_content(offset, content)
+    binfmt_tool.save_binary(str(tmp_path / "patched.hex"))
+    with open(tmp_path / "patched.hex") as f:
+        content = f.read()
+    assert content == reference(intelhex.IntelHex(str(tmp_path / "fw.hex")), updates)
+    assert content.splitlines()[-2] == ":0400000500000100F6"
+
+    patched = intelhex.IntelHex(str(tmp_path / "patched.hex"))
+    assert patched.gets(0x500, 0x20) == b"\xbb" * 0x7 + b"\xcc" * 0x19
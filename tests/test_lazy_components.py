@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import os
+import subprocess
+import sys
+
+from patcherex2 import *
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def test_components_are_created_on_access():
+    p = Patcherex(BINARY)
+    assert not any(component in p.__dict__ for component in Patcherex.components)
+    allocation_manager = p.allocation_manager
+    assert p.allocation_manager is allocation_manager
+    # the free space of the binary is known without touching the binary format tool first
+    assert "binfmt_tool" in p.__dict__
+    assert allocation_manager.blocks
+    assert "binary_analyzer" not in p.__dict__
+
+
+def test_raw_patch_does_not_import_angr(tmp_path):
+    script = f"""
+import sys
+from patcherex2 import *
+assert "angr" not in sys.modules and "cle" not in sys.modules
+p = Patcherex({BINARY!r})
+p.patches.append(ModifyRawBytesPatch(0x1000, b"\\x90", addr_type="raw"))
+p.apply_patches()
+p.save_binary({str(tmp_path / "out")!r})
+assert "angr" not in sys.modules and "cle" not in sys.modules
+"""
+    subprocess.run([sys.executable, "-c", script], check=True)
+    with open(tmp_path / "out", "rb") as f:
+        assert f.read()[0x1000] == 0x90
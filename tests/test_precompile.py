@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import logging
+import os
+import threading
+
+from patcherex2 import *
+from patcherex2.components.compilers.cache import CompilationCache
+from patcherex2.components.compilers.clang_arm import ClangArm
+from patcherex2.components.compilers.llvm_recomp_arm import LLVMRecompArm
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def test_precompile_fills_object_cache(monkeypatch):
+    p = Patcherex(BINARY)
+    p.compiler.cache = CompilationCache()
+    threads = set()
+
+    def compile_object(code, extra_compiler_flags, **kwargs):
+        threads.add(threading.get_ident())
+        return code.encode()
+
+    monkeypatch.setattr(p.compiler, "_compile_object", compile_object)
+    insert = InsertInstructionPatch(0x40115C, "rdi = 1;", language="C")
+    p.patches += [
+        ModifyFunctionPatch("main", "int main() { return 0; }"),
+        InsertFunctionPatch("f", "int f() { return 1; }", compile_opts={"x": 1}),
+        InsertFunctionPatch("g", "int f() { return 1; }", compile_opts={"x": 1}),
+        InsertDataPatch("d", b"abc"),
+        insert,
+    ]
+    p.utils.plan_trampolines(p.patches)
+    p._precompile(p.patches, max_workers=2)
+    assert threading.get_ident() not in threads
+    assert p.compiler.cache.stats["entries"] == 3
+
+    def fail(*args, **kwargs):
+        raise AssertionError("object compiled twice")
+
+    monkeypatch.setattr(p.compiler, "_compile_object", fail)
+    assert (
+        p.compiler.compile_object("int main() { return 0; }", is_thumb=False)
+        == b"int main() { return 0; }"
+    )
+    assert p.compiler.compile_object("int f() { return 1; }", is_thumb=False, x=1)
+    code = insert._c_code(p)
+    assert p.compiler.compile_object(code, ["-Os"], is_thumb=False) == code.encode()
+
+
+def test_precompile_arm_thumb_flags():
+    compiler = ClangArm(None)
+    assert compiler._object_args(is_thumb=True, x=1) == (["-mthumb"], {"x": 1})
+    flags = ["-Os"]
+    assert compiler._object_args(flags) == (["-Os", "-mno-thumb"], {})
+    # the flags usually come from the patch's compile_opts
+    assert flags == ["-Os"]
+    recomp = LLVMRecompArm.__new__(LLVMRecompArm)
+    assert recomp._object_args(flags, is_thumb=True) == (["-Os", "-mthumb"], {})
+
+
+def test_objects_are_reused_without_cache(monkeypatch):
+    p = Patcherex(BINARY)
+    p.compiler.cache = None
+    calls = []
+
+    def compile_object(code, extra_compiler_flags, **kwargs):
+        calls.append(code)
+        return code.encode()
+
+    monkeypatch.setattr(p.compiler, "_compile_object", compile_object)
+    p.compiler.precompile([("int f() { return 1; }", {})])
+    assert (
+        p.compiler.compile_object("int f() { return 1; }") == b"int f() { return 1; }"
+    )
+    assert p.compiler.compile_object("int g() { return 1; }")
+    assert p.compiler.compile_object("int g() { return 1; }")
+    assert calls == ["int f() { return 1; }", "int g() { return 1; }"]
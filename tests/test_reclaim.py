@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import logging
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from patcherex2 import *
+from patcherex2.components.allocation_managers.allocation_manager import (
+    MappedBlock,
+    MemoryFlag,
+)
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def is_free(p, addr):
+    return any(
+        block.is_free and block.mem_addr <= addr < block.mem_addr + block.size
+        for block in p.allocation_manager.blocks[MappedBlock]
+    )
+
+
+def test_free_range_splits_block():
+    p = Patcherex(BINARY)
+    am = p.allocation_manager
+    main = p.binary_analyzer.get_function("main")
+    file_addr = p.binary_analyzer.mem_addr_to_file_offset(main["addr"] + 4)
+    assert am.free_range(file_addr, main["addr"] + 4, 8, MemoryFlag.RX)
+    assert not is_free(p, main["addr"] + 3)
+    assert is_free(p, main["addr"] + 4) and is_free(p, main["addr"] + 11)
+    assert not is_free(p, main["addr"] + 12)
+    # overlaps the free range and the rest of the section
+    assert not am.free_range(file_addr, main["addr"] + 4, 0x1000, MemoryFlag.RX)
+
+
+def test_reclaim_keeps_entry_points_and_patched_functions(tmp_path):
+    p = Patcherex(BINARY)
+    unused = {func["addr"] for func in p.binary_analyzer.get_unused_funcs()}
+    start = p.binary_analyzer.get_function("_start")["addr"]
+    init = p.binary_analyzer.get_function("_init")["addr"]
+    assert {start, init} <= unused
+    p.patches.append(ModifyInstructionPatch(0x40113E, "lea rax, [0x402007]"))
+    p.apply_patches(reclaim_unused_funcs=True)
+    assert not is_free(p, start) and not is_free(p, init)
+    assert any(is_free(p, addr) for addr in unused)
+
+    p.save_binary(str(tmp_path / "patched"))
+    output = subprocess.run([str(tmp_path / "patched")], capture_output=True).stdout
+    assert output == b"%s"
+
+
+def test_removed_function_is_reused():
+    p = Patcherex(BINARY)
+    func = p.binary_analyzer.get_function("register_tm_clones")
+    p.patches += [
+        InsertInstructionPatch(0x40115C, "nop"),
+        RemoveFunctionPatch("register_tm_clones"),
+    ]
+    p.apply_patches()
+    # the trampoline goes where the function was
+    assert p.allocation_manager.new_mapped_blocks == []
+    assert not is_free(p, func["addr"])
+
+
+def test_patch_order():
+    p = Patcherex(BINARY)
+    insert = InsertInstructionPatch(0x40115C, "nop")
+    modify = ModifyInstructionPatch(0x40113E, "lea rax, [0x402007]")
+    data = InsertDataPatch("added_data", b"AAAA")
+    remove = RemoveFunctionPatch("register_tm_clones")
+    p.patches += [insert, data, modify]
+    p.apply_patches()
+    # data patches first, as before RemoveFunctionPatch existed
+    assert p.patches == [data, insert, modify]
+
+    p = Patcherex(BINARY)
+    p.patches += [insert, data, remove, modify]
+    p.apply_patches()
+    assert p.patches == [remove, data, insert, modify]
+
+
+@pytest.mark.skipif(shutil.which("cc") is None, reason="no host C compiler")
+def test_reclaim_keeps_functions_in_pointer_tables(tmp_path):
+    source = "\n".join(
+        [f"int f{i}(int x) {{ return x * {i + 3} + {i}; }}" for i in range(8)]
+        + [
+            "int (*table[])(int) = {" + ", ".join(f"f{i}" for i in range(8)) + "};",
+            "int main(int argc, char **argv) {",
+            "  int r = 0; for (int i = 0; i < 8; i++) r += table[i](argc + r);",
+            "  return r & 0xff; }",
+        ]
+    )
+    (tmp_path / "table.c").write_text(source)
+    binary = str(tmp_path / "table")
+    subprocess.run(
+        [
+            "cc",
+            "-O1",
+            "-fno-inline",
+            "-no-pie",
+            str(tmp_path / "table.c"),
+            "-o",
+            binary,
+        ],
+        check=True,
+    )
+    expected = subprocess.run([binary]).returncode
+
+    p = Patcherex(binary)
+    funcs = [p.binary_analyzer.get_function(f"f{i}") for i in range(8)]
+    main = p.binary_analyzer.get_function("main")
+    p.patches.append(InsertInstructionPatch(main["addr"], "nop"))
+    p.apply_patches(reclaim_unused_funcs=True)
+    assert not any(is_free(p, func["addr"]) for func in funcs)
+
+    p.save_binary(str(tmp_path / "patched"))
+    assert subprocess.run([str(tmp_path / "patched")]).returncode == expected
+
+
+def test_reclaim_keeps_functions_referenced_by_patch_code():
+    p = Patcherex(BINARY)
+    addr = p.binary_analyzer.get_all_symbols()["register_tm_clones"]
+    p.patches.append(InsertInstructionPatch(0x40115C, "nop"))
+    assert addr not in p._patched_addrs()
+    p.patches.append(InsertInstructionPatch(0x401145, "call {register_tm_clones}"))
+    assert addr in p._patched_addrs()
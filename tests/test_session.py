@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import logging
+import os
+import subprocess
+
+from patcherex2 import *
+from patcherex2.components.allocation_managers.allocation_manager import MemoryFlag
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def make_patches(tlen):
+    instrs = """
+        mov rax, 1
+        mov rdi, 1
+        lea rsi, [{added_data}]
+        mov rdx, %s
+        syscall
+    """ % hex(tlen)
+    return [
+        ModifyInstructionPatch(0x40113E, "lea rax, [0x402007]"),
+        ModifyInstructionPatch(0x401145, "mov rsi, rax"),
+        InsertDataPatch("added_data", b"A" * tlen),
+        InsertInstructionPatch(0x40115C, instrs),
+    ]
+
+
+def patch(tmp_path, patches, monkeypatch):
+    applied = []
+    for cls in (ModifyInstructionPatch, InsertDataPatch, InsertInstructionPatch):
+        orig = cls.apply
+
+        def apply(self, p, orig=orig):
+            applied.append(self)
+            return orig(self, p)
+
+        monkeypatch.setattr(cls, "apply", apply)
+    p = Patcherex(BINARY)
+    p.patches += patches
+    p.apply_patches(session=str(tmp_path / "session"))
+    p.save_binary(str(tmp_path / "patched"))
+    with open(tmp_path / "patched", "rb") as f:
+        content = f.read()
+    output = subprocess.run([str(tmp_path / "patched")], capture_output=True).stdout
+    monkeypatch.undo()
+    return p, applied, content, output
+
+
+def test_unchanged_session_is_replayed(tmp_path, monkeypatch):
+    _, applied, content, output = patch(tmp_path, make_patches(5), monkeypatch)
+    assert len(applied) == 4
+    assert output == b"AAAAA%s"
+
+    p, applied, replayed_content, _ = patch(tmp_path, make_patches(5), monkeypatch)
+    assert applied == []
+    assert replayed_content == content
+    assert p.symbols["added_data"] is not None
+    # nothing needed the CFG
+    assert "binary_analyzer" not in p.__dict__
+
+
+def test_changed_patch_and_its_dependents_are_reapplied(tmp_path, monkeypatch):
+    patch(tmp_path, make_patches(5), monkeypatch)
+    patches = make_patches(7)
+    _, applied, _, output = patch(tmp_path, patches, monkeypatch)
+    # the instruction patch refers to the data patch that changed
+    assert applied == patches[2:]
+    assert output == b"AAAAAAA%s"
+
+    _, applied, _, output = patch(tmp_path, make_patches(7), monkeypatch)
+    assert applied == []
+    assert output == b"AAAAAAA%s"
+
+
+def test_stale_session_is_ignored(tmp_path, monkeypatch):
+    (tmp_path / "session").write_bytes(b"garbage")
+    _, applied, _, output = patch(tmp_path, make_patches(5), monkeypatch)
+    assert len(applied) == 4
+    assert output == b"AAAAA%s"
+
+
+def test_reserve_restores_allocation():
+    p = Patcherex(BINARY)
+    am = p.allocation_manager
+    # there is no free space in the binary, this goes into a new segment
+    block = am.allocate(0x20, flag=MemoryFlag.RX)
+    file_addr, mem_addr = block.file_addr, block.mem_addr
+    size = am.new_mapped_blocks[0].size
+
+    p = Patcherex(BINARY)
+    am = p.allocation_manager
+    assert not am.can_reserve(file_addr, mem_addr, 0x20, MemoryFlag.RX)
+    assert not am.map_new_block(file_addr + 0x10, mem_addr, size, MemoryFlag.RX)
+    assert not am.map_new_block(file_addr, mem_addr, size + 0x10, MemoryFlag.RX)
+    assert am.map_new_block(file_addr, mem_addr, size, MemoryFlag.RX)
+    assert am.reserve(file_addr, mem_addr, 0x20, MemoryFlag.RX)
+    assert not am.can_reserve(file_addr, mem_addr, 0x20, MemoryFlag.RX)
+    assert am.allocate(0x20, flag=MemoryFlag.RX).mem_addr == mem_addr + 0x20
+
+
+def test_shadowed_symbol_reapplies_everything(tmp_path, monkeypatch):
+    instrs = """
+        lea rax, [{main}]
+    """
+    patch(tmp_path, [InsertInstructionPatch(0x40115C, instrs)], monkeypatch)
+    patches = [
+        InsertDataPatch("main", b"A"),
+        InsertInstructionPatch(0x40115C, instrs),
+    ]
+    p, applied, _, _ = patch(tmp_path, patches, monkeypatch)
+    # the new data patch defines the symbol the replayed patch was assembled with
+    assert applied == [patches[0], patches[0], patches[1]]
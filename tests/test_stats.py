@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import json
+import logging
+import os
+
+from patcherex2 import *
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def apply(p):
+    p.patches += [
+        ModifyInstructionPatch(0x40113E, "lea rax, [0x402007]"),
+        InsertDataPatch("added_data", b"AAAA"),
+    ]
+    p.apply_patches()
+
+
+def test_disabled_stats_leave_components_untouched():
+    p = Patcherex(BINARY)
+    apply(p)
+    assert p.stats.events == []
+    assert "assemble" not in vars(p.assembler)
+
+
+def test_stats_record_components_and_patches(tmp_path):
+    p = Patcherex(BINARY)
+    # components created before enabling are instrumented as well
+    p.allocation_manager
+    p.stats.enable()
+    apply(p)
+    p.save_binary(str(tmp_path / "patched"))
+    p.stats.disable()
+
+    summary = p.stats.summary()
+    assert summary["patch.ModifyInstructionPatch"]["calls"] == 1
+    assert summary["patch.InsertDataPatch"]["calls"] == 1
+    assert summary["assembler.assemble"]["calls"] >= 1
+    assert summary["assembler.assemble"]["bytes"] > 0
+    assert summary["allocation_manager.allocate"]["bytes"] >= 4
+    assert summary["binfmt_tool.save_binary"]["calls"] == 1
+    assert summary["binary_analyzer.__init__"]["calls"] == 1
+    assert "binary_analyzer.mem_addr_to_file_offset" in summary
+    assert "assemble" not in vars(p.assembler)
+
+    events = json.loads(p.stats.to_json())["events"]
+    assert len(events) == len(p.stats.events)
+    p.stats.save_chrome_trace(str(tmp_path / "trace.json"))
+    with open(tmp_path / "trace.json") as f:
+        trace = json.load(f)["traceEvents"]
+    assert {e["ph"] for e in trace} == {"X"}
+    assert any(e["cat"] == "patch" for e in trace)
+
+
+def test_spans_record_to_their_own_instance():
+    import gc
+    import weakref
+
+    p = Patcherex(BINARY)
+    other = Patcherex(BINARY)
+    p.stats.enable()
+    other.stats.enable()
+    p.binary_analyzer.cfg
+    assert "binary_analyzer.cfg" in p.stats.summary()
+    assert "binary_analyzer.cfg" not in other.stats.summary()
+    p.stats.disable()
+    assert "_stats" not in vars(p.binary_analyzer)
+
+    ref = weakref.ref(other)
+    del other
+    gc.collect()
+    assert ref() is None
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+from types import SimpleNamespace
+
+from patcherex2.components.assemblers.assembler import Assembler
+from patcherex2.components.utils.symbol_table import SymbolTable
+
+
+class CountingAnalyzer:
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.calls = 0
+
+    def get_all_symbols(self):
+        self.calls += 1
+        return dict(self.symbols)
+
+
+def make_assembler():
+    analyzer = CountingAnalyzer({"main": 0x1000, "foo": 0x2000})
+    p = SimpleNamespace(symbols=SymbolTable(), binary_analyzer=analyzer)
+    return Assembler(p), p, analyzer
+
+
+def test_resolve_symbols_precedence():
+    assembler, p, _ = make_assembler()
+    p.symbols["foo"] = 0x3000
+    p.symbols["bar"] = 0x4000
+    code = (
+        "call {main}\ncall {foo}\ncall {bar}\ncall {baz}\nvaddps zmm0 {k1}, zmm1, zmm2"
+    )
+    assert assembler.resolve_symbols(code, symbols={"baz": 0x5000}) == (
+        "call 0x1000\ncall 0x2000\ncall 0x4000\ncall 0x5000\nvaddps zmm0 {k1}, zmm1, zmm2"
+    )
+
+
+def test_symbol_table_is_cached_until_symbols_change():
+    assembler, p, analyzer = make_assembler()
+    assembler.resolve_symbols("call {main}")
+    assembler.resolve_symbols("call {foo}")
+    assert analyzer.calls == 1
+    p.symbols["new_func"] = 0x6000
+    assert assembler.resolve_symbols("call {new_func}") == "call 0x6000"
+    assert analyzer.calls == 2
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import os
+
+import pytest
+
+from patcherex2.targets import *
+
+BINARIES = os.path.join(os.path.dirname(os.path.realpath(__file__)), "test_binaries")
+
+
+@pytest.mark.parametrize(
+    "arch,target_cls",
+    [
+        ("aarch64", ElfAArch64Linux),
+        ("amd64", ElfAmd64Linux),
+        ("armhf", ElfArmLinux),
+        ("mips", ElfMipsLinux),
+        ("mipsel", ElfMipselLinux),
+        ("mips64", ElfMips64Linux),
+        ("mips64el", ElfMips64elLinux),
+        ("ppc", ElfPpcLinux),
+        ("ppc64", ElfPpc64Linux),
+        ("ppc64le", ElfPpc64leLinux),
+        ("x86", ElfX86Linux),
+    ],
+)
+def test_detect_target_class(arch, target_cls):
+    directory = os.path.join(BINARIES, arch)
+    binary = os.path.join(directory, sorted(os.listdir(directory))[0])
+    assert Target.detect_target_class(binary) is target_cls
+
+
+def test_priority_and_custom_detection(tmp_path, monkeypatch):
+    binary = tmp_path / "bin"
+    binary.write_bytes(b"\x7fELF\x02\x01" + b"\x00" * 12 + b"\x3e\x00" + b"\x00" * 0x2C)
+    monkeypatch.setattr(Target, "target_classes", list(Target.target_classes))
+    monkeypatch.setattr(Target, "_dispatch_table", None)
+    assert Target.detect_target_class(str(binary)) is ElfAmd64Linux
+
+    class AnyElf(Target):
+        match_keys = [("elf", None, None, None)]
+        priority = -1
+
+    assert Target.detect_target_class(str(binary)) is ElfAmd64Linux
+
+    class Amd64Variant(ElfAmd64Linux):
+        match_keys = [("elf", 0x3E, "little", 64)]
+
+    # ties go to the target defined first
+    assert Target.detect_target_class(str(binary)) is ElfAmd64Linux
+
+    Amd64Variant.priority = 1
+    assert Target.detect_target_class(str(binary)) is Amd64Variant
+
+    class Custom(Target):
+        priority = 2
+
+        @staticmethod
+        def detect_target(binary_path):
+            return binary_path.endswith("bin")
+
+    assert Target.detect_target_class(str(binary)) is Custom
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import logging
+import os
+
+from patcherex2 import *
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def test_insertion_points_are_analyzed_once(monkeypatch):
+    p = Patcherex(BINARY)
+    patches = [
+        InsertInstructionPatch(0x40115C, "nop"),
+        ModifyInstructionPatch(0x401145, "mov rsi, rax"),
+    ]
+    p.utils.plan_trampolines(patches)
+    point = p.utils.get_insertion_point(0x40115C)
+    assert point["moved_instrs"] == "mov eax, 0\npop rbp"
+    assert point["moved_instrs_len"] == 6
+    assert p.utils.is_valid_insert_point(0x40115C)
+
+    def fail(*args, **kwargs):
+        raise AssertionError("insertion point analyzed twice")
+
+    monkeypatch.setattr(p.utils, "get_instrs_to_be_moved", fail)
+    p.patches += patches
+    p.apply_patches()
+    assert p.binfmt_tool.get_binary_content(0x115C, 1) == b"\xe9"
+
+
+def test_movable_instruction_verdicts_are_cached(monkeypatch):
+    p = Patcherex(BINARY)
+    calls = []
+    assemble = p.assembler._assemble
+
+    def counting_assemble(*args, **kwargs):
+        calls.append(args)
+        return assemble(*args, **kwargs)
+
+    monkeypatch.setattr(p.assembler, "_assemble", counting_assemble)
+    # mov eax, 0
+    assert p.utils.is_movable_instruction(0x401152)
+    assert len(calls) == 1
+    assert p.utils.is_movable_instruction(0x401152)
+    # same encoding at another address
+    assert p.utils.is_movable_instruction(0x40115C)
+    assert len(calls) == 1
+    # call printf, checked at two other addresses
+    assert p.utils.is_movable_instruction(0x401157)
+    assert len(calls) == 3
+    # lea rax, [rip + 0xebf]
+    assert not p.utils.is_movable_instruction(0x40113E)
+    assert len(calls) == 3
+
+
+def test_disassemble_many_matches_disassemble():
+    p = Patcherex(BINARY)
+    inputs = [(b"\xe9\xf9\xef\xff\xff", 0x402002), (b"\x90\xc3", 0x0)]
+    assert p.disassembler.disassemble_many(inputs) == [
+        p.disassembler.disassemble(code, base) for code, base in inputs
+    ]
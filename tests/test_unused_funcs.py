@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import logging
+import os
+
+from patcherex2 import *
+
+logging.getLogger("patcherex2").setLevel("ERROR")
+
+BINARY = os.path.join(
+    os.path.dirname(os.path.realpath(__file__)),
+    "test_binaries",
+    "amd64",
+    "printf_nopie",
+)
+
+
+def test_unused_funcs_exclude_referenced_and_called_functions():
+    p = Patcherex(BINARY)
+    ba = p.binary_analyzer
+    unused = ba.get_unused_funcs()
+    addrs = {func["addr"] for func in unused}
+    kb = ba.p.kb
+    for func in kb.functions.values():
+        if func.size == 0:
+            continue
+        called = any(src != func.addr for src in kb.callgraph.predecessors(func.addr))
+        referenced = func.addr in kb.xrefs.xrefs_by_dst
+        assert (func.addr in addrs) == (not called and not referenced)
+    # deregister_tm_clones is only called, never referenced as data
+    assert ba.get_function("deregister_tm_clones")["addr"] not in addrs
+    assert ba.get_function("_start")["addr"] in addrs
+
+
+def test_unused_funcs_are_cached_and_queried_in_bulk(monkeypatch):
+    p = Patcherex(BINARY)
+    ba = p.binary_analyzer
+    unused = ba.get_unused_funcs()
+    unused[0]["size"] = 0
+    monkeypatch.setattr(ba, "_referenced_addrs", None)
+    assert ba.get_unused_funcs()[0]["size"] != 0
+
+    main = ba.get_function("main")["addr"]
+    start = ba.get_function("_start")["addr"]
+    assert ba.filter_unused_funcs([main, start, 0x1234]) == [start]
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+# ruff: noqa
+import pytest
+
+from patcherex2.components.binfmt_tools.binfmt_tool import UpdateStore
+
+ORIGINAL = bytes(range(256)) * 4
+
+
+def read_original(offset, size):
+    return ORIGINAL[offset : offset + size]
+
+
+def apply_naive(updates):
+    content = bytearray(ORIGINAL)
+    for offset, data in updates:
+        content[offset : offset + len(data)] = data
+    return bytes(content)
+
+
+def test_contains():
+    store = UpdateStore()
+    store.add(0x10, b"\xaa" * 4)
+    assert store.contains(0x10)
+    assert store.contains(0x13)
+    assert not store.contains(0x14)
+    assert not store.contains(0xF)
+
+
+def test_newer_update_overwrites_older_ones():
+    updates = [(0x10, b"\xaa" * 4), (0x20, b"\xbb" * 8), (0x0C, b"\xcc" * 0x16)]
+    store = UpdateStore()
+    for offset, data in updates:
+        store.add(offset, data)
+    assert list(store) == [(0x0C, b"\xcc" * 0x16), (0x22, b"\xbb" * 6)]
+    assert store.end == 0x28
+
+
+@pytest.mark.parametrize(
+    "offset,size", [(0, 8), (0x0E, 4), (0x0E, 0x20), (0x12, 2), (0x100, 0x20)]
+)
+def test_read_stitches_original_and_updates(offset, size):
+    updates = [(0x10, b"\xaa" * 4), (0x18, b"\xbb" * 4), (0x1A, b"\xcc" * 4)]
+    store = UpdateStore()
+    for update in updates:
+        store.add(*update)
+    expected = apply_naive(updates)[offset : offset + size]
+    assert store.read(offset, size, read_original) == expected